@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Offline maintenance commands for the Mirror Clone backend.
+
+Run from the backend directory, e.g. ``python manage.py rebuild-article-stats``.
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+import typer
+
+from models.analytics import PageView, UserEngagement
+from models.monetization import MONEY_FIELDS
+from services.analytics_engine import (
+    analytics_engine, cohort_table, engagement_counts, session_metrics, ENGAGEMENT_ACTIONS
+)
+from services.article_stats_service import article_stats_service
+from services.author_stats_service import author_stats_service
+from services.cardinality_service import cardinality_service
+from services.export_service import export_service
+from services.ledger_service import ledger_service
+from services.recommendation_engine import recommendation_engine
+from services.related_articles_service import related_articles_service
+from services.revenue_service import revenue_service
+from services.rollup_service import rollup_service
+from services.string_dictionary import string_dictionary, PAGEVIEW_ENCODED_FIELDS
+from database import db
+
+cli = typer.Typer(help="Mirror Clone maintenance commands")
+
+
+@cli.callback()
+def main():
+    """Mirror Clone maintenance commands"""
+
+
+@cli.command("rebuild-article-stats")
+def rebuild_article_stats(article_id: str = typer.Option(None, help="Only rebuild this article")):
+    """Recount article_stats from raw pageviews and engagement"""
+
+    async def run():
+        await article_stats_service.ensure_indexes()
+        await article_stats_service.rebuild(article_id)
+
+    asyncio.run(run())
+    typer.echo("Article stats rebuilt")
+
+
+@cli.command("rebuild-author-stats")
+def rebuild_author_stats():
+    """Recompute author_stats for every author with articles"""
+
+    async def run():
+        await author_stats_service.ensure_indexes()
+        await author_stats_service.rebuild_all()
+
+    asyncio.run(run())
+    typer.echo("Author stats rebuilt")
+
+
+@cli.command("rebuild-sketches")
+def rebuild_sketches(batch_size: int = typer.Option(5000, help="Cursor batch size")):
+    """Replay pageviews and engagement into the HyperLogLog sketches (safe to re-run)"""
+
+    async def run():
+        await cardinality_service.ensure_indexes()
+
+        async for doc in db.pageviews.find({}, batch_size=batch_size):
+            await cardinality_service.record_pageview(PageView(**doc))
+
+        async for doc in db.user_engagement.find({}, batch_size=batch_size):
+            cardinality_service.record_engagement(UserEngagement(**doc))
+
+        await cardinality_service.flush()
+
+    asyncio.run(run())
+    typer.echo("Sketches rebuilt")
+
+
+@cli.command("compact-rollups")
+def compact_rollups():
+    """Fold closed minute rollups into hours and closed hours into days"""
+
+    async def run():
+        await rollup_service.ensure_indexes()
+        await rollup_service.compact()
+
+    asyncio.run(run())
+    typer.echo("Rollups compacted")
+
+
+@cli.command("export")
+def export(
+    dataset: str = typer.Argument(..., help="pageviews, user_engagement or search_queries"),
+    format: str = typer.Option("csv", help="csv, ndjson or parquet"),
+    output: str = typer.Option("-", help="Output file ('-' for stdout)"),
+    article_id: str = typer.Option(None),
+    author_wallet: str = typer.Option(None),
+    start: datetime = typer.Option(None),
+    end: datetime = typer.Option(None),
+):
+    """Stream an analytics collection to a file"""
+
+    async def run(out):
+        query = await export_service.build_filter(dataset, article_id, author_wallet, start, end)
+        async for chunk in export_service.stream(dataset, format, query):
+            out.write(chunk)
+
+    if output == "-":
+        asyncio.run(run(sys.stdout.buffer))
+    else:
+        with open(output, "wb") as out:
+            asyncio.run(run(out))
+
+
+@cli.command("compute-analytics")
+def compute_analytics():
+    """Compute time on page, bounce rate, virality, retention and cohorts from raw events"""
+
+    async def run():
+        await analytics_engine.ensure_indexes()
+        await analytics_engine.run()
+
+    asyncio.run(run())
+    typer.echo("Analytics computed")
+
+
+@cli.command("benchmark-analytics")
+def benchmark_analytics(
+    events: int = typer.Option(10_000_000, help="Synthetic pageviews to generate"),
+    articles: int = typer.Option(50_000),
+    sessions: int = typer.Option(2_000_000),
+    seed: int = typer.Option(0),
+):
+    """Time the analytics engine's NumPy computations on synthetic events (no database)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2026-01-01", "ms").astype(np.int64)
+    span = 90 * 86_400_000
+
+    ts = start + rng.integers(0, span, events)
+    article = rng.zipf(1.3, events).astype(np.int64) % articles
+    article = article.astype(np.int32)
+    session = rng.integers(0, sessions, events, dtype=np.int32)
+    # Finished visits as the sessionizer stores them: an entry page, a length, and dwell seconds per page
+    entry = article[:sessions]
+    pages_visited = rng.geometric(0.35, len(entry))
+    seconds = rng.exponential(60.0, events)
+    engagement = events // 10
+    action = rng.integers(0, len(ENGAGEMENT_ACTIONS), engagement).astype(np.int8)
+
+    timings = []
+
+    def timed(label, rows, fn):
+        began = time.perf_counter()
+        fn()
+        timings.append((label, rows, time.perf_counter() - began))
+
+    timed("session metrics", events, lambda: session_metrics(
+        np.bincount(article, minlength=articles), entry, pages_visited, article, seconds, articles
+    ))
+    timed("engagement counts", engagement, lambda: engagement_counts(article[:engagement], action, articles))
+    timed("cohort table", events, lambda: cohort_table(ts, session, analytics_engine.cohort_weeks))
+
+    for label, rows, seconds in timings:
+        typer.echo(f"{label:<20} {seconds:8.2f}s  ({rows / seconds / 1e6:.1f}M events/s)")
+    typer.echo(f"{'total':<20} {sum(seconds for _, _, seconds in timings):8.2f}s for {events:,} events")
+
+
+@cli.command("encode-pageviews")
+def encode_pageviews(batch_size: int = typer.Option(1000, help="Documents per bulk write")):
+    """Replace verbatim user agents and referrers in stored pageviews with dictionary ids"""
+    from pymongo import UpdateOne
+
+    async def run():
+        await string_dictionary.ensure_indexes()
+        query = {"$or": [{field: {"$type": "string"}} for field in PAGEVIEW_ENCODED_FIELDS]}
+        projection = {field: 1 for field in PAGEVIEW_ENCODED_FIELDS}
+
+        operations = []
+        converted = 0
+        async for doc in db.pageviews.find(query, projection, batch_size=batch_size):
+            ids = {}
+            for field, id_field in PAGEVIEW_ENCODED_FIELDS.items():
+                if isinstance(doc.get(field), str):
+                    ids[id_field] = await string_dictionary.encode(field, doc[field])
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": ids, "$unset": {field: "" for field in PAGEVIEW_ENCODED_FIELDS}}
+            ))
+            if len(operations) >= batch_size:
+                await db.pageviews.bulk_write(operations, ordered=False)
+                converted += len(operations)
+                operations = []
+        if operations:
+            await db.pageviews.bulk_write(operations, ordered=False)
+            converted += len(operations)
+        return converted
+
+    typer.echo(f"Encoded {asyncio.run(run())} pageviews")
+
+
+@cli.command("benchmark-pageview-storage")
+def benchmark_pageview_storage(
+    count: int = typer.Option(1_000_000, help="Synthetic pageviews to generate"),
+    seed: int = typer.Option(0),
+):
+    """Compare BSON size of pageviews with verbatim vs dictionary-encoded user agents and referrers"""
+    import random
+    import uuid
+
+    import bson
+
+    rng = random.Random(seed)
+    browsers = [
+        "Mozilla/5.0 ({os}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+        "Mozilla/5.0 ({os}; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+        "Mozilla/5.0 ({os}) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{v}.0 Safari/605.1.15",
+        "Mozilla/5.0 ({os}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0",
+    ]
+    systems = [
+        "Windows NT 10.0; Win64; x64", "Macintosh; Intel Mac OS X 10_15_7", "X11; Linux x86_64",
+        "iPhone; CPU iPhone OS 17_4 like Mac OS X", "Linux; Android 14; Pixel 8", "Linux; Android 13; SM-S918B",
+    ]
+    user_agents = [browser.format(os=system, v=v) for browser in browsers for system in systems for v in range(100, 125)]
+    referrers = [None] * 40 + [
+        f"https://{site}/{path}" for site in ("www.google.com", "t.co", "news.ycombinator.com", "www.reddit.com", "warpcast.com")
+        for path in ("", "search", "r/ethereum/comments", "item", "home")
+    ] + [f"https://mirror-clone.app/article/{uuid.UUID(int=rng.getrandbits(128))}" for _ in range(2000)]
+    wallets = ["0x" + "".join(rng.choices("0123456789abcdef", k=40)) for _ in range(5000)]
+    articles = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(5000)]
+
+    ids = {field: {} for field in PAGEVIEW_ENCODED_FIELDS}
+    verbatim_bytes = encoded_bytes = 0
+    for _ in range(count):
+        pageview = PageView(
+            article_id=rng.choice(articles),
+            user_wallet=rng.choice(wallets) if rng.random() < 0.3 else None,
+            ip_address=f"{rng.randrange(1, 255)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+            user_agent=user_agents[min(int(rng.paretovariate(1.2)) - 1, len(user_agents) - 1)],
+            referrer=rng.choice(referrers),
+            session_id=str(uuid.uuid4()),
+        )
+        doc = pageview.dict()
+        doc["view_date"] = pageview.view_date.isoformat()
+        verbatim_bytes += len(bson.encode(doc))
+
+        for field, id_field in PAGEVIEW_ENCODED_FIELDS.items():
+            value = doc.pop(field)
+            if value is not None:
+                doc[id_field] = ids[field].setdefault(value, len(ids[field]) + 1)
+        encoded_bytes += len(bson.encode(doc))
+
+    dictionary_bytes = sum(
+        len(bson.encode({"_id": bson.ObjectId(), "kind": field, "value": value, "id": string_id}))
+        for field, values in ids.items() for value, string_id in values.items()
+    )
+    total_encoded = encoded_bytes + dictionary_bytes
+
+    typer.echo(f"pageviews:              {count:,}")
+    typer.echo(f"distinct user agents:   {len(ids['user_agent']):,}")
+    typer.echo(f"distinct referrers:     {len(ids['referrer']):,}")
+    typer.echo(f"verbatim documents:     {verbatim_bytes / 2**20:10.1f} MiB ({verbatim_bytes / count:.0f} B/doc)")
+    typer.echo(f"encoded documents:      {encoded_bytes / 2**20:10.1f} MiB ({encoded_bytes / count:.0f} B/doc)")
+    typer.echo(f"dictionary:             {dictionary_bytes / 2**20:10.1f} MiB")
+    typer.echo(f"saved:                  {(1 - total_encoded / verbatim_bytes) * 100:10.1f} %")
+
+
+@cli.command("rebuild-similarity")
+def rebuild_similarity(full: bool = typer.Option(True, help="Rebuild from scratch instead of appending new articles")):
+    """Build the TF-IDF similarity index used for related articles"""
+
+    async def run():
+        await related_articles_service.ensure_indexes()
+        return await related_articles_service.update(full=full)
+
+    version = asyncio.run(run())
+    typer.echo(f"Similarity index {version} written to {related_articles_service.directory}")
+
+
+@cli.command("rebuild-recommendations")
+def rebuild_recommendations(full: bool = typer.Option(False, help="Refold every engagement event and recompute every neighbour list")):
+    """Fold new engagement into article interactions and refresh article neighbour lists"""
+
+    async def run():
+        await recommendation_engine.ensure_indexes()
+        try:
+            await recommendation_engine.run(full=full)
+        finally:
+            recommendation_engine.shutdown()
+
+    asyncio.run(run())
+    typer.echo("Recommendations rebuilt")
+
+
+@cli.command("encode-money")
+def encode_money():
+    """Convert money fields stored as strings or doubles to exact Decimal128"""
+
+    async def run():
+        converted = {}
+        for collection, fields in MONEY_FIELDS.items():
+            converted[collection] = 0
+            for field in fields:
+                # Server-side update pipeline: no documents are pulled into the app
+                result = await db[collection].update_many(
+                    {field: {"$exists": True, "$ne": None, "$not": {"$type": "decimal"}}},
+                    [{"$set": {field: {"$toDecimal": f"${field}"}}}]
+                )
+                converted[collection] += result.modified_count
+        return converted
+
+    for collection, count in asyncio.run(run()).items():
+        typer.echo(f"{collection:<15} {count:,} documents converted")
+
+
+@cli.command("replay-ledger")
+def replay_ledger(backfill: bool = typer.Option(False, help="First log events for tips, purchases, subscriptions and NFT sales missing from the ledger")):
+    """Rebuild every wallet's balances from the ledger event log. Stop API workers first"""
+
+    async def run():
+        await ledger_service.ensure_indexes()
+        added = await ledger_service.backfill() if backfill else 0
+        return added, await ledger_service.replay()
+
+    added, wallets = asyncio.run(run())
+    if backfill:
+        typer.echo(f"Backfilled {added:,} ledger events")
+    typer.echo(f"Rebuilt ledgers for {wallets:,} wallets")
+
+
+@cli.command("verify-ledger")
+def verify_ledger(wallet: str = typer.Option(None, help="Check one wallet instead of every wallet with a ledger")):
+    """Compare ledger revenue with a recount from tips, purchases, subscriptions and NFT sales"""
+
+    async def run():
+        await revenue_service.ensure_indexes()
+        wallets = [wallet] if wallet else await db.wallet_ledgers.distinct("_id")
+        mismatches = {}
+        for address in wallets:
+            diff = await revenue_service.verify(address, await ledger_service.revenue(address))
+            if diff:
+                mismatches[address] = diff
+        return len(wallets), mismatches
+
+    checked, mismatches = asyncio.run(run())
+    for address, diff in mismatches.items():
+        for field, (ledger, recount) in diff.items():
+            typer.echo(f"{address} {field}: ledger {ledger}, recount {recount}")
+    typer.echo(f"Checked {checked:,} wallets, {len(mismatches):,} mismatched")
+    if mismatches:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
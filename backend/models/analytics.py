@@ -31,6 +31,7 @@ class UserEngagementBase(BaseModel):
     target_id: str = Field(..., min_length=1)  # article_id, comment_id, etc.
     target_type: str = Field(..., pattern="^(article|comment|author|nft)$")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    session_id: Optional[str] = Field(None, max_length=100)
 
 class UserEngagementCreate(UserEngagementBase):
     pass
@@ -112,6 +113,7 @@ class TrendingArticle(BaseModel):
     comments_24h: int = Field(default=0)
     shares_24h: int = Field(default=0)
     engagement_score: float = Field(default=0.0)
+    velocity: float = Field(default=0.0)  # short-horizon minus long-horizon weighted events per hour
     trend_direction: str = Field(default="stable", pattern="^(up|down|stable)$")
     
     class Config:
@@ -119,6 +121,11 @@ class TrendingArticle(BaseModel):
             float: lambda v: round(v, 2)
         }
 
+class SessionPage(BaseModel):
+    article_id: str = Field(..., min_length=1)
+    viewed_at: datetime
+    seconds: Optional[float] = Field(None)  # time until the next page; None for the exit page
+
 class UserSession(BaseModel):
     session_id: str = Field(..., min_length=1)
     user_wallet: Optional[str] = Field(None, min_length=42, max_length=42)
@@ -129,6 +136,9 @@ class UserSession(BaseModel):
     duration: Optional[int] = Field(None)  # seconds
     pages_visited: int = Field(default=0)
     actions_performed: int = Field(default=0)
+    entry_article_id: Optional[str] = Field(None)
+    exit_article_id: Optional[str] = Field(None)
+    pages: List[SessionPage] = Field(default_factory=list)
     
     class Config:
         json_encoders = {
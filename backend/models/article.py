@@ -76,4 +76,25 @@ class ArticleSearchQuery(BaseModel):
     tags: Optional[List[str]] = None
     category: Optional[str] = None
     limit: int = 20
-    offset: int = 0
\ No newline at end of file
+    offset: int = 0
+    include_facets: bool = False
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+    label: Optional[str] = None
+
+
+class SearchFacets(BaseModel):
+    tags: List[FacetCount] = Field(default_factory=list)
+    categories: List[FacetCount] = Field(default_factory=list)
+    authors: List[FacetCount] = Field(default_factory=list)
+
+
+class ArticleSearchResults(BaseModel):
+    articles: List[ArticleResponse]
+    total: int
+    facets: SearchFacets
+    # Fuzzy and Irys fallback hits; not counted in total or facets
+    suggestions: List[ArticleResponse] = Field(default_factory=list)
\ No newline at end of file
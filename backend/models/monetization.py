@@ -1,10 +1,39 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, List, Optional
 from datetime import datetime
 import uuid
 from decimal import Decimal
+from bson.decimal128 import Decimal128
 
-class TipBase(BaseModel):
+# Collections and the money fields they store as Decimal128
+MONEY_FIELDS = {
+    "tips": ["amount"],
+    "paid_content": ["price", "total_revenue"],
+    "purchases": ["amount"],
+    "subscriptions": ["amount", "total_paid"],
+}
+
+
+def encode_money(doc: dict) -> dict:
+    """Decimal values -> BSON Decimal128, so amounts are stored and summed exactly"""
+    return {key: Decimal128(value) if isinstance(value, Decimal) else value for key, value in doc.items()}
+
+
+class MoneyModel(BaseModel):
+    """Base for models with Decimal amounts, stored in Mongo as Decimal128"""
+
+    @model_validator(mode="before")
+    @classmethod
+    def decode_money(cls, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {key: value.to_decimal() if isinstance(value, Decimal128) else value for key, value in data.items()}
+        return data
+
+    def to_mongo(self) -> dict:
+        return encode_money(self.dict())
+
+
+class TipBase(MoneyModel):
     from_wallet: str = Field(..., min_length=42, max_length=42)
     to_wallet: str = Field(..., min_length=42, max_length=42)
     article_id: Optional[str] = Field(None)
@@ -13,7 +42,7 @@ class TipBase(BaseModel):
     message: Optional[str] = Field(None, max_length=500)
 
 class TipCreate(TipBase):
-    pass
+    transaction_hash: Optional[str] = Field(None)  # Natural idempotency key when no Idempotency-Key header is sent
 
 class Tip(TipBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -27,7 +56,7 @@ class Tip(TipBase):
             Decimal: lambda v: str(v)
         }
 
-class PaidContentBase(BaseModel):
+class PaidContentBase(MoneyModel):
     article_id: str = Field(..., min_length=1)
     price: Decimal = Field(..., ge=Decimal('0.0001'))
     currency: str = Field(default="ETH", pattern="^(ETH|MATIC|USDC)$")
@@ -37,7 +66,7 @@ class PaidContentBase(BaseModel):
 class PaidContentCreate(PaidContentBase):
     pass
 
-class PaidContentUpdate(BaseModel):
+class PaidContentUpdate(MoneyModel):
     price: Optional[Decimal] = Field(None, ge=Decimal('0.0001'))
     currency: Optional[str] = Field(None, pattern="^(ETH|MATIC|USDC)$")
     description: Optional[str] = Field(None, max_length=500)
@@ -57,14 +86,14 @@ class PaidContent(PaidContentBase):
             Decimal: lambda v: str(v)
         }
 
-class PurchaseBase(BaseModel):
+class PurchaseBase(MoneyModel):
     buyer_wallet: str = Field(..., min_length=42, max_length=42)
     article_id: str = Field(..., min_length=1)
     amount: Decimal = Field(..., ge=Decimal('0.0001'))
     currency: str = Field(default="ETH", pattern="^(ETH|MATIC|USDC)$")
 
 class PurchaseCreate(PurchaseBase):
-    pass
+    transaction_hash: Optional[str] = Field(None)  # Natural idempotency key when no Idempotency-Key header is sent
 
 class Purchase(PurchaseBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -78,7 +107,7 @@ class Purchase(PurchaseBase):
             Decimal: lambda v: str(v)
         }
 
-class SubscriptionBase(BaseModel):
+class SubscriptionBase(MoneyModel):
     subscriber_wallet: str = Field(..., min_length=42, max_length=42)
     author_wallet: str = Field(..., min_length=42, max_length=42)
     amount: Decimal = Field(..., ge=Decimal('0.0001'))
@@ -105,6 +134,7 @@ class RevenueStats(BaseModel):
     total_tips_received: Decimal = Field(default=Decimal('0'))
     total_paid_content_revenue: Decimal = Field(default=Decimal('0'))
     total_subscription_revenue: Decimal = Field(default=Decimal('0'))
+    total_nft_sales_revenue: Decimal = Field(default=Decimal('0'))
     total_revenue: Decimal = Field(default=Decimal('0'))
     tips_count: int = Field(default=0)
     purchases_count: int = Field(default=0)
@@ -113,4 +143,32 @@ class RevenueStats(BaseModel):
     class Config:
         json_encoders = {
             Decimal: lambda v: str(v)
-        } 
\ No newline at end of file
+        }
+
+class CurrencyBalance(MoneyModel):
+    """One currency's totals in a wallet's ledger document"""
+    currency: str
+    balance: Decimal = Field(default=Decimal('0'))
+    spent: Decimal = Field(default=Decimal('0'))
+    tips_received: Decimal = Field(default=Decimal('0'))
+    paid_content_revenue: Decimal = Field(default=Decimal('0'))
+    subscription_revenue: Decimal = Field(default=Decimal('0'))
+    nft_sales_revenue: Decimal = Field(default=Decimal('0'))
+    tips_count: int = Field(default=0)
+    purchases_count: int = Field(default=0)
+    content_sales_count: int = Field(default=0)
+    nft_sales_count: int = Field(default=0)
+    active_subscribers: int = Field(default=0)
+
+    class Config:
+        json_encoders = {
+            Decimal: lambda v: str(v)
+        }
+
+class AccessCheck(BaseModel):
+    article_ids: List[str] = Field(..., min_length=1, max_length=100)
+
+class ArticleAccess(BaseModel):
+    article_id: str
+    has_access: bool
+    reason: Optional[str] = Field(None, pattern="^(free|author|purchase|subscription)$")
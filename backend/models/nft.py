@@ -54,7 +54,7 @@ class NFTSaleBase(BaseModel):
     royalty_amount: float = Field(default=0, ge=0)
 
 class NFTSaleCreate(NFTSaleBase):
-    pass
+    transaction_hash: Optional[str] = Field(None)  # Natural idempotency key when no Idempotency-Key header is sent
 
 class NFTSale(NFTSaleBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 import uuid
@@ -8,6 +9,21 @@ from models.analytics import (
     ArticleStats, AuthorStats, PlatformStats, TrendingArticle,
     UserSession, SearchQuery, ContentPerformance
 )
+from services.analytics_engine import analytics_engine
+from services.autocomplete_service import autocomplete_service
+from services.article_stats_service import article_stats_service, derive_engagement_rate
+from services.author_stats_service import author_stats_service
+from services.cardinality_service import (
+    cardinality_service, ARTICLE_VISITORS, AUTHOR_VISITORS, ACTIVE_USERS, PLATFORM_KEY
+)
+from services.export_service import export_service, ExportError, EXPORT_FORMATS
+from services.pageview_filter import pageview_filter
+from services.platform_stats_service import platform_stats_service
+from services.rollup_service import rollup_service, ARTICLE, PLATFORM, PLATFORM_KEY as ROLLUP_PLATFORM_KEY, DAY
+from services.search_trends_service import search_trends_service
+from services.session_service import session_service
+from services.string_dictionary import encode_pageview, decode_pageviews
+from services.trending_service import trending_service
 from database import db
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
@@ -34,11 +50,19 @@ async def track_pageview(pageview_data: PageViewCreate, request: Request):
         referrer=referrer
     )
     
-    result = await db.pageviews.insert_one(pageview.dict())
+    # Bot hits and repeat views are counted but not stored
+    if not await pageview_filter.check(pageview):
+        return pageview
+    
+    result = await db.pageviews.insert_one(await encode_pageview(pageview))
     
     if result.inserted_id:
         # Update article stats
-        await update_article_stats(pageview.article_id)
+        await article_stats_service.record_pageview(pageview)
+        await cardinality_service.record_pageview(pageview)
+        await rollup_service.record_pageview(pageview)
+        trending_service.record_pageview(pageview)
+        session_service.record_pageview(pageview)
         
         return pageview
     else:
@@ -49,23 +73,56 @@ async def get_article_pageviews(article_id: str, limit: int = 100, offset: int =
     """Get page views for an article"""
     
     cursor = db.pageviews.find({"article_id": article_id}).sort("created_at", -1).skip(offset).limit(limit)
-    pageviews = await cursor.to_list(length=limit)
+    pageviews = await decode_pageviews(await cursor.to_list(length=limit))
     
     return [PageView(**pv) for pv in pageviews]
 
+# Export API
+@router.get("/export/{dataset}")
+async def export_analytics(
+    dataset: str,
+    format: str = "csv",
+    article_id: Optional[str] = None,
+    author_wallet: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream raw pageviews, user_engagement or search_queries as CSV, NDJSON or Parquet"""
+    
+    try:
+        query = await export_service.build_filter(dataset, article_id, author_wallet, start, end)
+        body = export_service.stream(dataset, format, query)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'}
+    )
+
 # User Engagement API
 @router.post("/engagement", response_model=UserEngagement)
-async def track_engagement(engagement_data: UserEngagementCreate):
+async def track_engagement(engagement_data: UserEngagementCreate, request: Request):
     """Track user engagement"""
     
     engagement = UserEngagement(**engagement_data.dict())
     
-    result = await db.user_engagement.insert_one(engagement.dict())
+    # BSON has no date type; store the day as an ISO string like pageview view_date
+    doc = engagement.dict()
+    doc["engagement_date"] = engagement.engagement_date.isoformat()
+    result = await db.user_engagement.insert_one(doc)
     
     if result.inserted_id:
         # Update relevant stats based on action type
         await update_engagement_stats(engagement)
         
+        session_service.record_engagement(
+            engagement,
+            ip_address=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent")
+        )
+        
         return engagement
     else:
         raise HTTPException(status_code=500, detail="Failed to track engagement")
@@ -79,101 +136,117 @@ async def get_user_engagement(wallet: str, limit: int = 50, offset: int = 0):
     
     return [UserEngagement(**eng) for eng in engagements]
 
+# User Sessions API
+@router.get("/sessions/user/{wallet}", response_model=List[UserSession])
+async def get_user_sessions(wallet: str, limit: int = 50):
+    """Get a user's finished sessions, most recent first"""
+    
+    sessions = await db.user_sessions.find({"user_wallet": wallet}).sort("started_at", -1).limit(limit).to_list(None)
+    
+    return [UserSession(**session) for session in sessions]
+
 # Article Stats API
 @router.get("/stats/article/{article_id}", response_model=ArticleStats)
 async def get_article_stats(article_id: str):
     """Get comprehensive stats for an article"""
     
-    # Get or create article stats
-    stats = await db.article_stats.find_one({"article_id": article_id})
+    stats = await article_stats_service.get(article_id)
     
-    if not stats:
-        # Calculate initial stats
-        stats = await calculate_article_stats(article_id)
-        await db.article_stats.insert_one(stats.dict())
+    stats["engagement_rate"] = derive_engagement_rate(stats)
+    
+    # Unique views from the visitor sketch; articles not sketched yet keep the rebuilt count
+    stats["unique_views"] = await cardinality_service.estimate(ARTICLE_VISITORS, article_id) or stats.get("unique_views", 0)
     
     return ArticleStats(**stats)
 
+@router.get("/stats/article/{article_id}/unique-visitors")
+async def get_article_unique_visitors(article_id: str, days: int = 30):
+    """Get estimated unique visitors of an article over the last N days"""
+    
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    
+    sketch = await cardinality_service.sketch(ARTICLE_VISITORS, article_id, start, end)
+    
+    return {
+        "article_id": article_id,
+        "days": days,
+        "unique_visitors": sketch.estimate(),
+        "standard_error": sketch.standard_error
+    }
+
 @router.get("/stats/articles/trending", response_model=List[TrendingArticle])
 async def get_trending_articles(limit: int = 10):
     """Get trending articles in the last 24 hours"""
     
-    # Calculate 24 hours ago
-    yesterday = datetime.utcnow() - timedelta(days=1)
-    
-    # Get articles with high engagement in last 24h
-    pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": yesterday}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$article_id",
-                "views_24h": {"$sum": 1},
-                "likes_24h": {"$sum": {"$cond": [{"$eq": ["$action_type", "like"]}, 1, 0]}},
-                "comments_24h": {"$sum": {"$cond": [{"$eq": ["$action_type", "comment"]}, 1, 0]}},
-                "shares_24h": {"$sum": {"$cond": [{"$eq": ["$action_type", "share"]}, 1, 0]}}
-            }
-        },
-        {
-            "$sort": {"views_24h": -1}
-        },
-        {
-            "$limit": limit
-        }
-    ]
-    
-    trending_data = await db.user_engagement.aggregate(pipeline).to_list(limit)
-    
-    # Enrich with article data
+    now = datetime.utcnow()
+    
+    # Ranked from in-memory decayed scores; over-fetch a little for deleted articles
+    ranked = trending_service.top(limit + 5)
+    article_ids = [entry["article_id"] for entry in ranked]
+    
+    # Enrich with article data and exact 24h counts in one query each
+    articles = {
+        article["id"]: article
+        async for article in db.articles.find(
+            {"id": {"$in": article_ids}},
+            {"id": 1, "title": 1, "author_wallet": 1, "author_name": 1}
+        )
+    }
+    counts = await rollup_service.totals(ARTICLE, article_ids, now - timedelta(days=1), now)
+    
     trending_articles = []
-    for data in trending_data:
-        article = await db.articles.find_one({"id": data["_id"]})
-        if article:
-            engagement_score = (
-                data["views_24h"] * 0.3 +
-                data["likes_24h"] * 0.3 +
-                data["comments_24h"] * 0.2 +
-                data["shares_24h"] * 0.2
-            )
-            
-            trending_article = TrendingArticle(
-                article_id=data["_id"],
-                title=article.get("title", "Untitled"),
-                author_wallet=article.get("author_wallet", ""),
-                author_name=article.get("author_name"),
-                views_24h=data["views_24h"],
-                likes_24h=data["likes_24h"],
-                comments_24h=data["comments_24h"],
-                shares_24h=data["shares_24h"],
-                engagement_score=engagement_score
-            )
-            trending_articles.append(trending_article)
-    
-    return trending_articles
+    for entry in ranked:
+        article = articles.get(entry["article_id"])
+        if not article:
+            continue
+        
+        data = counts.get(entry["article_id"], {})
+        trending_article = TrendingArticle(
+            article_id=entry["article_id"],
+            title=article.get("title", "Untitled"),
+            author_wallet=article.get("author_wallet", ""),
+            author_name=article.get("author_name"),
+            views_24h=data.get("views", 0),
+            likes_24h=data.get("likes", 0),
+            comments_24h=data.get("comments", 0),
+            shares_24h=data.get("shares", 0),
+            engagement_score=entry["score"],
+            velocity=entry["velocity"],
+            trend_direction=entry["trend_direction"]
+        )
+        trending_articles.append(trending_article)
+    
+    return trending_articles[:limit]
 
 # Author Stats API
 @router.get("/stats/author/{wallet}", response_model=AuthorStats)
 async def get_author_stats(wallet: str):
     """Get comprehensive stats for an author"""
     
-    # Get or create author stats
-    stats = await db.author_stats.find_one({"author_wallet": wallet})
+    return await author_stats_service.get(wallet)
+
+@router.get("/stats/author/{wallet}/unique-visitors")
+async def get_author_unique_visitors(wallet: str, days: int = 30):
+    """Get estimated unique visitors across an author's articles over the last N days"""
+    
+    end = date.today()
+    start = end - timedelta(days=days - 1)
     
-    if not stats:
-        # Calculate initial stats
-        stats = await calculate_author_stats(wallet)
-        await db.author_stats.insert_one(stats.dict())
+    sketch = await cardinality_service.sketch(AUTHOR_VISITORS, wallet, start, end)
     
-    return AuthorStats(**stats)
+    return {
+        "author_wallet": wallet,
+        "days": days,
+        "unique_visitors": sketch.estimate(),
+        "standard_error": sketch.standard_error
+    }
 
 @router.get("/stats/authors/top", response_model=List[AuthorStats])
 async def get_top_authors(limit: int = 10, metric: str = "total_views"):
     """Get top authors by various metrics"""
     
-    valid_metrics = ["total_views", "total_likes", "total_revenue", "engagement_rate"]
+    valid_metrics = ["total_views", "total_likes", "total_revenue", "total_followers", "engagement_rate"]
     if metric not in valid_metrics:
         raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {valid_metrics}")
     
@@ -185,30 +258,64 @@ async def get_top_authors(limit: int = 10, metric: str = "total_views"):
 # Platform Stats API
 @router.get("/stats/platform", response_model=PlatformStats)
 async def get_platform_stats():
-    """Get platform-wide statistics"""
+    """Get platform-wide statistics (refreshed in the background)"""
+    
+    return await platform_stats_service.get()
+
+@router.get("/stats/platform/history", response_model=List[PlatformStats])
+async def get_platform_stats_history(days: int = 30):
+    """Get platform activity per day (counts are for that day, newest first)"""
     
     today = date.today()
+    start_date = today - timedelta(days=days - 1)
+    start = datetime.combine(start_date, datetime.min.time())
     
-    # Get today's stats or create new ones
-    stats = await db.platform_stats.find_one({"date": today.isoformat()})
+    buckets = await rollup_service.series(
+        PLATFORM, ROLLUP_PLATFORM_KEY, start, datetime.utcnow(), granularity=DAY
+    )
+    active_users = await cardinality_service.daily_estimates(ACTIVE_USERS, PLATFORM_KEY, start_date, today)
+    
+    history = []
+    for bucket in reversed(buckets):
+        day = bucket["_id"].date()
+        history.append(PlatformStats(
+            stats_date=day,
+            total_views=bucket["views"],
+            total_likes=bucket["likes"],
+            total_comments=bucket["comments"],
+            total_tips=bucket["tips"],
+            total_tip_amount=bucket["tip_amount"],
+            active_users=active_users.get(day.isoformat(), 0),
+            new_users=bucket["users"],
+            new_articles=bucket["articles"]
+        ))
+    
+    return history
+
+@router.get("/stats/filtered-pageviews", response_model=List[dict])
+async def get_filtered_pageviews(days: int = 7):
+    """Get daily counts of pageviews dropped as bot traffic or repeat views"""
     
-    if not stats:
-        # Calculate platform stats
-        stats = await calculate_platform_stats()
-        await db.platform_stats.insert_one(stats.dict())
+    end = date.today()
     
-    return PlatformStats(**stats)
+    return await pageview_filter.dropped(end - timedelta(days=days - 1), end)
 
-@router.get("/stats/platform/history", response_model=List[PlatformStats])
-async def get_platform_stats_history(days: int = 30):
-    """Get platform stats history"""
+@router.get("/stats/content/{content_id}", response_model=ContentPerformance)
+async def get_content_performance(content_id: str):
+    """Get virality and retention metrics computed by the analytics engine"""
+    
+    performance = await db.content_performance.find_one({"content_id": content_id})
     
-    start_date = date.today() - timedelta(days=days)
+    if not performance:
+        raise HTTPException(status_code=404, detail="Content performance not computed yet")
     
-    cursor = db.platform_stats.find({"date": {"$gte": start_date.isoformat()}}).sort("date", -1)
-    stats = await cursor.to_list(length=days)
+    return ContentPerformance(**performance)
+
+@router.get("/stats/cohorts", response_model=List[dict])
+async def get_cohort_retention(weeks: int = 12):
+    """Get weekly visitor cohorts and the share of each cohort active in the following weeks"""
     
-    return [PlatformStats(**stat) for stat in stats]
+    return await analytics_engine.cohorts(limit=weeks)
 
 # Search Analytics API
 @router.post("/search", response_model=SearchQuery)
@@ -226,6 +333,10 @@ async def track_search_query(search_data: SearchQuery, request: Request):
     result = await db.search_queries.insert_one(search_query.dict())
     
     if result.inserted_id:
+        await rollup_service.record_search(search_query)
+        search_trends_service.record(search_query)
+        autocomplete_service.record_search(search_query)
+        
         return search_query
     else:
         raise HTTPException(status_code=500, detail="Failed to track search query")
@@ -234,198 +345,15 @@ async def track_search_query(search_data: SearchQuery, request: Request):
 async def get_popular_searches(limit: int = 10, days: int = 7):
     """Get popular search queries"""
     
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": start_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$query",
-                "count": {"$sum": 1},
-                "avg_results": {"$avg": "$results_count"}
-            }
-        },
-        {
-            "$sort": {"count": -1}
-        },
-        {
-            "$limit": limit
-        }
-    ]
-    
-    popular_searches = await db.search_queries.aggregate(pipeline).to_list(limit)
-    
-    return popular_searches
+    return search_trends_service.popular(days=days, limit=limit)
 
 # Helper functions
-async def update_article_stats(article_id: str):
-    """Update article statistics"""
-    
-    # Count total views
-    total_views = await db.pageviews.count_documents({"article_id": article_id})
-    
-    # Count unique views (by IP)
-    unique_views = len(await db.pageviews.distinct("ip_address", {"article_id": article_id}))
-    
-    # Count engagement
-    total_likes = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "like"
-    })
-    
-    total_comments = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "comment"
-    })
-    
-    total_shares = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "share"
-    })
-    
-    # Calculate engagement rate
-    engagement_rate = (total_likes + total_comments + total_shares) / max(total_views, 1) * 100
-    
-    # Update or create stats
-    stats_data = {
-        "article_id": article_id,
-        "total_views": total_views,
-        "unique_views": unique_views,
-        "total_likes": total_likes,
-        "total_comments": total_comments,
-        "total_shares": total_shares,
-        "engagement_rate": engagement_rate
-    }
-    
-    await db.article_stats.update_one(
-        {"article_id": article_id},
-        {"$set": stats_data},
-        upsert=True
-    )
-
 async def update_engagement_stats(engagement: UserEngagement):
     """Update stats based on engagement action"""
     
-    if engagement.target_type == "article":
-        await update_article_stats(engagement.target_id)
-    elif engagement.target_type == "author":
-        await update_author_stats(engagement.target_id)
-
-async def calculate_article_stats(article_id: str) -> ArticleStats:
-    """Calculate comprehensive article statistics"""
-    
-    # Get basic stats
-    total_views = await db.pageviews.count_documents({"article_id": article_id})
-    unique_views = len(await db.pageviews.distinct("ip_address", {"article_id": article_id}))
-    
-    # Get engagement stats
-    total_likes = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "like"
-    })
-    
-    total_comments = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "comment"
-    })
-    
-    total_shares = await db.user_engagement.count_documents({
-        "target_id": article_id,
-        "target_type": "article",
-        "action_type": "share"
-    })
-    
-    # Calculate engagement rate
-    engagement_rate = (total_likes + total_comments + total_shares) / max(total_views, 1) * 100
-    
-    return ArticleStats(
-        article_id=article_id,
-        total_views=total_views,
-        unique_views=unique_views,
-        total_likes=total_likes,
-        total_comments=total_comments,
-        total_shares=total_shares,
-        engagement_rate=engagement_rate
-    )
-
-async def calculate_author_stats(wallet: str) -> AuthorStats:
-    """Calculate comprehensive author statistics"""
-    
-    # Get author's articles
-    author_articles = await db.articles.find({"author_wallet": wallet}).to_list(1000)
-    total_articles = len(author_articles)
-    
-    # Calculate total stats across all articles
-    total_views = 0
-    total_likes = 0
-    total_comments = 0
-    
-    for article in author_articles:
-        article_stats = await calculate_article_stats(article["id"])
-        total_views += article_stats.total_views
-        total_likes += article_stats.total_likes
-        total_comments += article_stats.total_comments
-    
-    # Calculate averages
-    avg_article_views = total_views / max(total_articles, 1)
-    engagement_rate = (total_likes + total_comments) / max(total_views, 1) * 100
-    
-    return AuthorStats(
-        author_wallet=wallet,
-        total_articles=total_articles,
-        total_views=total_views,
-        total_likes=total_likes,
-        total_comments=total_comments,
-        avg_article_views=avg_article_views,
-        engagement_rate=engagement_rate
-    )
-
-async def calculate_platform_stats() -> PlatformStats:
-    """Calculate platform-wide statistics"""
+    cardinality_service.record_engagement(engagement)
+    await rollup_service.record_engagement(engagement)
+    trending_service.record_engagement(engagement)
     
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-    
-    # Total counts
-    total_users = len(await db.authors.distinct("wallet"))
-    total_articles = await db.articles.count_documents({})
-    total_views = await db.pageviews.count_documents({})
-    total_likes = await db.user_engagement.count_documents({"action_type": "like"})
-    total_comments = await db.user_engagement.count_documents({"action_type": "comment"})
-    
-    # Today's activity
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    
-    active_users = len(await db.user_engagement.distinct("user_wallet", {
-        "created_at": {"$gte": today_start, "$lte": today_end}
-    }))
-    
-    new_users = await db.authors.count_documents({
-        "created_at": {"$gte": today_start, "$lte": today_end}
-    })
-    
-    new_articles = await db.articles.count_documents({
-        "created_at": {"$gte": today_start, "$lte": today_end}
-    })
-    
-    return PlatformStats(
-        date=today,
-        total_users=total_users,
-        total_articles=total_articles,
-        total_views=total_views,
-        total_likes=total_likes,
-        total_comments=total_comments,
-        active_users=active_users,
-        new_users=new_users,
-        new_articles=new_articles
-    ) 
\ No newline at end of file
+    if engagement.target_type == "article":
+        await article_stats_service.record_engagement(engagement)
@@ -1,9 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
-from models.article import Article, ArticleCreate, ArticleUpdate, ArticleResponse, ArticleSearchQuery
+from models.article import Article, ArticleCreate, ArticleUpdate, ArticleResponse, ArticleSearchQuery, ArticleSearchResults
+from services.article_search_service import article_search_service
+from services.autocomplete_service import autocomplete_service
+from services.catalog_stats_service import catalog_stats_service
+from services.fuzzy_search_service import fuzzy_search_service, FUZZY_MIN_RESULTS
 from services.irys_service import irys_service
+from services.related_articles_service import related_articles_service
+from services.rollup_service import rollup_service
+from services.timeline_service import timeline_service
 from database import db
 
 router = APIRouter(prefix="/api/articles", tags=["articles"])
@@ -63,6 +70,13 @@ async def create_article(article_data: ArticleCreate):
     result = await db.articles.insert_one(article.dict())
     
     if result.inserted_id:
+        await rollup_service.record_article_created(article.id, article.author_wallet, article.created_at)
+        autocomplete_service.record_article(article)
+        await catalog_stats_service.record_article_changed(None, article)
+        article_search_service.record_article_changed(None, article)
+        fuzzy_search_service.record_article(article)
+        timeline_service.fan_out_in_background(article)
+        
         return ArticleResponse(**article.dict())
     else:
         raise HTTPException(status_code=500, detail="Failed to create article")
@@ -89,6 +103,8 @@ async def update_article_irys_id(article_id: str, irys_id: str, irys_url: str):
     # Fetch and return updated article
     updated_article = await db.articles.find_one({"id": article_id})
     if updated_article:
+        # Fan-out is idempotent, so articles pushed on create are not duplicated
+        timeline_service.fan_out_in_background(Article(**updated_article))
         return ArticleResponse(**updated_article)
     else:
         raise HTTPException(status_code=404, detail="Article not found")
@@ -182,6 +198,17 @@ async def get_article(article_id: str):
     raise HTTPException(status_code=404, detail="Article not found")
 
 
+@router.get("/{article_id}/related", response_model=List[ArticleResponse])
+async def get_related_articles(article_id: str, limit: int = 5):
+    """Get the articles most similar to an article by title, tags and content"""
+    
+    related = await related_articles_service.related(article_id, min(limit, 50))
+    if related is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    
+    return related
+
+
 @router.get("/author/{author_wallet}", response_model=List[ArticleResponse])
 async def get_articles_by_author(author_wallet: str, limit: int = 20, offset: int = 0):
     """Get articles by author wallet address"""
@@ -225,38 +252,30 @@ async def get_articles_by_author(author_wallet: str, limit: int = 20, offset: in
         return []
 
 
-@router.post("/search", response_model=List[ArticleResponse])
+@router.post("/search", response_model=Union[ArticleSearchResults, List[ArticleResponse]])
 async def search_articles(search_query: ArticleSearchQuery):
-    """Search articles by various criteria"""
-    
-    # Build MongoDB query
-    mongo_query = {"status": "published"}
-    
-    if search_query.query:
-        # Full text search on title and content
-        mongo_query["$or"] = [
-            {"title": {"$regex": search_query.query, "$options": "i"}},
-            {"content": {"$regex": search_query.query, "$options": "i"}},
-            {"excerpt": {"$regex": search_query.query, "$options": "i"}}
-        ]
-    
-    if search_query.author:
-        mongo_query["author_wallet"] = search_query.author
-    
-    if search_query.tags:
-        mongo_query["tags"] = {"$in": search_query.tags}
-    
-    if search_query.category:
-        mongo_query["category"] = search_query.category
+    """Search articles by various criteria, optionally with total and facet counts"""
     
     # Search in database
-    cursor = db.articles.find(mongo_query).sort("published_at", -1).skip(search_query.offset).limit(search_query.limit)
-    articles = await cursor.to_list(length=search_query.limit)
+    if search_query.include_facets:
+        search_results = await article_search_service.search(search_query)
+        result = search_results.articles
+    else:
+        result = await article_search_service.page(search_query)
+    
+    # Fallback hits are kept apart: total and facets describe the exact matches only
+    suggestions = []
     
-    result = [ArticleResponse(**article) for article in articles]
+    # Few exact matches on the first page: the query may be misspelled
+    if search_query.query and search_query.offset == 0 and len(result) < FUZZY_MIN_RESULTS:
+        suggestions.extend(await fuzzy_search_service.search(
+            search_query,
+            exclude=[article.id for article in result],
+            limit=search_query.limit - len(result)
+        ))
     
     # If no results from database and we have tags, try Irys
-    if not result and search_query.tags:
+    if not result and not suggestions and search_query.tags:
         try:
             irys_articles = await irys_service.search_articles_by_tags(search_query.tags, search_query.limit)
             
@@ -279,8 +298,11 @@ async def search_articles(search_query: ArticleSearchQuery):
                     published_at=datetime.fromtimestamp(int(parsed["timestamp"]) / 1000) if parsed["timestamp"] else datetime.utcnow(),
                     views=0
                 )
-                result.append(article_response)
+                suggestions.append(article_response)
         except Exception as e:
             print(f"Error searching Irys: {e}")
     
-    return result
\ No newline at end of file
+    if search_query.include_facets:
+        search_results.suggestions = suggestions
+        return search_results
+    return result + suggestions
\ No newline at end of file
@@ -3,6 +3,9 @@ from typing import List
 from datetime import datetime
 
 from models.author import AuthorProfile, AuthorProfileCreate, AuthorProfileUpdate
+from services.autocomplete_service import autocomplete_service
+from services.catalog_stats_service import catalog_stats_service
+from services.rollup_service import rollup_service
 from database import db
 
 router = APIRouter(prefix="/api/authors", tags=["authors"])
@@ -30,6 +33,10 @@ async def create_author_profile(profile_data: AuthorProfileCreate):
     result = await db.authors.insert_one(profile.dict())
     
     if result.inserted_id:
+        await rollup_service.record_user_created(profile.created_at)
+        await catalog_stats_service.record_author_created()
+        autocomplete_service.record_author(profile)
+        
         return profile
     else:
         raise HTTPException(status_code=500, detail="Failed to create profile")
@@ -65,7 +72,9 @@ async def update_author_profile(wallet_address: str, profile_update: AuthorProfi
     # Return updated profile
     updated_profile = await db.authors.find_one({"wallet_address": wallet_address})
     if updated_profile:
-        return AuthorProfile(**updated_profile)
+        profile = AuthorProfile(**updated_profile)
+        autocomplete_service.record_author(profile)
+        return profile
     else:
         raise HTTPException(status_code=404, detail="Profile not found")
 
@@ -96,6 +105,8 @@ async def increment_article_count(wallet_address: str):
             total_articles=1
         )
         await db.authors.insert_one(profile.dict())
+        await rollup_service.record_user_created(profile.created_at)
+        await catalog_stats_service.record_author_created()
     
     return {"message": "Article count updated"}
 
@@ -116,5 +127,7 @@ async def increment_view_count(wallet_address: str, views: int = 1):
             total_views=views
         )
         await db.authors.insert_one(profile.dict())
+        await rollup_service.record_user_created(profile.created_at)
+        await catalog_stats_service.record_author_created()
     
     return {"message": "View count updated"}
\ No newline at end of file
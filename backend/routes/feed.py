@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from typing import List
+
+from models.article import ArticleResponse
+from services.recommendation_engine import recommendation_engine
+from services.timeline_service import timeline_service
+
+router = APIRouter(prefix="/api/feed", tags=["feed"])
+
+
+@router.get("/for-you/{wallet}", response_model=List[ArticleResponse])
+async def get_for_you_feed(wallet: str, limit: int = 20):
+    """Get personalized article recommendations for a wallet"""
+    
+    return await recommendation_engine.for_you(wallet, min(limit, 100))
+
+
+@router.get("/following/{wallet}", response_model=List[ArticleResponse])
+async def get_following_feed(wallet: str, limit: int = 20, offset: int = 0):
+    """Get the newest articles from authors a wallet subscribes to"""
+    
+    return await timeline_service.timeline(wallet, min(limit, 100), offset)
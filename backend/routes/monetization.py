@@ -1,32 +1,46 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header
+from typing import List, Optional
 from datetime import datetime, timedelta
-from decimal import Decimal
+
+from bson.decimal128 import Decimal128
 
 from models.monetization import (
     Tip, TipCreate, PaidContent, PaidContentCreate, PaidContentUpdate,
-    Purchase, PurchaseCreate, Subscription, SubscriptionCreate, RevenueStats
+    Purchase, PurchaseCreate, Subscription, SubscriptionCreate, RevenueStats, CurrencyBalance,
+    AccessCheck, ArticleAccess
+)
+from services.entitlement_service import entitlement_service
+from services.idempotency_service import idempotency_service
+from services.ledger_service import (
+    ledger_service, tip_event, purchase_event, subscription_event, cancellation_event
 )
+from services.timeline_service import timeline_service
 from database import db
 
 router = APIRouter(prefix="/api/monetization", tags=["monetization"])
 
 # Tips API
 @router.post("/tips", response_model=Tip)
-async def create_tip(tip_data: TipCreate):
-    """Create a new tip"""
+async def create_tip(tip_data: TipCreate, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Create a new tip; retries with the same Idempotency-Key (or transaction hash) replay the first response"""
     
+    return await idempotency_service.run(
+        "tips", idempotency_key or tip_data.transaction_hash, tip_data, lambda: _create_tip(tip_data)
+    )
+
+async def _create_tip(tip_data: TipCreate):
     tip = Tip(**tip_data.dict())
     
     # Insert into MongoDB
-    result = await db.tips.insert_one(tip.dict())
+    result = await db.tips.insert_one(tip.to_mongo())
     
     if result.inserted_id:
         # Update author stats
         await db.authors.update_one(
             {"wallet": tip.to_wallet},
-            {"$inc": {"total_tips_received": float(tip.amount)}}
+            {"$inc": {"total_tips_received": Decimal128(tip.amount)}}
         )
+        await ledger_service.record(tip_event(tip.dict()))
         
         return tip
     else:
@@ -67,9 +81,10 @@ async def create_paid_content(paid_content_data: PaidContentCreate):
     
     paid_content = PaidContent(**paid_content_data.dict())
     
-    result = await db.paid_content.insert_one(paid_content.dict())
+    result = await db.paid_content.insert_one(paid_content.to_mongo())
     
     if result.inserted_id:
+        entitlement_service.invalidate_article(paid_content.article_id)
         return paid_content
     else:
         raise HTTPException(status_code=500, detail="Failed to create paid content")
@@ -89,7 +104,7 @@ async def get_paid_content(article_id: str):
 async def update_paid_content(article_id: str, update_data: PaidContentUpdate):
     """Update paid content"""
     
-    update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
+    update_dict = {k: v for k, v in update_data.to_mongo().items() if v is not None}
     update_dict["updated_at"] = datetime.utcnow()
     
     result = await db.paid_content.update_one(
@@ -99,6 +114,7 @@ async def update_paid_content(article_id: str, update_data: PaidContentUpdate):
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Paid content not found")
+    entitlement_service.invalidate_article(article_id)
     
     # Fetch and return updated paid content
     updated_content = await db.paid_content.find_one({"article_id": article_id})
@@ -118,17 +134,36 @@ async def deactivate_paid_content(article_id: str):
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Paid content not found")
+    entitlement_service.invalidate_article(article_id)
     
     return {"message": "Paid content deactivated successfully"}
 
+# Access API
+@router.get("/access/{wallet}/{article_id}", response_model=ArticleAccess)
+async def check_access(wallet: str, article_id: str):
+    """Check whether a wallet can read an article"""
+    
+    return await entitlement_service.check(wallet, article_id)
+
+@router.post("/access/{wallet}", response_model=List[ArticleAccess])
+async def check_access_batch(wallet: str, access_check: AccessCheck):
+    """Check which of a page of articles a wallet can read"""
+    
+    return await entitlement_service.check_many(wallet, access_check.article_ids)
+
 # Purchase API
 @router.post("/purchases", response_model=Purchase)
-async def create_purchase(purchase_data: PurchaseCreate):
-    """Create a purchase record"""
+async def create_purchase(purchase_data: PurchaseCreate, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Create a purchase record; retries with the same Idempotency-Key (or transaction hash) replay the first response"""
     
+    return await idempotency_service.run(
+        "purchases", idempotency_key or purchase_data.transaction_hash, purchase_data, lambda: _create_purchase(purchase_data)
+    )
+
+async def _create_purchase(purchase_data: PurchaseCreate):
     purchase = Purchase(**purchase_data.dict())
     
-    result = await db.purchases.insert_one(purchase.dict())
+    result = await db.purchases.insert_one(purchase.to_mongo())
     
     if result.inserted_id:
         # Update paid content stats
@@ -136,9 +171,12 @@ async def create_purchase(purchase_data: PurchaseCreate):
             {"article_id": purchase.article_id},
             {"$inc": {
                 "total_purchases": 1,
-                "total_revenue": float(purchase.amount)
+                "total_revenue": Decimal128(purchase.amount)
             }}
         )
+        entitlement_service.record_purchase(purchase.buyer_wallet, purchase.article_id)
+        article = await db.articles.find_one({"id": purchase.article_id}, {"author_wallet": 1})
+        await ledger_service.record(purchase_event(purchase.dict(), article.get("author_wallet") if article else None))
         
         return purchase
     else:
@@ -164,9 +202,14 @@ async def get_article_purchases(article_id: str, limit: int = 20, offset: int =
 
 # Subscription API
 @router.post("/subscriptions", response_model=Subscription)
-async def create_subscription(subscription_data: SubscriptionCreate):
-    """Create a subscription"""
+async def create_subscription(subscription_data: SubscriptionCreate, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Create a subscription; retries with the same Idempotency-Key replay the first response"""
     
+    return await idempotency_service.run(
+        "subscriptions", idempotency_key, subscription_data, lambda: _create_subscription(subscription_data)
+    )
+
+async def _create_subscription(subscription_data: SubscriptionCreate):
     # Check if subscription already exists
     existing = await db.subscriptions.find_one({
         "subscriber_wallet": subscription_data.subscriber_wallet,
@@ -188,7 +231,7 @@ async def create_subscription(subscription_data: SubscriptionCreate):
         next_billing=next_billing
     )
     
-    result = await db.subscriptions.insert_one(subscription.dict())
+    result = await db.subscriptions.insert_one(subscription.to_mongo())
     
     if result.inserted_id:
         # Update author stats
@@ -196,6 +239,9 @@ async def create_subscription(subscription_data: SubscriptionCreate):
             {"wallet": subscription.author_wallet},
             {"$inc": {"active_subscribers": 1}}
         )
+        entitlement_service.record_subscription(subscription.subscriber_wallet, subscription.author_wallet)
+        await ledger_service.record(subscription_event(subscription.dict()))
+        await timeline_service.record_subscription(subscription.subscriber_wallet, subscription.author_wallet)
         
         return subscription
     else:
@@ -238,41 +284,21 @@ async def cancel_subscription(subscription_id: str):
             {"wallet": subscription["author_wallet"]},
             {"$inc": {"active_subscribers": -1}}
         )
+        entitlement_service.record_cancellation(subscription["subscriber_wallet"], subscription["author_wallet"])
+        await ledger_service.record(cancellation_event(subscription))
+        await timeline_service.record_unsubscription(subscription["subscriber_wallet"], subscription["author_wallet"])
     
     return {"message": "Subscription cancelled successfully"}
 
 # Revenue Stats API
 @router.get("/revenue/{wallet}", response_model=RevenueStats)
-async def get_revenue_stats(wallet: str):
-    """Get revenue statistics for a wallet"""
-    
-    # Calculate tips received
-    tips_cursor = db.tips.find({"to_wallet": wallet})
-    tips = await tips_cursor.to_list(length=1000)
-    total_tips = sum(Decimal(tip["amount"]) for tip in tips)
-    
-    # Calculate paid content revenue
-    paid_content_cursor = db.paid_content.find({"article_id": {"$in": [tip["article_id"] for tip in tips if tip.get("article_id")]}})
-    paid_content = await paid_content_cursor.to_list(length=1000)
-    total_paid_content = sum(Decimal(pc["total_revenue"]) for pc in paid_content)
-    
-    # Calculate subscription revenue
-    subscriptions_cursor = db.subscriptions.find({"author_wallet": wallet, "is_active": True})
-    subscriptions = await subscriptions_cursor.to_list(length=1000)
-    total_subscription = sum(Decimal(sub["total_paid"]) for sub in subscriptions)
-    
-    # Calculate purchases made
-    purchases_cursor = db.purchases.find({"buyer_wallet": wallet})
-    purchases = await purchases_cursor.to_list(length=1000)
-    
-    stats = RevenueStats(
-        total_tips_received=total_tips,
-        total_paid_content_revenue=total_paid_content,
-        total_subscription_revenue=total_subscription,
-        total_revenue=total_tips + total_paid_content + total_subscription,
-        tips_count=len(tips),
-        purchases_count=len(purchases),
-        active_subscribers=len(subscriptions)
-    )
+async def get_revenue_stats(wallet: str, currency: Optional[str] = None):
+    """Get revenue statistics for a wallet, in one currency or summed over all of them"""
+    
+    return await ledger_service.revenue(wallet, currency)
+
+@router.get("/ledger/{wallet}", response_model=List[CurrencyBalance])
+async def get_wallet_ledger(wallet: str):
+    """Get per-currency balances and revenue for a wallet"""
     
-    return stats 
\ No newline at end of file
+    return await ledger_service.balances(wallet) 
\ No newline at end of file
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header
+from typing import List, Optional
 from datetime import datetime
 
 from models.nft import (
     NFT, NFTCreate, NFTUpdate, NFTSale, NFTSaleCreate,
     NFTCollection, NFTCollectionCreate, NFTStats
 )
+from services.idempotency_service import idempotency_service
+from services.ledger_service import ledger_service, nft_sale_event
 from database import db
 
 router = APIRouter(prefix="/api/nft", tags=["nft"])
@@ -167,9 +169,14 @@ async def unlist_nft(nft_id: str):
 
 # NFT Sales API
 @router.post("/sales", response_model=NFTSale)
-async def create_nft_sale(sale_data: NFTSaleCreate):
-    """Create an NFT sale record"""
+async def create_nft_sale(sale_data: NFTSaleCreate, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Create an NFT sale record; retries with the same Idempotency-Key (or transaction hash) replay the first response"""
     
+    return await idempotency_service.run(
+        "nft_sales", idempotency_key or sale_data.transaction_hash, sale_data, lambda: _create_nft_sale(sale_data)
+    )
+
+async def _create_nft_sale(sale_data: NFTSaleCreate):
     sale = NFTSale(**sale_data.dict())
     
     result = await db.nft_sales.insert_one(sale.dict())
@@ -190,6 +197,9 @@ async def create_nft_sale(sale_data: NFTSaleCreate):
             {"$set": {"is_listed": False}}
         )
         
+        nft = await db.nfts.find_one({"id": sale.nft_id}, {"creator_wallet": 1})
+        await ledger_service.record(nft_sale_event(sale.dict(), nft.get("creator_wallet") if nft else None))
+        
         return sale
     else:
         raise HTTPException(status_code=500, detail="Failed to create sale")
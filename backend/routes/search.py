@@ -1,9 +1,12 @@
 from fastapi import APIRouter
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 from models.article import ArticleResponse, ArticleSearchQuery
 from routes.articles import search_articles
+from services.autocomplete_service import autocomplete_service
+from services.catalog_stats_service import catalog_stats_service
+from services.related_articles_service import related_articles_service
 
 router = APIRouter(prefix="/api/search", tags=["search"])
 
@@ -21,36 +24,39 @@ class SearchStats(BaseModel):
 
 
 @router.get("/suggestions")
-async def get_search_suggestions(q: str = "", limit: int = 5):
-    """Get search suggestions based on partial query"""
+async def get_search_suggestions(q: str = "", limit: int = 5, types: Optional[str] = None):
+    """Get search suggestions based on partial query
+    
+    `types` is a comma-separated subset of query, title, tag, category, author.
+    """
     
     suggestions = []
     
     if len(q) >= 2:
-        # For now, return basic suggestions
-        # In a real implementation, you'd query your database for popular searches
-        common_queries = [
-            "blockchain", "web3", "defi", "nft", "ethereum", 
-            "crypto", "smart contracts", "decentralized", "mirror", "irys"
-        ]
-        
-        matching = [query for query in common_queries if q.lower() in query.lower()]
-        suggestions = [{"query": query, "count": 0} for query in matching[:limit]]
+        kinds = [kind.strip() for kind in types.split(",")] if types else None
+        suggestions = autocomplete_service.suggest(q, limit=limit, kinds=kinds)
     
     return suggestions
 
 
+@router.get("/similar", response_model=List[ArticleResponse])
+async def get_similar_articles(q: str, limit: int = 10):
+    """Get the articles most similar to free text"""
+    
+    return await related_articles_service.similar(q, min(limit, 50))
+
+
 @router.get("/stats", response_model=SearchStats)
 async def get_search_stats():
     """Get search and discovery statistics"""
     
-    # For now, return placeholder data
-    # In a real implementation, you'd query your database
+    snapshot = await catalog_stats_service.snapshot()
+    
     return SearchStats(
-        total_articles=0,
-        total_authors=0,
-        popular_tags=["blockchain", "web3", "defi", "nft", "ethereum"],
-        recent_searches=["blockchain tutorial", "web3 development", "irys storage"]
+        total_articles=snapshot["total_articles"],
+        total_authors=snapshot["total_authors"],
+        popular_tags=[tag["tag"] for tag in snapshot["tags"][:5]],
+        recent_searches=snapshot["recent_searches"]
     )
 
 
@@ -58,15 +64,9 @@ async def get_search_stats():
 async def get_popular_tags(limit: int = 20):
     """Get popular tags for filtering"""
     
-    # For now, return common Web3 tags
-    # In a real implementation, you'd aggregate from your articles
-    popular_tags = [
-        "blockchain", "web3", "defi", "nft", "ethereum", "bitcoin",
-        "smart-contracts", "dao", "crypto", "decentralized", "mirror",
-        "irys", "arweave", "permanent-storage", "publishing"
-    ]
+    snapshot = await catalog_stats_service.snapshot()
     
-    return popular_tags[:limit]
+    return [tag["tag"] for tag in snapshot["tags"][:limit]]
 
 
 @router.get("/categories")
@@ -18,6 +18,31 @@ from routes.comments import router as comments_router
 from routes.monetization import router as monetization_router
 from routes.nft import router as nft_router
 from routes.analytics import router as analytics_router
+from routes.feed import router as feed_router
+from services.analytics_engine import analytics_engine
+from services.article_search_service import article_search_service
+from services.article_stats_service import article_stats_service
+from services.author_stats_service import author_stats_service
+from services.autocomplete_service import autocomplete_service
+from services.cardinality_service import cardinality_service
+from services.catalog_stats_service import catalog_stats_service
+from services.entitlement_service import entitlement_service
+from services.export_service import export_service
+from services.fuzzy_search_service import fuzzy_search_service
+from services.idempotency_service import idempotency_service
+from services.ledger_service import ledger_service
+from services.pageview_filter import pageview_filter
+from services.platform_stats_service import platform_stats_service
+from services.related_articles_service import related_articles_service
+from services.recommendation_engine import recommendation_engine
+from services.rollup_service import rollup_service
+from services.scheduler import scheduler
+from services.search_trends_service import search_trends_service
+from services.session_service import session_service
+from services.single_flight import stats_flight
+from services.string_dictionary import string_dictionary
+from services.timeline_service import timeline_service
+from services.trending_service import trending_service
 
 
 ROOT_DIR = Path(__file__).parent
@@ -77,6 +102,7 @@ app.include_router(comments_router)
 app.include_router(monetization_router)
 app.include_router(nft_router)
 app.include_router(analytics_router)
+app.include_router(feed_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -93,6 +119,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+HLL_FLUSH_SECONDS = float(os.environ.get("HLL_FLUSH_SECONDS", "10"))
+ROLLUP_COMPACT_SECONDS = float(os.environ.get("ROLLUP_COMPACT_SECONDS", "60"))
+TRENDING_PERSIST_SECONDS = float(os.environ.get("TRENDING_PERSIST_SECONDS", "15"))
+AUTHOR_STATS_REFRESH_SECONDS = float(os.environ.get("AUTHOR_STATS_REFRESH_SECONDS", "300"))
+PLATFORM_STATS_REFRESH_SECONDS = float(os.environ.get("PLATFORM_STATS_REFRESH_SECONDS", "300"))
+PAGEVIEW_FILTER_FLUSH_SECONDS = float(os.environ.get("PAGEVIEW_FILTER_FLUSH_SECONDS", "60"))
+SEARCH_TRENDS_PERSIST_SECONDS = float(os.environ.get("SEARCH_TRENDS_PERSIST_SECONDS", "30"))
+AUTOCOMPLETE_REBUILD_SECONDS = float(os.environ.get("AUTOCOMPLETE_REBUILD_SECONDS", "600"))
+CATALOG_STATS_REFRESH_SECONDS = float(os.environ.get("CATALOG_STATS_REFRESH_SECONDS", "60"))
+CATALOG_STATS_RECONCILE_SECONDS = float(os.environ.get("CATALOG_STATS_RECONCILE_SECONDS", "3600"))
+FUZZY_SEARCH_REBUILD_SECONDS = float(os.environ.get("FUZZY_SEARCH_REBUILD_SECONDS", "900"))
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get("SIMILARITY_REFRESH_SECONDS", "120"))
+SESSION_SWEEP_SECONDS = float(os.environ.get("SESSION_SWEEP_SECONDS", "60"))
+ANALYTICS_ENGINE_SECONDS = float(os.environ.get("ANALYTICS_ENGINE_SECONDS", "3600"))
+TIMELINE_AUTHORS_REFRESH_SECONDS = float(os.environ.get("TIMELINE_AUTHORS_REFRESH_SECONDS", "60"))
+RECOMMENDATION_ENGINE_SECONDS = float(os.environ.get("RECOMMENDATION_ENGINE_SECONDS", "900"))
+LEDGER_SWEEP_SECONDS = float(os.environ.get("LEDGER_SWEEP_SECONDS", "60"))
+ENTITLEMENT_REFRESH_SECONDS = float(os.environ.get("ENTITLEMENT_REFRESH_SECONDS", "5"))
+ENTITLEMENT_REBUILD_SECONDS = float(os.environ.get("ENTITLEMENT_REBUILD_SECONDS", "3600"))
+
+@app.on_event("startup")
+async def create_indexes():
+    await article_stats_service.ensure_indexes()
+    await author_stats_service.ensure_indexes()
+    await cardinality_service.ensure_indexes()
+    await rollup_service.ensure_indexes()
+    await platform_stats_service.ensure_indexes()
+    if stats_flight.lease:
+        await stats_flight.lease.ensure_indexes()
+    await trending_service.ensure_indexes()
+    await export_service.ensure_indexes()
+    await analytics_engine.ensure_indexes()
+    await session_service.ensure_indexes()
+    await pageview_filter.ensure_indexes()
+    await string_dictionary.ensure_indexes()
+    await search_trends_service.ensure_indexes()
+    await article_search_service.ensure_indexes()
+    await catalog_stats_service.ensure_indexes()
+    await related_articles_service.ensure_indexes()
+    await recommendation_engine.ensure_indexes()
+    await timeline_service.ensure_indexes()
+    await ledger_service.ensure_indexes()
+    await idempotency_service.ensure_indexes()
+    await entitlement_service.ensure_indexes()
+
+@app.on_event("startup")
+async def start_scheduler():
+    await trending_service.load()
+    await search_trends_service.load()
+    related_articles_service.reload()
+    await timeline_service.load()
+    scheduler.every(TRENDING_PERSIST_SECONDS, trending_service.persist, name="persist_trending_scores")
+    scheduler.every(HLL_FLUSH_SECONDS, cardinality_service.flush, name="flush_hll_sketches")
+    scheduler.every(ROLLUP_COMPACT_SECONDS, rollup_service.compact, name="compact_rollups")
+    scheduler.every(AUTHOR_STATS_REFRESH_SECONDS, author_stats_service.refresh_stale, name="refresh_author_stats")
+    scheduler.every(PLATFORM_STATS_REFRESH_SECONDS, platform_stats_service.refresh, name="refresh_platform_stats")
+    scheduler.every(PAGEVIEW_FILTER_FLUSH_SECONDS, pageview_filter.flush, name="flush_pageview_filter_counts")
+    scheduler.every(SEARCH_TRENDS_PERSIST_SECONDS, search_trends_service.persist, name="persist_search_trends")
+    scheduler.every(AUTOCOMPLETE_REBUILD_SECONDS, autocomplete_service.rebuild, name="rebuild_autocomplete")
+    scheduler.every(CATALOG_STATS_REFRESH_SECONDS, catalog_stats_service.refresh, name="refresh_catalog_stats")
+    scheduler.every(CATALOG_STATS_RECONCILE_SECONDS, catalog_stats_service.reconcile, name="reconcile_catalog_stats")
+    scheduler.every(FUZZY_SEARCH_REBUILD_SECONDS, fuzzy_search_service.rebuild, name="rebuild_fuzzy_search")
+    scheduler.every(SIMILARITY_REFRESH_SECONDS, related_articles_service.refresh, name="refresh_similarity_index")
+    scheduler.every(TIMELINE_AUTHORS_REFRESH_SECONDS, timeline_service.load, name="load_pulled_timeline_authors")
+    scheduler.every(SESSION_SWEEP_SECONDS, session_service.sweep, name="close_idle_sessions")
+    scheduler.every(ANALYTICS_ENGINE_SECONDS, analytics_engine.run_if_leader, name="run_analytics_engine")
+    scheduler.every(RECOMMENDATION_ENGINE_SECONDS, recommendation_engine.run_if_leader, name="run_recommendation_engine")
+    scheduler.every(LEDGER_SWEEP_SECONDS, ledger_service.apply_pending, name="apply_pending_ledger_events")
+    scheduler.every(ENTITLEMENT_REFRESH_SECONDS, entitlement_service.refresh, name="refresh_entitlement_filter")
+    scheduler.every(ENTITLEMENT_REBUILD_SECONDS, entitlement_service.rebuild, name="rebuild_entitlement_filter")
+    platform_stats_service.refresh_in_background()
+    autocomplete_service.rebuild_in_background()
+    catalog_stats_service.reconcile_in_background()
+    related_articles_service.refresh_in_background()
+    fuzzy_search_service.rebuild_in_background()
+    entitlement_service.rebuild_in_background()
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+    await cardinality_service.flush()
+    await trending_service.persist()
+    await session_service.shutdown()
+    await pageview_filter.flush()
+    await search_trends_service.persist()
+    recommendation_engine.shutdown()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -0,0 +1,396 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from models.analytics import ContentPerformance
+from services.single_flight import MongoLease
+from database import db
+
+logger = logging.getLogger(__name__)
+
+ENGINE_CHUNK_SIZE = 100_000
+ENGINE_WRITE_BATCH_SIZE = 1000
+ANALYTICS_WINDOW_DAYS = int(os.environ.get("ANALYTICS_WINDOW_DAYS", "90"))
+COHORT_WEEKS = int(os.environ.get("COHORT_WEEKS", "12"))
+
+# Engagement actions counted per article, in column order
+ENGAGEMENT_ACTIONS = ["like", "comment", "share"]
+
+_MS_PER_DAY = 86_400_000
+
+
+class Codes:
+    """Maps string ids to dense int32 codes so group-bys are bincounts"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, items: Iterable[str]) -> np.ndarray:
+        index = self.index
+        codes = []
+        for item in items:
+            code = index.get(item)
+            if code is None:
+                code = index[item] = len(self.values)
+                self.values.append(item)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+
+
+def _timestamps(values: List[datetime]) -> np.ndarray:
+    """Datetimes -> int64 milliseconds since the epoch"""
+    return np.array(values, dtype="datetime64[ms]").astype(np.int64)
+
+
+def _concatenate(columns: Dict[str, List[np.ndarray]]) -> Dict[str, np.ndarray]:
+    dtypes = {
+        "ts": np.int64, "article": np.int32, "visitor": np.int32, "action": np.int8,
+        "entry": np.int32, "pages_visited": np.int64, "page_article": np.int32, "page_seconds": np.float64,
+    }
+    return {
+        name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtypes[name])
+        for name, chunks in columns.items()
+    }
+
+
+def _group_order(group: np.ndarray, within: np.ndarray) -> np.ndarray:
+    """Permutation sorting rows by (group, within).
+
+    Packs both columns into one int64 key when they fit, which sorts several
+    times faster than np.lexsort.
+    """
+    low = within.min()
+    span_bits = int(within.max() - low).bit_length()
+    group_bits = int(group.max()).bit_length()
+    if span_bits + group_bits < 63:
+        key = (group.astype(np.int64) << span_bits) | (within - low).astype(np.int64)
+        return np.argsort(key)
+    return np.lexsort((within, group))
+
+
+def session_metrics(views: np.ndarray, entry: np.ndarray, pages_visited: np.ndarray,
+                    page_article: np.ndarray, page_seconds: np.ndarray, n_articles: int) -> Dict[str, np.ndarray]:
+    """Per-article time on page, bounce rate and retention from finished sessions.
+
+    `entry` and `pages_visited` hold one row per session; `page_article` and
+    `page_seconds` one row per page followed by another page in its visit
+    (the exit page has no measurable dwell time). A bounce is a visit of a
+    single page, counted against its entry article.
+    """
+    entries = np.bincount(entry, minlength=n_articles)
+    bounces = np.bincount(entry[pages_visited == 1], minlength=n_articles)
+    dwell_sum = np.bincount(page_article, weights=page_seconds, minlength=n_articles)
+    dwell_count = np.bincount(page_article, minlength=n_articles)
+
+    return {
+        "views": views,
+        "avg_time_on_page": dwell_sum / np.maximum(dwell_count, 1),
+        "bounce_rate": bounces / np.maximum(entries, 1) * 100,
+        # Share of views after which the reader went on to another page
+        "retention_score": dwell_count / np.maximum(views, 1),
+    }
+
+
+def engagement_counts(article: np.ndarray, action: np.ndarray, n_articles: int) -> np.ndarray:
+    """(n_articles, len(ENGAGEMENT_ACTIONS)) matrix of engagement counts"""
+    width = len(ENGAGEMENT_ACTIONS)
+    cells = article.astype(np.int64) * width + action
+    return np.bincount(cells, minlength=n_articles * width).reshape(n_articles, width)
+
+
+def cohort_table(ts: np.ndarray, visitor: np.ndarray, weeks: int):
+    """Weekly retention cohorts.
+
+    Returns (cohort_weeks, counts) where cohort_weeks[i] is the week index
+    (days since the epoch // 7, weeks starting Monday) a cohort first
+    appeared and counts[i, k] is how many of its visitors were active k weeks
+    later. counts[:, 0] is the cohort size. "First appeared" is relative to
+    the events passed in, so the oldest cohorts of a window include earlier
+    visitors.
+    """
+    if len(ts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, weeks), dtype=np.int64)
+
+    # The epoch was a Thursday; shift by 3 days so weeks start on Monday
+    week = (ts // _MS_PER_DAY + 3) // 7
+
+    order = _group_order(visitor, week)
+    visitor, week = visitor[order], week[order]
+
+    new_visitor = np.insert(visitor[1:] != visitor[:-1], 0, True)
+    first_rows = np.flatnonzero(new_visitor)
+    first_week = week[first_rows]
+    cohort = np.repeat(first_week, np.diff(np.append(first_rows, len(week))))
+    offset = week - cohort
+
+    # Count each visitor once per active week
+    new_week = new_visitor | np.insert(week[1:] != week[:-1], 0, True)
+    keep = new_week & (offset < weeks)
+
+    base = first_week.min()
+    span = int(first_week.max() - base + 1)
+    cells = (cohort[keep] - base) * weeks + offset[keep]
+    counts = np.bincount(cells, minlength=span * weeks).reshape(span, weeks)
+
+    present = counts[:, 0] > 0
+    return (np.arange(span, dtype=np.int64) + base)[present], counts[present]
+
+
+def week_start(week: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(days=int(week) * 7 - 3)
+
+
+class AnalyticsEngine:
+    """Batch job computing derived metrics from raw events with vectorized NumPy group-bys.
+
+    Event columns are read from Mongo in chunks into typed arrays (string ids
+    become int32 codes), the metrics are computed off the event loop, and the
+    results are written back with bulk upserts:
+
+    - article_stats.avg_time_on_page / bounce_rate, from the sessionizer's user_sessions
+    - content_performance (viral_coefficient, retention_score, engagement_rate)
+    - cohort_retention (weekly visitor cohorts)
+    """
+
+    def __init__(
+        self,
+        database=None,
+        window_days: int = ANALYTICS_WINDOW_DAYS,
+        cohort_weeks: int = COHORT_WEEKS,
+    ):
+        self.db = database if database is not None else db
+        self.window = timedelta(days=window_days)
+        self.cohort_weeks = cohort_weeks
+        # A run can outlast the stats lease, so the engine holds its own
+        self.lease = MongoLease(self.db.stats_leases, ttl=timedelta(hours=1))
+
+    async def ensure_indexes(self):
+        await self.db.content_performance.create_index("content_id", unique=True)
+        await self.db.cohort_retention.create_index("cohort_start", unique=True)
+        await self.db.pageviews.create_index("created_at")
+        await self.db.user_engagement.create_index("created_at")
+        await self.db.user_sessions.create_index("ended_at")
+
+    # Loading
+
+    async def _load_pageviews(self, since: datetime, articles: Codes, visitors: Codes) -> Dict[str, np.ndarray]:
+        columns: Dict[str, List[np.ndarray]] = {"ts": [], "article": [], "visitor": []}
+
+        def flush(rows: List[Dict[str, Any]]):
+            columns["ts"].append(_timestamps([row["created_at"] for row in rows]))
+            columns["article"].append(articles.encode(row["article_id"] for row in rows))
+            columns["visitor"].append(visitors.encode(
+                row.get("user_wallet") or row.get("ip_address") or row.get("session_id") or "" for row in rows
+            ))
+
+        cursor = self.db.pageviews.find(
+            {"created_at": {"$gte": since}},
+            {"_id": 0, "article_id": 1, "session_id": 1, "ip_address": 1, "user_wallet": 1, "created_at": 1},
+            batch_size=ENGINE_CHUNK_SIZE
+        )
+        rows: List[Dict[str, Any]] = []
+        async for row in cursor:
+            rows.append(row)
+            if len(rows) >= ENGINE_CHUNK_SIZE:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+
+        return _concatenate(columns)
+
+    async def _load_sessions(self, since: datetime, articles: Codes) -> Dict[str, np.ndarray]:
+        columns: Dict[str, List[np.ndarray]] = {"entry": [], "pages_visited": [], "page_article": [], "page_seconds": []}
+
+        def flush(rows: List[Dict[str, Any]]):
+            # Visits with engagement but no pageview have no entry page
+            visits = [row for row in rows if row.get("entry_article_id")]
+            columns["entry"].append(articles.encode(row["entry_article_id"] for row in visits))
+            columns["pages_visited"].append(np.array([row.get("pages_visited", 0) for row in visits], dtype=np.int64))
+            timed = [page for row in visits for page in row.get("pages", []) if page.get("seconds") is not None]
+            columns["page_article"].append(articles.encode(page["article_id"] for page in timed))
+            columns["page_seconds"].append(np.array([page["seconds"] for page in timed], dtype=np.float64))
+
+        cursor = self.db.user_sessions.find(
+            {"ended_at": {"$gte": since}},
+            {"_id": 0, "entry_article_id": 1, "pages_visited": 1, "pages.article_id": 1, "pages.seconds": 1},
+            batch_size=ENGINE_CHUNK_SIZE
+        )
+        rows: List[Dict[str, Any]] = []
+        async for row in cursor:
+            rows.append(row)
+            if len(rows) >= ENGINE_CHUNK_SIZE:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+
+        return _concatenate(columns)
+
+    async def _load_engagement(self, since: datetime, articles: Codes, visitors: Codes) -> Dict[str, np.ndarray]:
+        columns: Dict[str, List[np.ndarray]] = {"ts": [], "article": [], "action": [], "visitor": []}
+        action_codes = {action: code for code, action in enumerate(ENGAGEMENT_ACTIONS)}
+
+        def flush(rows: List[Dict[str, Any]]):
+            columns["ts"].append(_timestamps([row["created_at"] for row in rows]))
+            columns["visitor"].append(visitors.encode(row["user_wallet"] for row in rows))
+            # Every event counts towards cohorts; only article likes/comments/shares towards articles
+            counted = [
+                row for row in rows
+                if row.get("target_type") == "article" and row.get("action_type") in action_codes
+            ]
+            columns["article"].append(articles.encode(row["target_id"] for row in counted))
+            columns["action"].append(np.array([action_codes[row["action_type"]] for row in counted], dtype=np.int8))
+
+        cursor = self.db.user_engagement.find(
+            {"created_at": {"$gte": since}},
+            {"_id": 0, "user_wallet": 1, "action_type": 1, "target_id": 1, "target_type": 1, "created_at": 1},
+            batch_size=ENGINE_CHUNK_SIZE
+        )
+        rows: List[Dict[str, Any]] = []
+        async for row in cursor:
+            rows.append(row)
+            if len(rows) >= ENGINE_CHUNK_SIZE:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+
+        return _concatenate(columns)
+
+    # Computing
+
+    def compute(self, pageviews: Dict[str, np.ndarray], sessions: Dict[str, np.ndarray],
+                engagement: Dict[str, np.ndarray], n_articles: int) -> Dict[str, Any]:
+        """Pure NumPy part of a run; safe to call from a worker thread"""
+        metrics = session_metrics(
+            np.bincount(pageviews["article"], minlength=n_articles),
+            sessions["entry"], sessions["pages_visited"], sessions["page_article"], sessions["page_seconds"],
+            n_articles
+        )
+        counts = engagement_counts(engagement["article"], engagement["action"], n_articles)
+
+        views = metrics["views"]
+        likes, comments, shares = counts[:, 0], counts[:, 1], counts[:, 2]
+        metrics.update({
+            "likes": likes,
+            "comments": comments,
+            "shares": shares,
+            "engagement_rate": (likes + comments + shares) / np.maximum(views, 1) * 100,
+            # Shares per view: how likely a reader is to pass the article on
+            "viral_coefficient": shares / np.maximum(views, 1),
+        })
+
+        cohorts = cohort_table(
+            np.concatenate([pageviews["ts"], engagement["ts"]]),
+            np.concatenate([pageviews["visitor"], engagement["visitor"]]),
+            self.cohort_weeks
+        )
+        return {"articles": metrics, "cohorts": cohorts}
+
+    # Writing
+
+    async def _bulk(self, collection, operations: List[UpdateOne]):
+        for start in range(0, len(operations), ENGINE_WRITE_BATCH_SIZE):
+            await collection.bulk_write(operations[start:start + ENGINE_WRITE_BATCH_SIZE], ordered=False)
+
+    async def _write(self, article_ids: List[str], result: Dict[str, Any], computed_at: datetime):
+        metrics = result["articles"]
+        # Only articles with pageviews in the window have measurable reading metrics
+        viewed = np.flatnonzero(metrics["views"] > 0)
+
+        stats_operations = []
+        performance_operations = []
+        for i in viewed.tolist():
+            article_id = article_ids[i]
+            stats_operations.append(UpdateOne(
+                {"article_id": article_id},
+                {"$set": {
+                    "avg_time_on_page": float(metrics["avg_time_on_page"][i]),
+                    "bounce_rate": float(metrics["bounce_rate"][i]),
+                }},
+                upsert=True
+            ))
+
+            performance = ContentPerformance(
+                content_id=article_id,
+                content_type="article",
+                views=int(metrics["views"][i]),
+                likes=int(metrics["likes"][i]),
+                comments=int(metrics["comments"][i]),
+                shares=int(metrics["shares"][i]),
+                engagement_rate=float(metrics["engagement_rate"][i]),
+                viral_coefficient=float(metrics["viral_coefficient"][i]),
+                retention_score=float(metrics["retention_score"][i]),
+            )
+            performance_operations.append(UpdateOne(
+                {"content_id": article_id},
+                {"$set": {**performance.dict(), "window_days": self.window.days, "computed_at": computed_at}},
+                upsert=True
+            ))
+
+        cohort_weeks, counts = result["cohorts"]
+        cohort_operations = []
+        for week, row in zip(cohort_weeks.tolist(), counts.tolist()):
+            size = row[0]
+            cohort_operations.append(UpdateOne(
+                {"cohort_start": week_start(week)},
+                {"$set": {
+                    "size": size,
+                    "active": row,
+                    "retention": [count / size for count in row],
+                    "computed_at": computed_at,
+                }},
+                upsert=True
+            ))
+
+        await self._bulk(self.db.article_stats, stats_operations)
+        await self._bulk(self.db.content_performance, performance_operations)
+        await self._bulk(self.db.cohort_retention, cohort_operations)
+
+    async def run(self, now: Optional[datetime] = None):
+        """Load the window's events, compute every metric and write the results back"""
+        now = now or datetime.utcnow()
+        since = now - self.window
+
+        articles, visitors = Codes(), Codes()
+        pageviews = await self._load_pageviews(since, articles, visitors)
+        sessions = await self._load_sessions(since, articles)
+        engagement = await self._load_engagement(since, articles, visitors)
+
+        result = await asyncio.to_thread(self.compute, pageviews, sessions, engagement, len(articles))
+        await self._write(articles.values, result, now)
+
+        logger.info(
+            f"Analytics engine processed {len(pageviews['ts'])} pageviews and "
+            f"{len(engagement['ts'])} engagement events for {len(articles)} articles"
+        )
+
+    async def run_if_leader(self):
+        """Scheduled entry point: only one worker runs the job at a time"""
+        if not await self.lease.acquire("analytics_engine"):
+            return
+        try:
+            await self.run()
+        finally:
+            await self.lease.release("analytics_engine")
+
+    # Reads
+
+    async def cohorts(self, limit: int = COHORT_WEEKS) -> List[dict]:
+        """Most recent cohort rows, oldest first"""
+        rows = await self.db.cohort_retention.find({}, {"_id": 0}).sort("cohort_start", -1).limit(limit).to_list(None)
+        return rows[::-1]
+
+
+# Global instance
+analytics_engine = AnalyticsEngine()
@@ -0,0 +1,34 @@
+from collections import OrderedDict
+from typing import Optional
+
+from database import db
+
+
+class ArticleAuthorCache:
+    """Bounded LRU of article_id -> author_wallet for attributing events to authors"""
+
+    def __init__(self, database=None, max_size: int = 10000):
+        self.db = database if database is not None else db
+        self.max_size = max_size
+        self._authors: "OrderedDict[str, Optional[str]]" = OrderedDict()
+
+    async def get(self, article_id: str) -> Optional[str]:
+        if article_id in self._authors:
+            self._authors.move_to_end(article_id)
+            return self._authors[article_id]
+
+        article = await self.db.articles.find_one({"id": article_id}, {"author_wallet": 1})
+        author_wallet = article.get("author_wallet") if article else None
+
+        self.put(article_id, author_wallet)
+        return author_wallet
+
+    def put(self, article_id: str, author_wallet: Optional[str]):
+        self._authors[article_id] = author_wallet
+        self._authors.move_to_end(article_id)
+        if len(self._authors) > self.max_size:
+            self._authors.popitem(last=False)
+
+
+# Global instance
+article_authors = ArticleAuthorCache()
@@ -0,0 +1,234 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.article import Article, ArticleResponse, ArticleSearchQuery, ArticleSearchResults, FacetCount, SearchFacets
+from database import db
+
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "30"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_FACET_LIMIT = int(os.environ.get("SEARCH_FACET_LIMIT", "20"))
+
+# Only what ArticleResponse needs; content and html are the bulk of an article
+RESPONSE_PROJECTION = {field: 1 for field in ArticleResponse.model_fields}
+RESPONSE_PROJECTION["_id"] = 0
+
+# Generation bumped by every article write, for queries without tag/category/author filters
+ALL_ARTICLES = ("all", "")
+
+Dependency = Tuple[str, str]
+
+
+def build_search_filter(search_query: ArticleSearchQuery) -> dict:
+    """The Mongo filter shared by the result page and every facet"""
+    mongo_query = {"status": "published"}
+
+    if search_query.query:
+        # Full text search on title and content
+        mongo_query["$or"] = [
+            {"title": {"$regex": search_query.query, "$options": "i"}},
+            {"content": {"$regex": search_query.query, "$options": "i"}},
+            {"excerpt": {"$regex": search_query.query, "$options": "i"}}
+        ]
+
+    if search_query.author:
+        mongo_query["author_wallet"] = search_query.author
+
+    if search_query.tags:
+        mongo_query["tags"] = {"$in": search_query.tags}
+
+    if search_query.category:
+        mongo_query["category"] = search_query.category
+
+    return mongo_query
+
+
+def search_key(search_query: ArticleSearchQuery) -> Tuple:
+    """Canonical form of a query's filter; equal keys match the same articles"""
+    return (
+        # Matching is case-insensitive
+        (search_query.query or "").casefold(),
+        search_query.author or "",
+        tuple(sorted(set(search_query.tags or []))),
+        search_query.category or "",
+    )
+
+
+def search_dependencies(search_query: ArticleSearchQuery) -> List[Dependency]:
+    """Generations a cached result depends on.
+
+    A matching article has one of the query's tags and its category and
+    author, so any write that can change the result bumps one of these.
+    Unfiltered queries depend on every write.
+    """
+    dependencies = [("tag", tag) for tag in sorted(set(search_query.tags or []))]
+    if search_query.category:
+        dependencies.append(("category", search_query.category))
+    if search_query.author:
+        dependencies.append(("author", search_query.author))
+    return dependencies or [ALL_ARTICLES]
+
+
+def article_dependencies(article: Optional[Article]) -> List[Dependency]:
+    if article is None:
+        return []
+    dependencies = [("tag", tag) for tag in article.tags]
+    dependencies.append(("category", article.category))
+    dependencies.append(("author", article.author_wallet))
+    return dependencies
+
+
+def _counts(field: str, limit: int) -> List[dict]:
+    return [
+        {"$group": {"_id": field, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+
+
+class GenerationCache:
+    """Bounded LRU whose entries expire after `ttl` or when a generation they depend on moves"""
+
+    def __init__(self, generations: Dict[Dependency, int], ttl: float, max_entries: int):
+        self.generations = generations
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[float, Tuple[int, ...], Any]]" = OrderedDict()
+
+    def stamp(self, dependencies: List[Dependency]) -> Tuple[int, ...]:
+        return tuple(self.generations.get(dependency, 0) for dependency in dependencies)
+
+    def get(self, key, dependencies: List[Dependency]):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, stamp, value = entry
+        if time.monotonic() - stored_at >= self.ttl or stamp != self.stamp(dependencies):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, dependencies: List[Dependency], value, stamp: Optional[Tuple[int, ...]] = None):
+        """Store `value`; pass the `stamp` taken before computing it so racing writes invalidate it"""
+        self._entries[key] = (time.monotonic(), stamp if stamp is not None else self.stamp(dependencies), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ArticleSearchService:
+    """Article search with cached result pages, totals and facets.
+
+    Result pages are cached as article id lists keyed by the canonical query
+    plus limit/offset, and hydrated with one batched $in lookup. Totals and
+    tag/category/author facets come from one aggregation with a single $match
+    feeding a $facet stage, cached per canonical query. Article writes bump a
+    generation per tag, category and author they touch (plus a global one),
+    which invalidates every cached entry depending on them; the TTL bounds
+    staleness from writes made by other workers.
+    """
+
+    def __init__(self, database=None, ttl: float = SEARCH_CACHE_TTL_SECONDS,
+                 max_entries: int = SEARCH_CACHE_SIZE, facet_limit: int = SEARCH_FACET_LIMIT):
+        self.db = database if database is not None else db
+        self.facet_limit = facet_limit
+        self._generations: Dict[Dependency, int] = {}
+        self._pages = GenerationCache(self._generations, ttl, max_entries)
+        self._facets = GenerationCache(self._generations, ttl, max_entries)
+
+    async def ensure_indexes(self):
+        await self.db.articles.create_index("id")
+        await self.db.articles.create_index([("status", 1), ("published_at", -1)])
+        await self.db.articles.create_index([("tags", 1), ("published_at", -1)])
+        await self.db.articles.create_index([("category", 1), ("published_at", -1)])
+
+    # Invalidation
+
+    def record_article_changed(self, before: Optional[Article], after: Optional[Article]):
+        """Invalidate cached searches an article create (before=None), update or delete (after=None) can change"""
+        for dependency in set(article_dependencies(before) + article_dependencies(after)) | {ALL_ARTICLES}:
+            self._generations[dependency] = self._generations.get(dependency, 0) + 1
+
+    # Reads
+
+    async def hydrate(self, ids: List[str], filters: Optional[dict] = None) -> List[ArticleResponse]:
+        """Articles for `ids` (that also match `filters`) in the given order, fetched in one query"""
+        if not ids:
+            return []
+        docs = await self.db.articles.find({**(filters or {}), "id": {"$in": ids}}, RESPONSE_PROJECTION).to_list(None)
+        by_id = {doc["id"]: doc for doc in docs}
+        return [ArticleResponse(**by_id[article_id]) for article_id in ids if article_id in by_id]
+
+    async def page(self, search_query: ArticleSearchQuery) -> List[ArticleResponse]:
+        key = (search_key(search_query), search_query.limit, search_query.offset)
+        dependencies = search_dependencies(search_query)
+
+        ids = self._pages.get(key, dependencies)
+        if ids is not None:
+            return await self.hydrate(ids)
+
+        stamp = self._pages.stamp(dependencies)
+        cursor = self.db.articles.find(build_search_filter(search_query), RESPONSE_PROJECTION).sort("published_at", -1)
+        articles = await cursor.skip(search_query.offset).limit(search_query.limit).to_list(None)
+        self._pages.put(key, dependencies, [article["id"] for article in articles], stamp)
+        return [ArticleResponse(**article) for article in articles]
+
+    async def search(self, search_query: ArticleSearchQuery) -> ArticleSearchResults:
+        key = search_key(search_query)
+        dependencies = search_dependencies(search_query)
+
+        cached = self._facets.get(key, dependencies)
+        if cached is not None:
+            total, facets = cached
+            return ArticleSearchResults(articles=await self.page(search_query), total=total, facets=facets)
+
+        stamp = self._facets.stamp(dependencies)
+        pipeline = [
+            {"$match": build_search_filter(search_query)},
+            {"$facet": {
+                "results": [
+                    {"$sort": {"published_at": -1}},
+                    {"$skip": search_query.offset},
+                    {"$limit": search_query.limit},
+                    {"$project": RESPONSE_PROJECTION}
+                ],
+                "total": [{"$count": "count"}],
+                "tags": [{"$unwind": "$tags"}] + _counts("$tags", self.facet_limit),
+                "categories": _counts("$category", self.facet_limit),
+                "authors": [
+                    {"$group": {
+                        "_id": "$author_wallet",
+                        "count": {"$sum": 1},
+                        "label": {"$max": "$author_name"}
+                    }},
+                    {"$sort": {"count": -1, "_id": 1}},
+                    {"$limit": self.facet_limit}
+                ]
+            }}
+        ]
+        rows = await self.db.articles.aggregate(pipeline, allowDiskUse=True).to_list(None)
+        row = rows[0] if rows else {}
+
+        total = row["total"][0]["count"] if row.get("total") else 0
+        facets = SearchFacets(
+            tags=[FacetCount(value=doc["_id"], count=doc["count"]) for doc in row.get("tags", []) if doc["_id"]],
+            categories=[FacetCount(value=doc["_id"], count=doc["count"]) for doc in row.get("categories", []) if doc["_id"]],
+            authors=[
+                FacetCount(value=doc["_id"], count=doc["count"], label=doc.get("label"))
+                for doc in row.get("authors", []) if doc["_id"]
+            ],
+        )
+        self._facets.put(key, dependencies, (total, facets), stamp)
+
+        results = row.get("results", [])
+        self._pages.put(
+            (key, search_query.limit, search_query.offset), dependencies,
+            [article["id"] for article in results], stamp
+        )
+        return ArticleSearchResults(articles=[ArticleResponse(**article) for article in results], total=total, facets=facets)
+
+
+# Global instance
+article_search_service = ArticleSearchService()
@@ -0,0 +1,160 @@
+from typing import Dict, Any, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.analytics import PageView, UserEngagement
+from database import db
+
+
+# Engagement action -> article_stats counter it increments
+ENGAGEMENT_COUNTERS = {
+    "like": "total_likes",
+    "comment": "total_comments",
+    "share": "total_shares",
+    "tip": "total_tips",
+}
+
+STATS_COUNTERS = [
+    "total_views",
+    "unique_views",
+    "total_likes",
+    "total_comments",
+    "total_shares",
+    "total_tips",
+    "total_tip_amount",
+]
+
+
+def derive_engagement_rate(stats: Dict[str, Any]) -> float:
+    """Engagement rate (percentage) derived from stored counters"""
+    interactions = stats.get("total_likes", 0) + stats.get("total_comments", 0) + stats.get("total_shares", 0)
+    return interactions / max(stats.get("total_views", 0), 1) * 100
+
+
+def tip_amount(engagement: UserEngagement) -> float:
+    """Read the tipped amount from engagement metadata (0 if absent or malformed)"""
+    try:
+        return float((engagement.metadata or {}).get("amount", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ArticleStatsService:
+    """Maintains article_stats incrementally from recorded events"""
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+
+    async def ensure_indexes(self):
+        """Create indexes the incremental path and the rebuild rely on"""
+        await self.db.article_stats.create_index("article_id", unique=True)
+        await self.db.pageviews.create_index("article_id")
+        await self.db.user_engagement.create_index([("target_id", 1), ("target_type", 1), ("action_type", 1)])
+
+    async def record_pageview(self, pageview: PageView):
+        """Apply the counter deltas for a stored pageview"""
+
+        # unique_views comes from the visitor sketch (see cardinality_service)
+        await self.db.article_stats.update_one(
+            {"article_id": pageview.article_id},
+            {"$inc": {"total_views": 1}},
+            upsert=True
+        )
+
+    async def record_engagement(self, engagement: UserEngagement):
+        """Apply the counter deltas for a stored engagement event"""
+
+        if engagement.target_type != "article":
+            return
+
+        counter = ENGAGEMENT_COUNTERS.get(engagement.action_type)
+        if not counter:
+            return
+
+        inc = {counter: 1}
+        if engagement.action_type == "tip":
+            inc["total_tip_amount"] = tip_amount(engagement)
+
+        await self.db.article_stats.update_one(
+            {"article_id": engagement.target_id},
+            {"$inc": inc},
+            upsert=True
+        )
+
+    def rebuild_pipeline(self, article_id: Optional[str] = None) -> list:
+        """Full recount of article_stats as one aggregation merged back into the collection"""
+
+        pageview_match = {"article_id": article_id} if article_id else {}
+        engagement_match = {
+            "target_type": "article",
+            "action_type": {"$in": list(ENGAGEMENT_COUNTERS)}
+        }
+        if article_id:
+            engagement_match["target_id"] = article_id
+
+        def count_action(action: str) -> dict:
+            return {"$sum": {"$cond": [{"$eq": ["$action_type", action]}, 1, 0]}}
+
+        engagement_pipeline = [
+            {"$match": engagement_match},
+            {
+                "$group": {
+                    "_id": "$target_id",
+                    **{counter: count_action(action) for action, counter in ENGAGEMENT_COUNTERS.items()},
+                    "total_tip_amount": {
+                        "$sum": {
+                            "$cond": [
+                                {"$eq": ["$action_type", "tip"]},
+                                {"$convert": {"input": "$metadata.amount", "to": "double", "onError": 0, "onNull": 0}},
+                                0
+                            ]
+                        }
+                    }
+                }
+            }
+        ]
+
+        return [
+            {"$match": pageview_match},
+            # One row per (article, ip) so unique views fall out of the second group
+            {"$group": {"_id": {"article_id": "$article_id", "ip": "$ip_address"}, "views": {"$sum": 1}}},
+            {"$group": {"_id": "$_id.article_id", "total_views": {"$sum": "$views"}, "unique_views": {"$sum": 1}}},
+            {"$unionWith": {"coll": "user_engagement", "pipeline": engagement_pipeline}},
+            {"$group": {"_id": "$_id", **{counter: {"$sum": f"${counter}"} for counter in STATS_COUNTERS}}},
+            {"$project": {"_id": 0, "article_id": "$_id", **{counter: 1 for counter in STATS_COUNTERS}}},
+            {
+                "$merge": {
+                    "into": "article_stats",
+                    "on": "article_id",
+                    "whenMatched": "merge",
+                    "whenNotMatched": "insert"
+                }
+            }
+        ]
+
+    async def rebuild(self, article_id: Optional[str] = None):
+        """Recount article_stats from raw events (all articles, or just one)"""
+        pipeline = self.rebuild_pipeline(article_id)
+        await self.db.pageviews.aggregate(pipeline, allowDiskUse=True).to_list(None)
+
+    async def get(self, article_id: str) -> Dict[str, Any]:
+        """Stored stats document; articles without events yet get zeroed counters.
+
+        Counters are only ever changed by the incremental path; recounting
+        from raw events is left to ``manage.py rebuild-article-stats``.
+        """
+        try:
+            return await self.db.article_stats.find_one_and_update(
+                {"article_id": article_id},
+                {"$setOnInsert": {counter: 0 for counter in STATS_COUNTERS}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent read or event created the document first
+            return await self.db.article_stats.find_one({"article_id": article_id})
+
+
+# Global instance
+article_stats_service = ArticleStatsService()
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models.analytics import AuthorStats
+from services.single_flight import stats_flight
+from database import db
+
+logger = logging.getLogger(__name__)
+
+AUTHOR_STATS_MAX_AGE = timedelta(seconds=float(os.environ.get("AUTHOR_STATS_MAX_AGE_SECONDS", "300")))
+
+
+def _as_double(field: str) -> dict:
+    """Money fields may be stored as strings, doubles or Decimal128"""
+    return {"$convert": {"input": field, "to": "double", "onError": 0, "onNull": 0}}
+
+
+def _first(field: str, default=0) -> dict:
+    return {"$ifNull": [{"$arrayElemAt": [field, 0]}, default]}
+
+
+class AuthorStatsService:
+    """Computes author_stats with a single aggregation and refreshes stale documents in the background"""
+
+    def __init__(self, database=None, max_age: timedelta = AUTHOR_STATS_MAX_AGE):
+        self.db = database if database is not None else db
+        self.max_age = max_age
+
+    async def ensure_indexes(self):
+        await self.db.author_stats.create_index("author_wallet", unique=True)
+        await self.db.author_stats.create_index("updated_at")
+        await self.db.articles.create_index("author_wallet")
+        await self.db.purchases.create_index("article_id")
+        await self.db.tips.create_index("to_wallet")
+        await self.db.subscriptions.create_index([("author_wallet", 1), ("is_active", 1)])
+
+    def pipeline(self, wallet: str) -> list:
+        """articles -> $lookup article_stats/purchases -> $group, plus follower and tip subqueries"""
+        return [
+            {"$match": {"author_wallet": wallet}},
+            {
+                "$facet": {
+                    # $facet always emits one document, so authors without articles still get a row
+                    "articles": [
+                        {"$project": {"id": 1}},
+                        {
+                            "$lookup": {
+                                "from": "article_stats",
+                                "localField": "id",
+                                "foreignField": "article_id",
+                                "as": "stats"
+                            }
+                        },
+                        {
+                            "$lookup": {
+                                "from": "purchases",
+                                "let": {"article_id": "$id"},
+                                "pipeline": [
+                                    {"$match": {"$expr": {"$eq": ["$article_id", "$$article_id"]}}},
+                                    {"$group": {"_id": None, "revenue": {"$sum": _as_double("$amount")}}}
+                                ],
+                                "as": "purchases"
+                            }
+                        },
+                        {
+                            "$group": {
+                                "_id": None,
+                                "total_articles": {"$sum": 1},
+                                "total_views": {"$sum": _first("$stats.total_views")},
+                                "total_likes": {"$sum": _first("$stats.total_likes")},
+                                "total_comments": {"$sum": _first("$stats.total_comments")},
+                                "paid_content_revenue": {"$sum": _first("$purchases.revenue")}
+                            }
+                        }
+                    ]
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "subscriptions",
+                    "pipeline": [
+                        {"$match": {"author_wallet": wallet}},
+                        {
+                            "$group": {
+                                "_id": None,
+                                "followers": {"$sum": {"$cond": ["$is_active", 1, 0]}},
+                                "revenue": {"$sum": _as_double("$total_paid")}
+                            }
+                        }
+                    ],
+                    "as": "subscriptions"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "tips",
+                    "pipeline": [
+                        {"$match": {"to_wallet": wallet}},
+                        {"$group": {"_id": None, "count": {"$sum": 1}, "amount": {"$sum": _as_double("$amount")}}}
+                    ],
+                    "as": "tips"
+                }
+            },
+            {
+                "$project": {
+                    "articles": {"$ifNull": [{"$arrayElemAt": ["$articles", 0]}, {}]},
+                    "subscriptions": {"$ifNull": [{"$arrayElemAt": ["$subscriptions", 0]}, {}]},
+                    "tips": {"$ifNull": [{"$arrayElemAt": ["$tips", 0]}, {}]}
+                }
+            }
+        ]
+
+    async def calculate(self, wallet: str) -> AuthorStats:
+        """Compute fresh stats for an author"""
+        results = await self.db.articles.aggregate(self.pipeline(wallet)).to_list(1)
+        result = results[0] if results else {}
+
+        articles = result.get("articles", {})
+        subscriptions = result.get("subscriptions", {})
+        tips = result.get("tips", {})
+
+        total_articles = articles.get("total_articles", 0)
+        total_views = articles.get("total_views", 0)
+        total_likes = articles.get("total_likes", 0)
+        total_comments = articles.get("total_comments", 0)
+        tip_amount = tips.get("amount", 0.0)
+
+        return AuthorStats(
+            author_wallet=wallet,
+            total_articles=total_articles,
+            total_views=total_views,
+            total_likes=total_likes,
+            total_comments=total_comments,
+            total_followers=subscriptions.get("followers", 0),
+            total_tips_received=tips.get("count", 0),
+            total_tip_amount=tip_amount,
+            total_revenue=tip_amount + articles.get("paid_content_revenue", 0.0) + subscriptions.get("revenue", 0.0),
+            avg_article_views=total_views / max(total_articles, 1),
+            engagement_rate=(total_likes + total_comments) / max(total_views, 1) * 100
+        )
+
+    async def refresh(self, wallet: str) -> AuthorStats:
+        """Recompute and store an author's stats"""
+        stats = await self.calculate(wallet)
+        await self.db.author_stats.update_one(
+            {"author_wallet": wallet},
+            {"$set": {**stats.dict(), "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return stats
+
+    def refresh_in_background(self, wallet: str):
+        """Schedule a refresh unless one is already running for this author"""
+        if stats_flight.in_flight(("author_stats", wallet)):
+            return
+
+        async def run():
+            try:
+                await stats_flight.do(("author_stats", wallet), lambda: self.refresh(wallet))
+            except Exception as e:
+                logger.error(f"Failed to refresh author stats for {wallet}: {e}")
+
+        asyncio.create_task(run())
+
+    def is_stale(self, stats: dict) -> bool:
+        updated_at: Optional[datetime] = stats.get("updated_at")
+        return updated_at is None or datetime.utcnow() - updated_at > self.max_age
+
+    async def get(self, wallet: str) -> AuthorStats:
+        """Stored stats, computed on first access and refreshed in the background once stale"""
+        stats = await self.db.author_stats.find_one({"author_wallet": wallet})
+
+        if not stats:
+            async def load():
+                stored = await self.db.author_stats.find_one({"author_wallet": wallet})
+                return AuthorStats(**stored) if stored else None
+
+            return await stats_flight.do(("author_stats", wallet), lambda: self.refresh(wallet), load=load)
+
+        if self.is_stale(stats):
+            self.refresh_in_background(wallet)
+
+        return AuthorStats(**stats)
+
+    async def refresh_stale(self, limit: int = 100):
+        """Refresh the least recently updated author_stats (keeps leaderboards current)"""
+        cutoff = datetime.utcnow() - self.max_age
+        cursor = self.db.author_stats.find(
+            {"$or": [{"updated_at": {"$lt": cutoff}}, {"updated_at": {"$exists": False}}]},
+            {"author_wallet": 1}
+        ).sort("updated_at", 1).limit(limit)
+
+        async for stats in cursor:
+            await self.refresh(stats["author_wallet"])
+
+    async def rebuild_all(self):
+        """Recompute stats for every author that has articles"""
+        async for author in self.db.articles.aggregate([{"$group": {"_id": "$author_wallet"}}], allowDiskUse=True):
+            if not author["_id"]:
+                continue
+            try:
+                await self.refresh(author["_id"])
+            except Exception as e:
+                logger.error(f"Failed to rebuild author stats for {author['_id']}: {e}")
+
+
+# Global instance
+author_stats_service = AuthorStatsService()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.analytics import SearchQuery
+from models.article import Article
+from models.author import AuthorProfile
+from services.prefix_index import PrefixIndex
+from services.search_trends_service import search_trends_service, normalize_search
+from database import db
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_TOP_K = int(os.environ.get("AUTOCOMPLETE_TOP_K", "10"))
+AUTOCOMPLETE_MAX_DEPTH = int(os.environ.get("AUTOCOMPLETE_MAX_DEPTH", "8"))
+
+# Suggestion kinds
+QUERY = "query"
+TITLE = "title"
+TAG = "tag"
+CATEGORY = "category"
+AUTHOR = "author"
+
+KINDS = [QUERY, TITLE, TAG, CATEGORY, AUTHOR]
+
+# Payload field per kind in suggestion responses
+PAYLOAD_FIELDS = {TITLE: "article_id", AUTHOR: "wallet_address"}
+
+TermRow = Tuple[str, str, float, Any]
+
+
+class AutocompleteService:
+    """In-memory prefix indexes (one per kind) for search suggestions.
+
+    Weights are popularity: article views for titles, and the summed views
+    of their articles for tags, categories and authors; search counts for
+    logged queries. Writes add terms incrementally; a periodic background
+    rebuild reloads every term from Mongo with current weights and swaps the
+    indexes in, replaying writes that happened during the rebuild.
+    """
+
+    def __init__(self, database=None, k: int = AUTOCOMPLETE_TOP_K, max_depth: int = AUTOCOMPLETE_MAX_DEPTH):
+        self.db = database if database is not None else db
+        self.k = k
+        self.max_depth = max_depth
+        self._indexes = self._empty()
+        self._replay: Optional[List[TermRow]] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    def _empty(self) -> Dict[str, PrefixIndex]:
+        return {kind: PrefixIndex(self.k, self.max_depth) for kind in KINDS}
+
+    # Incremental updates
+
+    def add(self, kind: str, display: str, weight: float = 1.0, payload: Any = None):
+        if not display:
+            return
+        self._indexes[kind].add(kind, display, weight, payload)
+        if self._replay is not None:
+            self._replay.append((kind, display, weight, payload))
+
+    def record_article(self, article: Article):
+        if article.status == "draft":
+            return
+        self.add(TITLE, article.title, payload=article.id)
+        self.add(CATEGORY, article.category)
+        for tag in article.tags:
+            self.add(TAG, tag)
+
+    def record_author(self, profile: AuthorProfile):
+        for name in {profile.username, profile.display_name}:
+            if name:
+                self.add(AUTHOR, name, payload=profile.wallet_address)
+
+    def record_search(self, search_query: SearchQuery):
+        self.add(QUERY, normalize_search(search_query.query))
+
+    # Reads
+
+    def suggest(self, prefix: str, limit: int = 5, kinds: Optional[List[str]] = None) -> List[dict]:
+        """Top suggestions across the requested kinds, highest weight first"""
+        terms = []
+        for kind in kinds or KINDS:
+            index = self._indexes.get(kind)
+            if index is not None:
+                terms.extend(index.search(prefix, limit))
+        terms.sort(key=lambda term: term.weight, reverse=True)
+
+        suggestions = []
+        for term in terms[:limit]:
+            suggestion = {"query": term.display, "type": term.kind, "count": int(term.weight)}
+            if term.kind in PAYLOAD_FIELDS:
+                suggestion[PAYLOAD_FIELDS[term.kind]] = term.payload
+            suggestions.append(suggestion)
+        return suggestions
+
+    # Rebuild
+
+    async def load_terms(self) -> List[TermRow]:
+        """Every term with its current weight, read from Mongo"""
+        views: Dict[str, int] = {}
+        async for stats in self.db.article_stats.find({}, {"article_id": 1, "total_views": 1}):
+            views[stats["article_id"]] = stats.get("total_views", 0)
+
+        rows: List[TermRow] = []
+        tags: Dict[str, float] = {}
+        categories: Dict[str, float] = {}
+        author_weights: Dict[str, float] = {}
+
+        cursor = self.db.articles.find(
+            {"status": {"$ne": "draft"}},
+            {"id": 1, "title": 1, "tags": 1, "category": 1, "author_wallet": 1}
+        )
+        async for article in cursor:
+            weight = views.get(article["id"], 0) + 1
+            rows.append((TITLE, article.get("title", ""), weight, article["id"]))
+            for tag in article.get("tags") or []:
+                tags[tag] = tags.get(tag, 0) + weight
+            if article.get("category"):
+                categories[article["category"]] = categories.get(article["category"], 0) + weight
+            wallet = article.get("author_wallet")
+            author_weights[wallet] = author_weights.get(wallet, 0) + weight
+
+        rows.extend((TAG, tag, weight, None) for tag, weight in tags.items())
+        rows.extend((CATEGORY, category, weight, None) for category, weight in categories.items())
+
+        async for author in self.db.authors.find({}, {"wallet_address": 1, "username": 1, "display_name": 1}):
+            weight = author_weights.get(author["wallet_address"], 0) + 1
+            for name in {author.get("username"), author.get("display_name")}:
+                if name:
+                    rows.append((AUTHOR, name, weight, author["wallet_address"]))
+
+        window = search_trends_service.window(search_trends_service.days)
+        rows.extend((QUERY, query, count, None) for query, count, _, _ in window.items())
+
+        return rows
+
+    def build(self, rows: List[TermRow]) -> Dict[str, PrefixIndex]:
+        indexes = self._empty()
+        for kind, display, weight, payload in rows:
+            if display:
+                indexes[kind].add(kind, display, weight, payload)
+        return indexes
+
+    async def rebuild(self):
+        """Rebuild every index from Mongo without blocking the event loop"""
+        if self._replay is not None:
+            # A rebuild is already running
+            return
+
+        self._replay = []
+        try:
+            rows = await self.load_terms()
+            indexes = await asyncio.to_thread(self.build, rows)
+        except Exception:
+            self._replay = None
+            raise
+
+        # No await between here and the swap, so no write can slip in unreplayed
+        for kind, display, weight, payload in self._replay:
+            indexes[kind].add(kind, display, weight, payload)
+        self._replay = None
+        self._indexes = indexes
+
+    def rebuild_in_background(self):
+        """Start a rebuild unless one is already running"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+
+        async def run():
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Failed to rebuild autocomplete indexes: {e}")
+
+        self._rebuild_task = asyncio.create_task(run())
+
+
+# Global instance
+autocomplete_service = AutocompleteService()
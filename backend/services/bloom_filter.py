@@ -0,0 +1,65 @@
+import math
+from hashlib import blake2b
+from typing import Iterable, Tuple
+
+import numpy as np
+
+_MASK64 = (1 << 64) - 1
+
+
+def optimal_size(capacity: int, error_rate: float) -> Tuple[int, int]:
+    """(bits, hash count) for `capacity` items at the target false positive rate"""
+    if not 0 < error_rate < 1:
+        raise ValueError("error_rate must be between 0 and 1")
+    capacity = max(1, capacity)
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def hash128(value: str) -> Tuple[int, int]:
+    """Two stable 64-bit hashes of a value (Python's hash() is randomized per process)"""
+    digest = blake2b(value.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+
+
+class BloomFilter:
+    """Bloom filter over strings: no false negatives, ~`error_rate` false positives at capacity.
+
+    Bit positions come from double hashing (h1 + i * h2) of one 128-bit
+    blake2b digest. Bits are packed into a uint8 array; `add_many` sets the
+    bits for a whole batch with numpy, which is how filters are rebuilt.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m, self.k = optimal_size(capacity, error_rate)
+        self._bits = np.zeros((self.m + 7) // 8, dtype=np.uint8)
+        self._steps = np.arange(self.k, dtype=np.uint64)
+        self.count = 0
+
+    def _positions(self, h1: np.ndarray, h2: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            return (h1[:, None] + self._steps * h2[:, None]) % np.uint64(self.m)
+
+    def add(self, value: str) -> None:
+        self.add_many([value])
+
+    def add_many(self, values: Iterable[str]) -> None:
+        hashes = [hash128(value) for value in values]
+        if not hashes:
+            return
+        h = np.array(hashes, dtype=np.uint64)
+        positions = self._positions(h[:, 0], h[:, 1]).ravel()
+        np.bitwise_or.at(self._bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+        self.count += len(hashes)
+
+    def __contains__(self, value: str) -> bool:
+        h1, h2 = hash128(value)
+        for i in range(self.k):
+            # Same positions as the uint64 (wrapping) arithmetic in add_many
+            position = ((h1 + i * h2) & _MASK64) % self.m
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
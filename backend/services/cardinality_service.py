@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple, Union
+
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+from models.analytics import PageView, UserEngagement
+from services.article_authors import article_authors
+from services.hyperloglog import HyperLogLog, precision_for_error
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Sketch scopes
+ARTICLE_VISITORS = "article_visitors"
+AUTHOR_VISITORS = "author_visitors"
+ACTIVE_USERS = "active_users"
+
+PLATFORM_KEY = "platform"
+LIFETIME = "all"
+
+HLL_STANDARD_ERROR = float(os.environ.get("HLL_STANDARD_ERROR", "0.012"))
+HLL_MAX_PENDING = int(os.environ.get("HLL_MAX_PENDING", "5000"))
+
+SketchId = Tuple[str, str, str]
+
+
+def _day_matches(day: str, day_filter: Union[str, dict]) -> bool:
+    """Whether a sketch's day satisfies a `day` query filter (the lifetime key, or an ISO date range)"""
+    if isinstance(day_filter, str):
+        return day == day_filter
+    return day_filter["$gte"] <= day <= day_filter["$lte"]
+
+
+class CardinalityService:
+    """Distinct-count sketches (unique visitors, active users) stored in hll_sketches.
+
+    Each (scope, key, day) has one HyperLogLog document; articles and authors
+    also keep a lifetime ("all") sketch. Ingest only touches in-process
+    pending sketches, which are merged into Mongo on flush with an optimistic
+    version check so several workers can flush concurrently.
+    """
+
+    def __init__(self, database=None, standard_error: float = HLL_STANDARD_ERROR):
+        self.db = database if database is not None else db
+        self.precision = precision_for_error(standard_error)
+        self._pending: Dict[SketchId, HyperLogLog] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.hll_sketches.create_index([("scope", 1), ("key", 1), ("day", 1)], unique=True)
+
+    def add(self, scope: str, key: str, value, day: date, lifetime: bool = False):
+        """Record `value` in the daily sketch (and optionally the lifetime sketch)"""
+        days = [day.isoformat(), LIFETIME] if lifetime else [day.isoformat()]
+        for sketch_day in days:
+            sketch_id = (scope, key, sketch_day)
+            sketch = self._pending.get(sketch_id)
+            if sketch is None:
+                sketch = self._pending[sketch_id] = HyperLogLog(self.precision)
+            sketch.add(value)
+
+        if len(self._pending) >= HLL_MAX_PENDING and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def record_pageview(self, pageview: PageView):
+        """Count the pageview's visitor towards article and author unique visitors"""
+        visitor = pageview.ip_address or pageview.session_id or pageview.user_wallet
+        if not visitor:
+            return
+
+        self.add(ARTICLE_VISITORS, pageview.article_id, visitor, pageview.view_date, lifetime=True)
+
+        author_wallet = await article_authors.get(pageview.article_id)
+        if author_wallet:
+            self.add(AUTHOR_VISITORS, author_wallet, visitor, pageview.view_date, lifetime=True)
+
+    def record_engagement(self, engagement: UserEngagement):
+        """Count the engaging wallet towards the day's platform active users"""
+        self.add(ACTIVE_USERS, PLATFORM_KEY, engagement.user_wallet, engagement.engagement_date)
+
+    async def flush(self):
+        """Merge pending sketches into Mongo"""
+        pending, self._pending = self._pending, {}
+
+        for sketch_id, sketch in pending.items():
+            try:
+                await self._merge_into_store(sketch_id, sketch)
+            except Exception as e:
+                logger.error(f"Failed to flush sketch {sketch_id}: {e}")
+                # Keep it for the next flush
+                if sketch_id in self._pending:
+                    self._pending[sketch_id].merge(sketch)
+                else:
+                    self._pending[sketch_id] = sketch
+
+    async def _merge_into_store(self, sketch_id: SketchId, sketch: HyperLogLog, attempts: int = 5):
+        scope, key, day = sketch_id
+        doc_filter = {"scope": scope, "key": key, "day": day}
+
+        for _ in range(attempts):
+            doc = await self.db.hll_sketches.find_one(doc_filter)
+
+            if doc is None:
+                try:
+                    await self.db.hll_sketches.insert_one({
+                        **doc_filter,
+                        "sketch": Binary(sketch.to_bytes()),
+                        "version": 1,
+                        "updated_at": datetime.utcnow()
+                    })
+                    return
+                except DuplicateKeyError:
+                    continue
+
+            merged = HyperLogLog.from_bytes(doc["sketch"]).merge(sketch)
+            result = await self.db.hll_sketches.update_one(
+                {**doc_filter, "version": doc["version"]},
+                {
+                    "$set": {"sketch": Binary(merged.to_bytes()), "updated_at": datetime.utcnow()},
+                    "$inc": {"version": 1}
+                }
+            )
+            if result.matched_count:
+                return
+
+        raise RuntimeError("Too much contention merging sketch")
+
+    async def sketch(self, scope: str, key: str, start: Optional[date] = None, end: Optional[date] = None) -> HyperLogLog:
+        """Merged sketch for a day range (inclusive), or the lifetime sketch when no range is given"""
+        if start is None and end is None:
+            day_filter = LIFETIME
+        else:
+            start_key = (start or date.min).isoformat()
+            end_key = (end or date.max).isoformat()
+            # "all" sorts after any ISO date, so the range never picks up the lifetime sketch
+            day_filter = {"$gte": start_key, "$lte": end_key}
+
+        merged = HyperLogLog(self.precision)
+        async for doc in self.db.hll_sketches.find({"scope": scope, "key": key, "day": day_filter}):
+            merged.merge(HyperLogLog.from_bytes(doc["sketch"]))
+
+        # Include what this worker has not flushed yet
+        for (pending_scope, pending_key, day), pending in self._pending.items():
+            if pending_scope == scope and pending_key == key and _day_matches(day, day_filter):
+                merged.merge(pending)
+
+        return merged
+
+    async def daily_estimates(self, scope: str, key: str, start: date, end: date) -> Dict[str, int]:
+        """Per-day estimates for a day range, keyed by ISO date"""
+        start_key, end_key = start.isoformat(), end.isoformat()
+
+        sketches = {}
+        async for doc in self.db.hll_sketches.find({
+            "scope": scope, "key": key, "day": {"$gte": start_key, "$lte": end_key}
+        }):
+            sketches[doc["day"]] = HyperLogLog.from_bytes(doc["sketch"])
+
+        for (pending_scope, pending_key, day), pending in self._pending.items():
+            if pending_scope == scope and pending_key == key and start_key <= day <= end_key:
+                sketches.setdefault(day, HyperLogLog(self.precision)).merge(pending)
+
+        return {day: sketch.estimate() for day, sketch in sketches.items()}
+
+    async def estimate(self, scope: str, key: str, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        return (await self.sketch(scope, key, start, end)).estimate()
+
+
+# Global instance
+cardinality_service = CardinalityService()
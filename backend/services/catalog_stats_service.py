@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from pymongo import DeleteOne, UpdateOne
+
+from models.article import Article
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TAG_LIMIT = 100
+RECENT_SEARCHES = 5
+
+TOTALS_ID = "catalog"
+
+
+class CatalogStatsService:
+    """Materialized tag/category counts and catalog totals for search pages.
+
+    Writes $inc tag_counts, category_counts and catalog_totals as published
+    articles and author profiles are created, changed or removed. A periodic
+    aggregation reconciles the counts with the articles collection, and
+    requests are served from an in-process snapshot reloaded on a schedule.
+    """
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+        self._snapshot: Optional[dict] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.tag_counts.create_index("tag", unique=True)
+        await self.db.tag_counts.create_index([("count", -1)])
+        await self.db.category_counts.create_index("category", unique=True)
+        await self.db.articles.create_index("status")
+
+    # Incremental updates
+
+    async def _apply(self, tags: Dict[str, int], categories: Dict[str, int], totals: Dict[str, int]):
+        writes = []
+        tag_updates = [
+            UpdateOne({"tag": tag}, {"$inc": {"count": delta}}, upsert=True)
+            for tag, delta in tags.items() if delta
+        ]
+        if tag_updates:
+            writes.append(self.db.tag_counts.bulk_write(tag_updates, ordered=False))
+        category_updates = [
+            UpdateOne({"category": category}, {"$inc": {"count": delta}}, upsert=True)
+            for category, delta in categories.items() if delta
+        ]
+        if category_updates:
+            writes.append(self.db.category_counts.bulk_write(category_updates, ordered=False))
+        if any(totals.values()):
+            writes.append(self.db.catalog_totals.update_one({"_id": TOTALS_ID}, {"$inc": totals}, upsert=True))
+        await asyncio.gather(*writes)
+
+    def _deltas(self, article: Optional[Article], sign: int):
+        if article is None or article.status != "published":
+            return {}, {}, 0
+        return {tag: sign for tag in set(article.tags)}, {article.category: sign}, sign
+
+    async def record_article_changed(self, before: Optional[Article], after: Optional[Article]):
+        """Apply the count changes of creating (before=None), updating or deleting (after=None) an article"""
+        old_tags, old_categories, old_total = self._deltas(before, -1)
+        new_tags, new_categories, new_total = self._deltas(after, 1)
+
+        tags = dict(old_tags)
+        for tag, delta in new_tags.items():
+            tags[tag] = tags.get(tag, 0) + delta
+        categories = dict(old_categories)
+        for category, delta in new_categories.items():
+            categories[category] = categories.get(category, 0) + delta
+
+        await self._apply(tags, categories, {"articles": old_total + new_total})
+
+    async def record_author_created(self):
+        await self._apply({}, {}, {"authors": 1})
+
+    # Reconciliation
+
+    async def reconcile(self):
+        """Recount everything from the articles and authors collections"""
+        published = {"status": "published"}
+        tag_counts, category_counts, total_articles, total_authors = await asyncio.gather(
+            self.db.articles.aggregate([
+                {"$match": published},
+                # Count an article once per tag, as incremental updates do, even if a tag repeats
+                {"$project": {"tags": {"$setUnion": ["$tags", []]}}},
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}}
+            ], allowDiskUse=True).to_list(None),
+            self.db.articles.aggregate([
+                {"$match": published},
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}}
+            ]).to_list(None),
+            self.db.articles.count_documents(published),
+            self.db.authors.estimated_document_count(),
+        )
+
+        await self._replace(self.db.tag_counts, "tag", {row["_id"]: row["count"] for row in tag_counts if row["_id"]})
+        await self._replace(self.db.category_counts, "category", {row["_id"]: row["count"] for row in category_counts if row["_id"]})
+        await self.db.catalog_totals.update_one(
+            {"_id": TOTALS_ID},
+            {"$set": {"articles": total_articles, "authors": total_authors}},
+            upsert=True
+        )
+        await self.refresh()
+
+    def reconcile_in_background(self):
+        """Start a reconciliation unless one is already running"""
+        if self._reconcile_task is not None and not self._reconcile_task.done():
+            return
+
+        async def run():
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Failed to reconcile catalog stats: {e}")
+
+        self._reconcile_task = asyncio.create_task(run())
+
+    async def _replace(self, collection, field: str, counts: Dict[str, int]):
+        operations = [
+            UpdateOne({field: name}, {"$set": {"count": count}}, upsert=True)
+            for name, count in counts.items()
+        ]
+        async for doc in collection.find({}, {field: 1}):
+            if doc[field] not in counts:
+                operations.append(DeleteOne({"_id": doc["_id"]}))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+    # Reads
+
+    async def refresh(self):
+        """Reload the in-process snapshot from the materialized collections"""
+        tags, categories, totals, searches = await asyncio.gather(
+            self.db.tag_counts.find({"count": {"$gt": 0}}, {"_id": 0}).sort("count", -1).limit(SNAPSHOT_TAG_LIMIT).to_list(None),
+            self.db.category_counts.find({"count": {"$gt": 0}}, {"_id": 0}).sort("count", -1).to_list(None),
+            self.db.catalog_totals.find_one({"_id": TOTALS_ID}),
+            self.db.search_queries.find({}, {"query": 1}).sort("created_at", -1).limit(50).to_list(None),
+        )
+
+        recent_searches: List[str] = []
+        for search in searches:
+            query = search.get("query", "").strip()
+            if query and query not in recent_searches:
+                recent_searches.append(query)
+                if len(recent_searches) == RECENT_SEARCHES:
+                    break
+
+        self._snapshot = {
+            "tags": tags,
+            "categories": categories,
+            "total_articles": (totals or {}).get("articles", 0),
+            "total_authors": (totals or {}).get("authors", 0),
+            "recent_searches": recent_searches,
+        }
+
+    async def snapshot(self) -> dict:
+        if self._snapshot is None:
+            await self.refresh()
+        return self._snapshot
+
+
+# Global instance
+catalog_stats_service = CatalogStatsService()
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.monetization import ArticleAccess
+from services.bloom_filter import BloomFilter
+from database import db
+
+logger = logging.getLogger(__name__)
+
+ENTITLEMENT_CACHE_SIZE = int(os.environ.get("ENTITLEMENT_CACHE_SIZE", "50000"))
+# Bounds how long a grant revoked on another worker (cancelled subscription) can still be served
+ENTITLEMENT_CACHE_TTL_SECONDS = float(os.environ.get("ENTITLEMENT_CACHE_TTL_SECONDS", "60"))
+ENTITLEMENT_BLOOM_ERROR_RATE = float(os.environ.get("ENTITLEMENT_BLOOM_ERROR_RATE", "0.01"))
+ENTITLEMENT_BLOOM_MIN_CAPACITY = 100_000
+# Incremental refreshes re-read this much before the watermark, in case inserts with earlier timestamps were in flight
+ENTITLEMENT_REFRESH_OVERLAP = timedelta(seconds=30)
+
+Paywall = Tuple[str, bool]  # (author_wallet, paid)
+
+
+def purchase_key(wallet: str, article_id: str) -> str:
+    return f"p:{wallet}:{article_id}"
+
+
+def subscription_key(wallet: str, author_wallet: str) -> str:
+    return f"s:{wallet}:{author_wallet}"
+
+
+class ExpiringLRU:
+    """Bounded LRU whose entries each expire after their own ttl"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        return [(key, value) for key, (_, value) in self._entries.items()]
+
+
+class EntitlementService:
+    """Answers "can this wallet read this article" for paywalled content.
+
+    A wallet may read a paid article it wrote, bought, or whose author it
+    has an active subscription to. Positive grants are cached per worker
+    in an LRU, and each article's paywall state in another. A Bloom filter
+    over every (buyer, article) purchase and (subscriber, author)
+    subscription pair rules out older pairs without looking each one up. It
+    is rebuilt from Mongo periodically and topped up every few seconds with
+    newer purchases and subscriptions, including other workers' writes;
+    pairs newer than the last top-up are covered by one query per check for
+    the wallet's recent activity, so a fresh purchase is never denied. A
+    subscription past its next_billing date has lapsed and grants nothing.
+    The batched check resolves a whole list page with at most five queries.
+    """
+
+    def __init__(self, database=None, cache_size: int = ENTITLEMENT_CACHE_SIZE,
+                 ttl: float = ENTITLEMENT_CACHE_TTL_SECONDS, error_rate: float = ENTITLEMENT_BLOOM_ERROR_RATE):
+        self.db = database if database is not None else db
+        self.ttl = ttl
+        self.error_rate = error_rate
+        self._grants = ExpiringLRU(cache_size)  # (wallet, article_id) -> (reason, author_wallet)
+        self._paywalls = ExpiringLRU(cache_size)  # article_id -> Paywall
+        self._bloom: Optional[BloomFilter] = None
+        self._watermark: Optional[datetime] = None
+        self._replay: Optional[List[str]] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.purchases.create_index([("buyer_wallet", 1), ("article_id", 1)])
+        await self.db.purchases.create_index("created_at")
+        await self.db.purchases.create_index([("buyer_wallet", 1), ("created_at", 1)])
+        await self.db.subscriptions.create_index([("subscriber_wallet", 1), ("author_wallet", 1), ("is_active", 1)])
+        await self.db.subscriptions.create_index("created_at")
+        await self.db.subscriptions.create_index([("subscriber_wallet", 1), ("created_at", 1)])
+        await self.db.paid_content.create_index("article_id")
+
+    # Incremental updates
+
+    def _add(self, keys: List[str]):
+        if self._bloom is not None:
+            self._bloom.add_many(keys)
+        if self._replay is not None:
+            self._replay.extend(keys)
+
+    def record_purchase(self, buyer_wallet: str, article_id: str):
+        self._add([purchase_key(buyer_wallet, article_id)])
+        self._grants.put((buyer_wallet, article_id), ("purchase", None), self.ttl)
+
+    def record_subscription(self, subscriber_wallet: str, author_wallet: str):
+        self._add([subscription_key(subscriber_wallet, author_wallet)])
+
+    def record_cancellation(self, subscriber_wallet: str, author_wallet: str):
+        """Drop this worker's subscription grants; other workers' expire within the cache ttl"""
+        for key, (reason, author) in self._grants.items():
+            if key[0] == subscriber_wallet and reason == "subscription" and author == author_wallet:
+                self._grants.pop(key)
+
+    def invalidate_article(self, article_id: str):
+        """Paid content for the article was created, changed or deactivated"""
+        self._paywalls.pop(article_id)
+
+    # Bloom filter
+
+    def _may_hold(self, key: str) -> bool:
+        # Until the first build finishes every pair has to be checked in Mongo
+        return self._bloom is None or key in self._bloom
+
+    async def _pair_keys(self, since: Optional[datetime] = None) -> List[str]:
+        created = {"created_at": {"$gte": since}} if since is not None else {}
+        keys = [
+            purchase_key(doc["buyer_wallet"], doc["article_id"])
+            async for doc in self.db.purchases.find(
+                {"status": {"$ne": "failed"}, **created}, {"_id": 0, "buyer_wallet": 1, "article_id": 1}
+            )
+        ]
+        keys += [
+            subscription_key(doc["subscriber_wallet"], doc["author_wallet"])
+            async for doc in self.db.subscriptions.find(
+                {"is_active": True, "next_billing": {"$gt": datetime.utcnow()}, **created},
+                {"_id": 0, "subscriber_wallet": 1, "author_wallet": 1}
+            )
+        ]
+        return keys
+
+    def build(self, keys: List[str]) -> BloomFilter:
+        bloom = BloomFilter(max(ENTITLEMENT_BLOOM_MIN_CAPACITY, 2 * len(keys)), self.error_rate)
+        bloom.add_many(keys)
+        return bloom
+
+    async def rebuild(self):
+        """Rebuild the filter from Mongo, dropping cancelled subscriptions, without blocking the event loop"""
+        if self._replay is not None:
+            # A rebuild is already running
+            return
+
+        self._replay = []
+        started = datetime.utcnow()
+        try:
+            keys = await self._pair_keys()
+            bloom = await asyncio.to_thread(self.build, keys)
+        except Exception:
+            self._replay = None
+            raise
+
+        # No await between here and the swap, so no write can slip in unreplayed
+        bloom.add_many(self._replay)
+        self._replay = None
+        self._bloom = bloom
+        self._watermark = started - ENTITLEMENT_REFRESH_OVERLAP
+
+    def rebuild_in_background(self):
+        """Start a rebuild unless one is already running"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+
+        async def run():
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Failed to rebuild entitlement filter: {e}")
+
+        self._rebuild_task = asyncio.create_task(run())
+
+    async def refresh(self):
+        """Add purchases and subscriptions made since the last refresh, on any worker"""
+        if self._bloom is None or self._replay is not None:
+            return
+        started = datetime.utcnow()
+        self._bloom.add_many(await self._pair_keys(self._watermark))
+        self._watermark = started - ENTITLEMENT_REFRESH_OVERLAP
+        if self._bloom.count > self._bloom.capacity:
+            # Past capacity the false positive rate climbs; resize
+            self.rebuild_in_background()
+
+    # Reads
+
+    async def _paywalls_for(self, article_ids: Iterable[str]) -> Dict[str, Paywall]:
+        paywalls = {}
+        missing = []
+        for article_id in article_ids:
+            paywall = self._paywalls.get(article_id)
+            if paywall is None:
+                missing.append(article_id)
+            else:
+                paywalls[article_id] = paywall
+
+        if missing:
+            paid = set(await self.db.paid_content.distinct("article_id", {"article_id": {"$in": missing}, "is_active": True}))
+            async for article in self.db.articles.find({"id": {"$in": missing}}, {"_id": 0, "id": 1, "author_wallet": 1}):
+                paywall = (article.get("author_wallet"), article["id"] in paid)
+                paywalls[article["id"]] = paywall
+                self._paywalls.put(article["id"], paywall, self.ttl)
+        return paywalls
+
+    async def check(self, wallet: str, article_id: str) -> ArticleAccess:
+        return (await self.check_many(wallet, [article_id]))[0]
+
+    async def check_many(self, wallet: str, article_ids: List[str]) -> List[ArticleAccess]:
+        """Access for each article, in order; unknown articles are not accessible"""
+        unique = list(dict.fromkeys(article_ids))
+        paywalls = await self._paywalls_for(unique)
+
+        reasons: Dict[str, Optional[str]] = {}
+        pending = []
+        for article_id in unique:
+            if article_id not in paywalls:
+                reasons[article_id] = None
+                continue
+            author_wallet, paid = paywalls[article_id]
+            grant = self._grants.get((wallet, article_id))
+            if not paid:
+                reasons[article_id] = "free"
+            elif wallet == author_wallet:
+                reasons[article_id] = "author"
+            elif grant is not None:
+                reasons[article_id] = grant[0]
+            else:
+                pending.append(article_id)
+
+        if pending:
+            reasons.update(await self._lookup(wallet, pending, paywalls))
+
+        return [
+            ArticleAccess(article_id=article_id, has_access=reasons[article_id] is not None, reason=reasons[article_id])
+            for article_id in article_ids
+        ]
+
+    async def _recent(self, wallet: str, now: datetime) -> Tuple[set, Dict[str, datetime]]:
+        """The wallet's purchases and subscriptions newer than the filter, which may be missing from it"""
+        since = {"$gte": self._watermark}
+        purchased = set(await self.db.purchases.distinct(
+            "article_id", {"buyer_wallet": wallet, "created_at": since, "status": {"$ne": "failed"}}
+        ))
+        subscribed = {
+            subscription["author_wallet"]: subscription["next_billing"]
+            async for subscription in self.db.subscriptions.find(
+                {"subscriber_wallet": wallet, "created_at": since, "is_active": True, "next_billing": {"$gt": now}},
+                {"_id": 0, "author_wallet": 1, "next_billing": 1}
+            )
+        }
+        return purchased, subscribed
+
+    async def _lookup(self, wallet: str, article_ids: List[str], paywalls: Dict[str, Paywall]) -> Dict[str, Optional[str]]:
+        """Check purchases and subscriptions in Mongo for pairs the Bloom filter cannot rule out.
+
+        The filter only holds pairs up to its last refresh, so a miss is only
+        trusted for older pairs: any miss costs one query for the wallet's
+        purchases and subscriptions made since (e.g. on another worker).
+        """
+        now = datetime.utcnow()
+        authors = {paywalls[article_id][0] for article_id in article_ids}
+        purchase_hits = [article_id for article_id in article_ids if self._may_hold(purchase_key(wallet, article_id))]
+        author_hits = [author for author in authors if self._may_hold(subscription_key(wallet, author))]
+
+        purchased, subscribed = set(), {}
+        if len(purchase_hits) < len(article_ids) or len(author_hits) < len(authors):
+            purchased, subscribed = await self._recent(wallet, now)
+            self._add([purchase_key(wallet, article_id) for article_id in purchased])
+            self._add([subscription_key(wallet, author) for author in subscribed])
+
+        purchase_hits = [article_id for article_id in purchase_hits if article_id not in purchased]
+        if purchase_hits:
+            purchased.update(await self.db.purchases.distinct(
+                "article_id", {"buyer_wallet": wallet, "article_id": {"$in": purchase_hits}, "status": {"$ne": "failed"}}
+            ))
+
+        needed = {paywalls[article_id][0] for article_id in article_ids if article_id not in purchased}
+        author_hits = [author for author in author_hits if author in needed and author not in subscribed]
+        if author_hits:
+            # A subscription whose billing date has passed has lapsed, whatever is_active says
+            async for subscription in self.db.subscriptions.find(
+                {"subscriber_wallet": wallet, "author_wallet": {"$in": author_hits}, "is_active": True,
+                 "next_billing": {"$gt": now}},
+                {"_id": 0, "author_wallet": 1, "next_billing": 1}
+            ):
+                subscribed[subscription["author_wallet"]] = subscription["next_billing"]
+
+        reasons: Dict[str, Optional[str]] = {}
+        for article_id in article_ids:
+            author_wallet = paywalls[article_id][0]
+            if article_id in purchased:
+                reasons[article_id] = "purchase"
+                self._grants.put((wallet, article_id), ("purchase", author_wallet), self.ttl)
+            elif author_wallet in subscribed:
+                reasons[article_id] = "subscription"
+                # Cached no longer than the billing date, when the subscription renews or lapses
+                until_billing = (subscribed[author_wallet] - now).total_seconds()
+                self._grants.put((wallet, article_id), ("subscription", author_wallet), min(self.ttl, until_billing))
+            else:
+                reasons[article_id] = None
+        return reasons
+
+# Global instance
+entitlement_service = EntitlementService()
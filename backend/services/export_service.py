@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.string_dictionary import decode_pageviews, PAGEVIEW_ENCODED_FIELDS
+from database import db
+
+EXPORT_BATCH_SIZE = 5000
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# Exported columns per dataset, in output order
+EXPORT_COLUMNS = {
+    "pageviews": [
+        "id", "article_id", "user_wallet", "ip_address", "user_agent", "referrer",
+        "session_id", "created_at", "view_date",
+    ],
+    "user_engagement": [
+        "id", "user_wallet", "action_type", "target_id", "target_type", "metadata",
+        "created_at", "engagement_date",
+    ],
+    "search_queries": [
+        "query", "user_wallet", "ip_address", "results_count", "filters_used", "created_at",
+    ],
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columns exported as JSON text because they hold nested documents
+_JSON_COLUMNS = {"metadata", "filters_used"}
+_TIMESTAMP_COLUMNS = {"created_at"}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _cell(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column in _JSON_COLUMNS:
+        return json.dumps(value, default=str)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _require_parquet():
+    try:
+        import pandas  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ExportError("Parquet export requires pandas and pyarrow")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each Parquet row group"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class ExportService:
+    """Streams raw analytics collections as CSV, NDJSON or Parquet with flat memory use"""
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+
+    async def ensure_indexes(self):
+        for dataset in EXPORT_COLUMNS:
+            await self.db[dataset].create_index("created_at")
+
+    async def build_filter(
+        self,
+        dataset: str,
+        article_id: Optional[str] = None,
+        author_wallet: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        if dataset not in EXPORT_COLUMNS:
+            raise ExportError(f"Unknown dataset. Must be one of: {list(EXPORT_COLUMNS)}")
+
+        query: Dict[str, Any] = {}
+
+        if start or end:
+            query["created_at"] = {}
+            if start:
+                query["created_at"]["$gte"] = start
+            if end:
+                query["created_at"]["$lt"] = end
+
+        if dataset == "search_queries":
+            if article_id or author_wallet:
+                raise ExportError("search_queries can only be filtered by date range")
+            return query
+
+        article_ids = None
+        if article_id:
+            article_ids = [article_id]
+        elif author_wallet:
+            article_ids = [
+                article["id"]
+                async for article in self.db.articles.find({"author_wallet": author_wallet}, {"id": 1})
+            ]
+
+        if article_ids is not None:
+            if dataset == "pageviews":
+                query["article_id"] = {"$in": article_ids}
+            else:
+                targets = [{"target_type": "article", "target_id": {"$in": article_ids}}]
+                if author_wallet and not article_id:
+                    targets.append({"target_type": "author", "target_id": author_wallet})
+                query["$or"] = targets
+
+        return query
+
+    async def rows(self, dataset: str, query: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Batches of flat rows read through a server-side cursor"""
+        columns = EXPORT_COLUMNS[dataset]
+        projection = {column: 1 for column in columns}
+        projection["_id"] = 0
+        if dataset == "pageviews":
+            projection.update({id_field: 1 for id_field in PAGEVIEW_ENCODED_FIELDS.values()})
+
+        async def convert(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            if dataset == "pageviews":
+                docs = await decode_pageviews(docs)
+            return [{column: _cell(column, doc.get(column)) for column in columns} for doc in docs]
+
+        cursor = self.db[dataset].find(query, projection, batch_size=EXPORT_BATCH_SIZE)
+        docs: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= EXPORT_BATCH_SIZE:
+                yield await convert(docs)
+                docs = []
+        if docs:
+            yield await convert(docs)
+
+    def stream(self, dataset: str, fmt: str, query: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """Encoded export body; format problems are raised before anything is streamed"""
+        if fmt == "csv":
+            return self._csv(dataset, query)
+        if fmt == "ndjson":
+            return self._ndjson(dataset, query)
+        if fmt == "parquet":
+            _require_parquet()
+            return self._parquet(dataset, query)
+        raise ExportError(f"Unknown format. Must be one of: {list(EXPORT_FORMATS)}")
+
+    async def _csv(self, dataset: str, query: Dict[str, Any]) -> AsyncIterator[bytes]:
+        columns = EXPORT_COLUMNS[dataset]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+
+        async for batch in self.rows(dataset, query):
+            writer.writerows(batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    async def _ndjson(self, dataset: str, query: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for batch in self.rows(dataset, query):
+            yield "".join(json.dumps(row, default=str) + "\n" for row in batch).encode("utf-8")
+
+    async def _parquet(self, dataset: str, query: Dict[str, Any]) -> AsyncIterator[bytes]:
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = EXPORT_COLUMNS[dataset]
+        schema = pa.schema([
+            (column, pa.int64() if column == "results_count" else
+             pa.timestamp("ms") if column in _TIMESTAMP_COLUMNS else pa.string())
+            for column in columns
+        ])
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        pending: List[Dict[str, Any]] = []
+
+        def write_row_group(rows: List[Dict[str, Any]]):
+            frame = pd.DataFrame.from_records(rows, columns=columns)
+            for column in _TIMESTAMP_COLUMNS & set(columns):
+                frame[column] = pd.to_datetime(frame[column])
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+        try:
+            async for batch in self.rows(dataset, query):
+                pending.extend(batch)
+                if len(pending) >= PARQUET_ROW_GROUP_SIZE:
+                    write_row_group(pending)
+                    pending = []
+                    yield sink.drain()
+
+            if pending:
+                write_row_group(pending)
+        finally:
+            writer.close()
+
+        yield sink.drain()
+
+
+# Global instance
+export_service = ExportService()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from models.article import Article, ArticleResponse, ArticleSearchQuery
+from services.article_search_service import article_search_service, build_search_filter
+from services.trigram_index import TrigramIndex
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Exact searches with fewer results than this get fuzzy matches appended
+FUZZY_MIN_RESULTS = int(os.environ.get("FUZZY_MIN_RESULTS", "3"))
+
+DocumentRow = Tuple[str, List[str]]
+
+
+def article_text(article: dict) -> List[str]:
+    return [article.get("title") or "", *(article.get("tags") or []), article.get("author_name") or ""]
+
+
+class FuzzySearchService:
+    """Typo-tolerant article search over titles, tags and author names.
+
+    Published articles are added to an in-memory trigram index as they are
+    created; a periodic background rebuild reloads every article from Mongo
+    and swaps the index in, replaying articles added during the rebuild.
+    """
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+        self._index = TrigramIndex()
+        self._replay: Optional[List[DocumentRow]] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    # Incremental updates
+
+    def record_article(self, article: Article):
+        if article.status != "published":
+            return
+        text = article_text(article.dict())
+        self._index.add(article.id, text)
+        if self._replay is not None:
+            self._replay.append((article.id, text))
+
+    # Reads
+
+    async def search(self, search_query: ArticleSearchQuery, exclude: List[str] = (), limit: int = 20) -> List[ArticleResponse]:
+        """Fuzzy matches for the query text that satisfy its other filters"""
+        if not search_query.query:
+            return []
+        excluded = set(exclude)
+        # Over-fetch: hydration drops articles failing the author/tag/category filters
+        ranked = self._index.search(search_query.query, (limit + len(excluded)) * 2)
+        ids = [article_id for article_id, _ in ranked if article_id not in excluded]
+        if not ids:
+            return []
+
+        filters = build_search_filter(search_query.copy(update={"query": None}))
+        articles = await article_search_service.hydrate(ids, filters)
+        return articles[:limit]
+
+    # Rebuild
+
+    async def rebuild(self):
+        """Rebuild the index from Mongo without blocking the event loop"""
+        if self._replay is not None:
+            # A rebuild is already running
+            return
+
+        self._replay = []
+        try:
+            rows = [
+                (article["id"], article_text(article))
+                async for article in self.db.articles.find(
+                    {"status": "published"}, {"id": 1, "title": 1, "tags": 1, "author_name": 1}
+                )
+            ]
+            index = await asyncio.to_thread(self.build, rows)
+        except Exception:
+            self._replay = None
+            raise
+
+        # No await between here and the swap, so no write can slip in unreplayed
+        for article_id, text in self._replay:
+            index.add(article_id, text)
+        self._replay = None
+        self._index = index
+
+    def build(self, rows: List[DocumentRow]) -> TrigramIndex:
+        index = TrigramIndex()
+        for article_id, text in rows:
+            index.add(article_id, text)
+        return index
+
+    def rebuild_in_background(self):
+        """Start a rebuild unless one is already running"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+
+        async def run():
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Failed to rebuild fuzzy search index: {e}")
+
+        self._rebuild_task = asyncio.create_task(run())
+
+
+# Global instance
+fuzzy_search_service = FuzzySearchService()
@@ -0,0 +1,82 @@
+import heapq
+from typing import Dict, Iterable, List, Tuple
+
+
+class SpaceSaving:
+    """Space-Saving top-K summary over a stream of keys.
+
+    Monitors at most `capacity` keys. A new key arriving when the summary is
+    full replaces the key with the smallest count and inherits that count as
+    its error, so counts are overestimates by at most `error`, and any key
+    with true frequency above N / capacity is guaranteed to be monitored.
+    The minimum is found through a heap with lazy invalidation.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # Auxiliary per-key total (e.g. summed result counts), reset on eviction
+        self.totals: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, key: str, count: int = 1, total: int = 0):
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+            self.totals[key] = 0
+        else:
+            floor = self._pop_min()
+            counts[key] = floor + count
+            self.errors[key] = floor
+            self.totals[key] = 0
+
+        self.totals[key] += total
+        heapq.heappush(self._heap, (counts[key], key))
+
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(value, name) for name, value in counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> int:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                del self.errors[key]
+                del self.totals[key]
+                return count
+
+    def items(self) -> Iterable[Tuple[str, int, int, int]]:
+        """(key, count, error, total) for every monitored key"""
+        for key, count in self.counts.items():
+            yield key, count, self.errors[key], self.totals[key]
+
+    def top(self, k: int) -> List[Tuple[str, int, int, int]]:
+        return heapq.nlargest(k, self.items(), key=lambda item: item[1])
+
+    @classmethod
+    def merged(cls, summaries: Iterable["SpaceSaving"], capacity: int) -> "SpaceSaving":
+        """Summary of the union of several streams, keeping the `capacity` largest counts"""
+        counts: Dict[str, List[int]] = {}
+        for summary in summaries:
+            for key, count, error, total in summary.items():
+                merged = counts.setdefault(key, [0, 0, 0])
+                merged[0] += count
+                merged[1] += error
+                merged[2] += total
+
+        result = cls(capacity)
+        for key, (count, error, total) in heapq.nlargest(capacity, counts.items(), key=lambda item: item[1][0]):
+            result.counts[key] = count
+            result.errors[key] = error
+            result.totals[key] = total
+        result._heap = [(count, key) for key, count in result.counts.items()]
+        heapq.heapify(result._heap)
+        return result
@@ -0,0 +1,157 @@
+import math
+import struct
+import zlib
+from hashlib import blake2b
+from typing import Dict, Optional
+
+import numpy as np
+
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+# Sparse sketches switch to dense registers once this fraction of registers is set
+SPARSE_LIMIT_FRACTION = 16
+
+_SPARSE_TAG = b"S"
+_DENSE_TAG = b"D"
+_MASK64 = (1 << 64) - 1
+
+
+def precision_for_error(standard_error: float) -> int:
+    """Smallest precision whose standard error (1.04 / sqrt(m)) is within the target"""
+    if standard_error <= 0:
+        raise ValueError("standard_error must be positive")
+    precision = math.ceil(math.log2((1.04 / standard_error) ** 2))
+    return max(MIN_PRECISION, min(MAX_PRECISION, precision))
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash (Python's hash() is randomized per process)"""
+    return int.from_bytes(blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality sketch with a sparse representation for small sets.
+
+    Registers are kept as an ``{index: rank}`` dict until the sketch fills up,
+    then as a dense uint8 array of ``2 ** precision`` registers. Sketches with the
+    same precision merge losslessly, which is what makes per-day sketches
+    combinable into range estimates.
+    """
+
+    def __init__(self, precision: int = 13):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.m = 1 << precision
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._registers: Optional[np.ndarray] = None
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._registers is None
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value) -> None:
+        """Add a value (anything with a stable str()) to the sketch"""
+        h = hash64(str(value))
+        index = h >> (64 - self.precision)
+        rest = (h << self.precision) & _MASK64
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - self.precision + 1
+        self._set(index, rank)
+
+    def _set(self, index: int, rank: int) -> None:
+        if self._registers is not None:
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+            return
+
+        if rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > self.m // SPARSE_LIMIT_FRACTION:
+                self._densify()
+
+    def _densify(self) -> None:
+        registers = np.zeros(self.m, dtype=np.uint8)
+        if self._sparse:
+            registers[np.fromiter(self._sparse.keys(), dtype=np.int64)] = np.fromiter(
+                self._sparse.values(), dtype=np.uint8
+            )
+        self._registers = registers
+        self._sparse = None
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch into this one (register-wise max)"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+
+        if other.is_sparse:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+            return self
+
+        if self.is_sparse:
+            self._densify()
+        np.maximum(self._registers, other._registers, out=self._registers)
+        return self
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added"""
+        if self.is_sparse:
+            ranks = np.fromiter(self._sparse.values(), dtype=np.float64, count=len(self._sparse))
+            zeros = self.m - len(self._sparse)
+            total = zeros + float(np.exp2(-ranks).sum())
+        else:
+            zeros = int(np.count_nonzero(self._registers == 0))
+            total = float(np.exp2(-self._registers.astype(np.float64)).sum())
+
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / total
+
+        # Linear counting is more accurate while many registers are still empty
+        if raw <= 2.5 * self.m and zeros:
+            return int(round(self.m * math.log(self.m / zeros)))
+        return int(round(raw))
+
+    def __len__(self) -> int:
+        return self.estimate()
+
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.precision)
+        if self.is_sparse:
+            clone._sparse = dict(self._sparse)
+        else:
+            clone._sparse = None
+            clone._registers = self._registers.copy()
+        return clone
+
+    def to_bytes(self) -> bytes:
+        """Compact binary form: packed (index, rank) pairs when sparse, compressed registers when dense"""
+        header = struct.pack(">B", self.precision)
+        if self.is_sparse:
+            packed = np.array(
+                sorted((index << 6) | rank for index, rank in self._sparse.items()), dtype=">u4"
+            )
+            return _SPARSE_TAG + header + packed.tobytes()
+        return _DENSE_TAG + header + zlib.compress(self._registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        tag, (precision,) = data[:1], struct.unpack(">B", data[1:2])
+        sketch = cls(precision)
+        body = data[2:]
+
+        if tag == _SPARSE_TAG:
+            packed = np.frombuffer(body, dtype=">u4")
+            sketch._sparse = {int(v >> 6): int(v & 0x3F) for v in packed}
+        elif tag == _DENSE_TAG:
+            sketch._sparse = None
+            sketch._registers = np.frombuffer(zlib.decompress(body), dtype=np.uint8).copy()
+        else:
+            raise ValueError("Unknown HyperLogLog encoding")
+
+        return sketch
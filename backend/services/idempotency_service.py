@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+# How long a key's stored response is replayed
+IDEMPOTENCY_TTL = timedelta(seconds=float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400")))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# A claim not completed within this long is assumed abandoned (crashed worker) and can be taken over
+IDEMPOTENCY_LOCK = timedelta(seconds=float(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "30")))
+# How long a retry waits for the original request to finish before answering 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "5"))
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+def fingerprint(body: Any) -> str:
+    """Stable hash of a request body, so a key reused with a different body is caught"""
+    canonical = json.dumps(jsonable_encoder(body), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyService:
+    """Replays the stored response of a POST retried with the same idempotency key.
+
+    The first request with a key claims it in Mongo (unique _id), runs, and
+    stores its JSON response on the claim, which a TTL index expires after
+    IDEMPOTENCY_TTL. Retries, from any worker, get that response back
+    without running the handler again; a retry arriving while the original
+    is still running waits for it. Completed responses are also kept in a
+    per-process LRU, so most replays never reach Mongo. A failed request
+    releases its claim so it can be retried.
+    """
+
+    def __init__(self, database=None, cache_size: int = IDEMPOTENCY_CACHE_SIZE, poll_interval: float = 0.1):
+        self.db = database if database is not None else db
+        self.cache_size = cache_size
+        self.poll_interval = poll_interval
+        self._cache: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+
+    async def ensure_indexes(self):
+        await self.db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+    # Local cache
+
+    def _cached(self, key: str) -> Optional[Tuple[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, request_hash, response = entry
+        if time.time() >= expires:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return request_hash, response
+
+    def _remember(self, key: str, request_hash: str, response: Any, expires_at: datetime):
+        self._cache[key] = ((expires_at - datetime.utcnow()).total_seconds() + time.time(), request_hash, response)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # Requests
+
+    async def run(self, scope: str, key: Optional[str], body: Any, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `handler` once per (scope, key); without a key it simply runs"""
+        if not key:
+            return await handler()
+
+        key = f"{scope}:{key}"
+        request_hash = fingerprint(body)
+
+        cached = self._cached(key)
+        if cached is not None:
+            return self._replay(request_hash, *cached)
+
+        owner = str(uuid.uuid4())
+        while not await self._claim(key, request_hash, owner):
+            stored = await self._wait(key, request_hash)
+            if stored is not None:
+                return self._replay(request_hash, *stored)
+            # The original request failed or was abandoned: claim the key again
+
+        try:
+            response = jsonable_encoder(await handler())
+        except BaseException:
+            await self.db.idempotency_keys.delete_one({"_id": key, "owner": owner, "state": IN_PROGRESS})
+            raise
+
+        expires_at = datetime.utcnow() + IDEMPOTENCY_TTL
+        await self.db.idempotency_keys.update_one(
+            {"_id": key, "owner": owner},
+            {"$set": {"state": DONE, "response": response, "expires_at": expires_at}}
+        )
+        self._remember(key, request_hash, response, expires_at)
+        return response
+
+    def _replay(self, request_hash: str, stored_hash: str, response: Any) -> Any:
+        if stored_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+        return response
+
+    async def _claim(self, key: str, request_hash: str, owner: str) -> bool:
+        """Take the key if it is new, or if its previous claim was abandoned"""
+        now = datetime.utcnow()
+        try:
+            await self.db.idempotency_keys.find_one_and_update(
+                {"_id": key, "state": IN_PROGRESS, "locked_until": {"$lt": now}},
+                {"$set": {
+                    "request_hash": request_hash,
+                    "owner": owner,
+                    "state": IN_PROGRESS,
+                    "locked_until": now + IDEMPOTENCY_LOCK,
+                    "expires_at": now + IDEMPOTENCY_TTL
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The key is done, or claimed by a request that is still running
+            return False
+
+    async def _wait(self, key: str, request_hash: str) -> Optional[Tuple[str, Any]]:
+        """Wait for the request holding the key; None if it released or abandoned its claim"""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            doc = await self.db.idempotency_keys.find_one({"_id": key})
+            if doc is None:
+                return None
+            if doc["state"] == DONE:
+                self._remember(key, doc["request_hash"], doc["response"], doc["expires_at"])
+                return doc["request_hash"], doc["response"]
+            if doc["request_hash"] != request_hash:
+                return doc["request_hash"], None
+            if doc["locked_until"] < datetime.utcnow():
+                return None
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(self.poll_interval)
+
+
+# Global instance
+idempotency_service = IdempotencyService()
@@ -0,0 +1,305 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Union
+
+from bson.decimal128 import Decimal128
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from models.monetization import CurrencyBalance, RevenueStats, encode_money
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Events still unapplied after this long are assumed to have lost their writer and are applied by the
+# sweep; also how long a writer's claim on an event lasts
+LEDGER_APPLY_GRACE = timedelta(seconds=float(os.environ.get("LEDGER_APPLY_GRACE_SECONDS", "60")))
+LEDGER_WRITE_BATCH_SIZE = 1000
+
+Amount = Union[Decimal, int]
+
+
+def _decimal(value) -> Decimal:
+    return value.to_decimal() if isinstance(value, Decimal128) else Decimal(str(value or 0))
+
+
+def _merge(postings: Dict[str, Dict[str, Amount]], wallet: Optional[str], **amounts: Amount):
+    """Add amounts to a wallet's posting; a wallet gets one posting per event even if it is on both sides"""
+    if not wallet:
+        return
+    posting = postings.setdefault(wallet, {})
+    for field, value in amounts.items():
+        posting[field] = posting.get(field, 0) + value
+
+
+def ledger_event(kind: str, source_id: str, currency: str, amount: Decimal, postings: Dict[str, Dict[str, Amount]],
+                 transaction_hash: Optional[str] = None, created_at: Optional[datetime] = None) -> dict:
+    return {
+        "key": f"{kind}:{source_id}",
+        "kind": kind,
+        "source_id": source_id,
+        "currency": currency,
+        "amount": Decimal128(amount),
+        "transaction_hash": transaction_hash,
+        "postings": [{"wallet": wallet, "inc": encode_money(inc)} for wallet, inc in postings.items()],
+        "created_at": created_at or datetime.utcnow(),
+        "applied": False,
+    }
+
+
+# Events per source document. Each takes the stored document (or model .dict()), so the
+# same key and postings come out whether an event is recorded live or backfilled later.
+
+def tip_event(tip: dict) -> dict:
+    amount = _decimal(tip["amount"])
+    postings: Dict[str, Dict[str, Amount]] = {}
+    _merge(postings, tip["from_wallet"], balance=-amount, spent=amount)
+    _merge(postings, tip["to_wallet"], balance=amount, tips_received=amount, tips_count=1)
+    return ledger_event("tip", tip["id"], tip["currency"], amount, postings, tip.get("transaction_hash"), tip.get("created_at"))
+
+
+def purchase_event(purchase: dict, author_wallet: Optional[str]) -> dict:
+    amount = _decimal(purchase["amount"])
+    postings: Dict[str, Dict[str, Amount]] = {}
+    _merge(postings, purchase["buyer_wallet"], balance=-amount, spent=amount, purchases_count=1)
+    _merge(postings, author_wallet, balance=amount, paid_content_revenue=amount, content_sales_count=1)
+    return ledger_event(
+        "purchase", purchase["id"], purchase["currency"], amount, postings,
+        purchase.get("transaction_hash"), purchase.get("created_at")
+    )
+
+
+def subscription_event(subscription: dict) -> dict:
+    """The first billing period, paid when the subscription is created"""
+    amount = _decimal(subscription["amount"])
+    postings: Dict[str, Dict[str, Amount]] = {}
+    _merge(postings, subscription["subscriber_wallet"], balance=-amount, spent=amount)
+    _merge(postings, subscription["author_wallet"], balance=amount, subscription_revenue=amount, active_subscribers=1)
+    return ledger_event(
+        "subscription", subscription["id"], subscription["currency"], amount, postings,
+        created_at=subscription.get("created_at")
+    )
+
+
+def cancellation_event(subscription: dict, created_at: Optional[datetime] = None) -> dict:
+    postings: Dict[str, Dict[str, Amount]] = {}
+    _merge(postings, subscription["author_wallet"], active_subscribers=-1)
+    return ledger_event(
+        "subscription_cancelled", subscription["id"], subscription["currency"], Decimal("0"), postings,
+        created_at=created_at
+    )
+
+
+def nft_sale_event(sale: dict, creator_wallet: Optional[str]) -> dict:
+    """The seller is paid the price less royalties, which go to the NFT's creator"""
+    price = _decimal(sale["price"])
+    royalty = _decimal(sale.get("royalty_amount")) if creator_wallet else Decimal("0")
+    postings: Dict[str, Dict[str, Amount]] = {}
+    _merge(postings, sale["buyer_wallet"], balance=-price, spent=price)
+    _merge(postings, sale["seller_wallet"], balance=price - royalty, nft_sales_revenue=price - royalty, nft_sales_count=1)
+    if royalty:
+        _merge(postings, creator_wallet, balance=royalty, nft_sales_revenue=royalty)
+    return ledger_event(
+        "nft_sale", sale["id"], sale["currency"], price, postings, sale.get("transaction_hash"), sale.get("created_at")
+    )
+
+
+class LedgerService:
+    """Append-only log of monetary events, folded into one ledger document per wallet.
+
+    Every event is inserted once under a unique key (and transaction hash,
+    when there is one), then each of its postings is $inc'ed into the
+    wallet's per-currency totals by whichever writer claims the event.
+    Events whose writer died between the insert and the fold are claimed
+    and applied by a periodic sweep. Revenue reads are a single document fetch, and
+    `replay` rebuilds every wallet document from the log.
+    """
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+
+    async def ensure_indexes(self):
+        await self.db.ledger_events.create_index("key", unique=True)
+        await self.db.ledger_events.create_index(
+            "transaction_hash", unique=True, partialFilterExpression={"transaction_hash": {"$type": "string"}}
+        )
+        await self.db.ledger_events.create_index([("applied", 1), ("created_at", 1)])
+        await self.db.ledger_events.create_index("created_at")
+
+    # Writes
+
+    async def record(self, event: dict) -> dict:
+        """Append an event unless its key was already recorded, then fold it into wallet ledgers"""
+        try:
+            await self.db.ledger_events.insert_one(event)
+        except DuplicateKeyError:
+            duplicates = [{"key": event["key"]}]
+            if event["transaction_hash"]:
+                duplicates.append({"transaction_hash": event["transaction_hash"]})
+            existing = await self.db.ledger_events.find_one({"$or": duplicates})
+            if existing is None:
+                raise
+            event = existing
+            if event["applied"]:
+                return event
+        await self.apply(event)
+        return event
+
+    async def apply(self, event: dict, now: Optional[datetime] = None):
+        """Fold an unapplied event into its wallets' ledgers, unless another writer holds it.
+
+        Each wallet update also adds the event key to the wallet's `pending`
+        keys in the same write, so a writer taking over an expired claim
+        skips the wallets its predecessor already folded. The keys are pulled
+        once the event is marked applied.
+        """
+        now = now or datetime.utcnow()
+        claimed = await self.db.ledger_events.find_one_and_update(
+            {
+                "_id": event["_id"],
+                "applied": False,
+                "$or": [{"applying_until": {"$exists": False}}, {"applying_until": {"$lt": now}}]
+            },
+            {"$set": {"applying_until": now + LEDGER_APPLY_GRACE}},
+            {"_id": 1}
+        )
+        if claimed is None:
+            return
+
+        for posting in event["postings"]:
+            wallet_filter = {"_id": posting["wallet"], "pending": {"$ne": event["key"]}}
+            update = {
+                "$inc": {f"currencies.{event['currency']}.{field}": value for field, value in posting["inc"].items()},
+                "$push": {"pending": event["key"]},
+                "$set": {"updated_at": now}
+            }
+            try:
+                await self.db.wallet_ledgers.update_one(wallet_filter, update, upsert=True)
+            except DuplicateKeyError:
+                # Either the posting is already folded, or another event created the document first
+                await self.db.wallet_ledgers.update_one(wallet_filter, update)
+        await self.db.ledger_events.update_one({"_id": event["_id"]}, {"$set": {"applied": True}, "$unset": {"applying_until": ""}})
+
+        for posting in event["postings"]:
+            await self.db.wallet_ledgers.update_one({"_id": posting["wallet"]}, {"$pull": {"pending": event["key"]}})
+
+    async def apply_pending(self, now: Optional[datetime] = None):
+        """Apply events left unapplied by a writer that failed mid-way"""
+        cutoff = (now or datetime.utcnow()) - LEDGER_APPLY_GRACE
+        applied = 0
+        async for event in self.db.ledger_events.find({"applied": False, "created_at": {"$lt": cutoff}}).sort("created_at", 1):
+            await self.apply(event, now)
+            applied += 1
+        if applied:
+            logger.info(f"Applied {applied} pending ledger events")
+
+    # Reads
+
+    async def balances(self, wallet: str) -> List[CurrencyBalance]:
+        doc = await self.db.wallet_ledgers.find_one({"_id": wallet}, {"currencies": 1})
+        currencies = (doc or {}).get("currencies", {})
+        return [CurrencyBalance(currency=currency, **totals) for currency, totals in sorted(currencies.items())]
+
+    async def revenue(self, wallet: str, currency: Optional[str] = None) -> RevenueStats:
+        """Revenue totals for one currency, or summed over all of them"""
+        balances = [b for b in await self.balances(wallet) if currency is None or b.currency == currency]
+        tips = sum((b.tips_received for b in balances), Decimal("0"))
+        paid_content = sum((b.paid_content_revenue for b in balances), Decimal("0"))
+        subscriptions = sum((b.subscription_revenue for b in balances), Decimal("0"))
+        nft_sales = sum((b.nft_sales_revenue for b in balances), Decimal("0"))
+        return RevenueStats(
+            total_tips_received=tips,
+            total_paid_content_revenue=paid_content,
+            total_subscription_revenue=subscriptions,
+            total_nft_sales_revenue=nft_sales,
+            total_revenue=tips + paid_content + subscriptions + nft_sales,
+            tips_count=sum(b.tips_count for b in balances),
+            purchases_count=sum(b.purchases_count for b in balances),
+            active_subscribers=sum(b.active_subscribers for b in balances)
+        )
+
+    # Replay
+
+    async def backfill(self) -> int:
+        """Append events for monetization records that predate the ledger; already-logged ones are skipped"""
+        authors = {}
+        creators = {}
+
+        async def author_of(article_id: str) -> Optional[str]:
+            if article_id not in authors:
+                article = await self.db.articles.find_one({"id": article_id}, {"author_wallet": 1})
+                authors[article_id] = article.get("author_wallet") if article else None
+            return authors[article_id]
+
+        async def creator_of(nft_id: str) -> Optional[str]:
+            if nft_id not in creators:
+                nft = await self.db.nfts.find_one({"id": nft_id}, {"creator_wallet": 1})
+                creators[nft_id] = nft.get("creator_wallet") if nft else None
+            return creators[nft_id]
+
+        async def events():
+            async for tip in self.db.tips.find():
+                yield tip_event(tip)
+            async for purchase in self.db.purchases.find():
+                yield purchase_event(purchase, await author_of(purchase["article_id"]))
+            async for subscription in self.db.subscriptions.find():
+                yield subscription_event(subscription)
+                if not subscription.get("is_active", True):
+                    yield cancellation_event(subscription)
+            async for sale in self.db.nft_sales.find():
+                yield nft_sale_event(sale, await creator_of(sale["nft_id"]))
+
+        inserted = 0
+        batch = []
+        async for event in events():
+            batch.append(event)
+            if len(batch) >= LEDGER_WRITE_BATCH_SIZE:
+                inserted += await self._insert_new(batch)
+                batch = []
+        if batch:
+            inserted += await self._insert_new(batch)
+        return inserted
+
+    async def _insert_new(self, events: List[dict]) -> int:
+        try:
+            result = await self.db.ledger_events.insert_many(events, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            return e.details["nInserted"]
+
+    async def replay(self) -> int:
+        """Rebuild every wallet ledger document from the event log. Run offline: live events are not merged in"""
+        started = datetime.utcnow()
+        totals: Dict[str, Dict[str, Dict[str, Amount]]] = {}
+        async for event in self.db.ledger_events.find({}, {"key": 1, "currency": 1, "postings": 1}).sort("created_at", 1):
+            for posting in event["postings"]:
+                currency = totals.setdefault(posting["wallet"], {}).setdefault(event["currency"], {})
+                for field, value in posting["inc"].items():
+                    value = _decimal(value) if isinstance(value, Decimal128) else value
+                    currency[field] = currency.get(field, 0) + value
+
+        operations = [
+            ReplaceOne(
+                {"_id": wallet},
+                {
+                    "currencies": {currency: encode_money(fields) for currency, fields in currencies.items()},
+                    "pending": [],
+                    "updated_at": started
+                },
+                upsert=True
+            )
+            for wallet, currencies in totals.items()
+        ]
+        for start in range(0, len(operations), LEDGER_WRITE_BATCH_SIZE):
+            await self.db.wallet_ledgers.bulk_write(operations[start:start + LEDGER_WRITE_BATCH_SIZE], ordered=False)
+        await self.db.wallet_ledgers.delete_many({"_id": {"$nin": list(totals)}})
+        await self.db.ledger_events.update_many({"applied": False}, {"$set": {"applied": True}, "$unset": {"applying_until": ""}})
+        return len(totals)
+
+
+# Global instance
+ledger_service = LedgerService()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+from models.analytics import PageView
+from services.string_dictionary import encode_pageview
+from database import db
+
+PAGEVIEW_DEDUP_WINDOW_SECONDS = float(os.environ.get("PAGEVIEW_DEDUP_WINDOW_SECONDS", "1800"))
+PAGEVIEW_DEDUP_MAX_KEYS = int(os.environ.get("PAGEVIEW_DEDUP_MAX_KEYS", "500000"))
+# "drop" discards filtered views; "flag" keeps them in filtered_pageviews for a week
+PAGEVIEW_FILTER_MODE = os.environ.get("PAGEVIEW_FILTER_MODE", "drop")
+FILTERED_PAGEVIEW_RETENTION = timedelta(days=7)
+
+# Filter reasons
+DUPLICATE = "duplicate"
+BOT = "bot"
+
+# One alternation compiled once; substrings of known crawler, preview and scripted-client user agents
+BOT_USER_AGENT = re.compile(
+    "|".join([
+        r"bot\b", r"crawl", r"spider", r"slurp", r"archiver", r"scrapy",
+        r"facebookexternalhit", r"embedly", r"quora link preview", r"whatsapp/", r"telegrambot",
+        r"headlesschrome", r"phantomjs", r"puppeteer", r"playwright", r"selenium", r"lighthouse",
+        r"python-requests", r"python-urllib", r"aiohttp", r"httpx", r"go-http-client", r"java/",
+        r"okhttp", r"curl/", r"wget/", r"libwww-perl", r"node-fetch", r"axios/",
+        r"uptimerobot", r"uptime-monitor", r"pingdom", r"statuscake", r"site24x7", r"newrelicpinger",
+    ]),
+    re.IGNORECASE
+)
+
+
+def is_bot(user_agent: Optional[str]) -> bool:
+    # A missing user agent is not evidence of a bot (privacy proxies and some
+    # in-app browsers strip it); such views still go through dedup
+    return bool(user_agent) and BOT_USER_AGENT.search(user_agent) is not None
+
+
+class RecentKeys:
+    """Time-bucketed set remembering keys seen within `window`.
+
+    Keys live in two generations (current and previous) that rotate every
+    window, so lookups cover at least one full window and memory is bounded
+    by two generations. A generation reaching `max_keys` rotates early,
+    which can only forget keys, never invent them.
+    """
+
+    def __init__(self, window: timedelta, max_keys: int = PAGEVIEW_DEDUP_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._current: Dict[bytes, datetime] = {}
+        self._previous: Dict[bytes, datetime] = {}
+        self._rotated_at: Optional[datetime] = None
+
+    def _rotate_if_due(self, now: datetime):
+        if self._rotated_at is None:
+            self._rotated_at = now
+        elif now - self._rotated_at >= self.window or len(self._current) >= self.max_keys:
+            self._previous, self._current = self._current, {}
+            self._rotated_at = now
+
+    def seen(self, key: str, now: datetime) -> bool:
+        """Record `key` at `now`; True if it was already seen within the window"""
+        self._rotate_if_due(now)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=12).digest()
+
+        last = self._current.get(digest) or self._previous.get(digest)
+        if last is not None and now - last < self.window:
+            return True
+
+        self._current[digest] = now
+        return False
+
+
+class PageviewFilter:
+    """Ingest-side filter dropping bot hits and repeat views before they are stored.
+
+    A view is a repeat when the same visitor (session id, else wallet, else
+    ip) viewed the same article within the dedup window. Dedup state is per
+    process. Dropped events are counted per day and reason in
+    pageview_filter_stats.
+    """
+
+    def __init__(
+        self,
+        database=None,
+        window_seconds: float = PAGEVIEW_DEDUP_WINDOW_SECONDS,
+        mode: str = PAGEVIEW_FILTER_MODE,
+    ):
+        self.db = database if database is not None else db
+        self.recent = RecentKeys(timedelta(seconds=window_seconds))
+        self.mode = mode
+        self._dropped: Dict[str, Dict[str, int]] = {}
+
+    async def ensure_indexes(self):
+        await self.db.pageview_filter_stats.create_index("day", unique=True)
+        await self.db.filtered_pageviews.create_index("expires_at", expireAfterSeconds=0)
+
+    def classify(self, pageview: PageView) -> Optional[str]:
+        """Reason to filter the pageview, or None to keep it"""
+        if is_bot(pageview.user_agent):
+            return BOT
+
+        visitor = pageview.session_id or pageview.user_wallet or pageview.ip_address
+        if visitor and self.recent.seen(f"{visitor}|{pageview.article_id}", pageview.created_at):
+            return DUPLICATE
+
+        return None
+
+    async def check(self, pageview: PageView) -> bool:
+        """Count (and in flag mode keep) a filtered pageview; True if it should be stored"""
+        reason = self.classify(pageview)
+        if reason is None:
+            return True
+
+        day = self._dropped.setdefault(pageview.created_at.date().isoformat(), {})
+        day[reason] = day.get(reason, 0) + 1
+
+        if self.mode == "flag":
+            await self.db.filtered_pageviews.insert_one({
+                **await encode_pageview(pageview),
+                "reason": reason,
+                "expires_at": datetime.utcnow() + FILTERED_PAGEVIEW_RETENTION,
+            })
+        return False
+
+    async def flush(self):
+        """Add the dropped-event counts to pageview_filter_stats"""
+        dropped, self._dropped = self._dropped, {}
+        if not dropped:
+            return
+
+        try:
+            await self.db.pageview_filter_stats.bulk_write([
+                UpdateOne({"day": day}, {"$inc": counts}, upsert=True)
+                for day, counts in dropped.items()
+            ], ordered=False)
+        except Exception:
+            for day, counts in dropped.items():
+                pending = self._dropped.setdefault(day, {})
+                for reason, count in counts.items():
+                    pending[reason] = pending.get(reason, 0) + count
+            raise
+
+    async def dropped(self, start: date, end: date) -> list:
+        """Stored daily dropped-event counts between start and end (inclusive)"""
+        return await self.db.pageview_filter_stats.find(
+            {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}},
+            {"_id": 0}
+        ).sort("day", 1).to_list(None)
+
+
+# Global instance
+pageview_filter = PageviewFilter()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from models.analytics import PlatformStats
+from services.cardinality_service import cardinality_service, ACTIVE_USERS, PLATFORM_KEY
+from services.single_flight import stats_flight
+from database import db
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_STATS_MAX_AGE = timedelta(seconds=float(os.environ.get("PLATFORM_STATS_MAX_AGE_SECONDS", "300")))
+
+
+async def _sum_amount(collection, field: str) -> float:
+    result = await collection.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": {"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}}}}
+    ]).to_list(1)
+    return result[0]["total"] if result else 0.0
+
+
+class PlatformStatsService:
+    """Platform stats computed by a scheduled job and served from memory.
+
+    Requests never compute: they get the in-memory snapshot (or the latest
+    stored one) and, when it is older than the max age, a background refresh
+    is kicked off - stale-while-revalidate. Each refresh is stored as the
+    day's snapshot in platform_stats.
+    """
+
+    def __init__(self, database=None, max_age: timedelta = PLATFORM_STATS_MAX_AGE):
+        self.db = database if database is not None else db
+        self.max_age = max_age
+        self._snapshot: Optional[PlatformStats] = None
+        self._computed_at: Optional[datetime] = None
+
+    async def ensure_indexes(self):
+        await self.db.platform_stats.create_index("stats_date", unique=True)
+        await self.db.user_engagement.create_index("action_type")
+        await self.db.authors.create_index("created_at")
+        await self.db.articles.create_index("created_at")
+
+    async def calculate(self) -> PlatformStats:
+        """Run the platform queries concurrently"""
+        today = date.today()
+        today_start = datetime.combine(today, datetime.min.time())
+        today_end = datetime.combine(today, datetime.max.time())
+        today_range = {"created_at": {"$gte": today_start, "$lte": today_end}}
+
+        (
+            total_users,
+            total_articles,
+            total_views,
+            total_likes,
+            total_comments,
+            total_tips,
+            total_tip_amount,
+            purchase_revenue,
+            subscription_revenue,
+            active_users,
+            new_users,
+            new_articles,
+        ) = await asyncio.gather(
+            # Totals shown on a dashboard don't need exact counts
+            self.db.authors.estimated_document_count(),
+            self.db.articles.estimated_document_count(),
+            self.db.pageviews.estimated_document_count(),
+            self.db.user_engagement.count_documents({"action_type": "like"}),
+            self.db.user_engagement.count_documents({"action_type": "comment"}),
+            self.db.tips.estimated_document_count(),
+            _sum_amount(self.db.tips, "amount"),
+            _sum_amount(self.db.purchases, "amount"),
+            _sum_amount(self.db.subscriptions, "total_paid"),
+            cardinality_service.estimate(ACTIVE_USERS, PLATFORM_KEY, today, today),
+            self.db.authors.count_documents(today_range),
+            self.db.articles.count_documents(today_range),
+        )
+
+        return PlatformStats(
+            stats_date=today,
+            total_users=total_users,
+            total_articles=total_articles,
+            total_views=total_views,
+            total_likes=total_likes,
+            total_comments=total_comments,
+            total_tips=total_tips,
+            total_tip_amount=total_tip_amount,
+            total_revenue=total_tip_amount + purchase_revenue + subscription_revenue,
+            active_users=active_users,
+            new_users=new_users,
+            new_articles=new_articles
+        )
+
+    def _flight_key(self):
+        return ("platform_stats", date.today().isoformat())
+
+    async def refresh(self):
+        """Compute and store today's snapshot, unless another worker just did"""
+        await stats_flight.do(self._flight_key(), self._refresh)
+
+    async def _refresh(self):
+        stored = await self.db.platform_stats.find_one({"stats_date": date.today().isoformat()})
+        if stored and stored.get("computed_at") and datetime.utcnow() - stored["computed_at"] < self.max_age / 2:
+            self._use(stored)
+            return
+
+        stats = await self.calculate()
+        computed_at = datetime.utcnow()
+        await self.db.platform_stats.update_one(
+            {"stats_date": stats.stats_date.isoformat()},
+            {"$set": {**stats.dict(exclude={"stats_date"}), "computed_at": computed_at}},
+            upsert=True
+        )
+        self._snapshot = stats
+        self._computed_at = computed_at
+
+    def _use(self, doc: dict):
+        self._snapshot = PlatformStats(**doc)
+        self._computed_at = doc.get("computed_at") or datetime.min
+
+    def refresh_in_background(self):
+        """Start a refresh unless one is already running"""
+        if stats_flight.in_flight(self._flight_key()):
+            return
+
+        async def run():
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh platform stats: {e}")
+
+        asyncio.create_task(run())
+
+    async def get(self) -> PlatformStats:
+        """Latest snapshot; never computes inline"""
+        if self._snapshot is None:
+            latest = await self.db.platform_stats.find_one(sort=[("stats_date", -1)])
+            if latest:
+                self._use(latest)
+
+        if self._snapshot is None or datetime.utcnow() - self._computed_at > self.max_age:
+            self.refresh_in_background()
+
+        return self._snapshot or PlatformStats()
+
+
+# Global instance
+platform_stats_service = PlatformStatsService()
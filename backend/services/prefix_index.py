@@ -0,0 +1,140 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+TermKey = Tuple[str, str]
+
+
+class Term:
+    __slots__ = ("kind", "text", "display", "weight", "payload")
+
+    def __init__(self, kind: str, text: str, display: str, weight: float, payload: Any):
+        self.kind = kind
+        self.text = text
+        self.display = display
+        self.weight = weight
+        self.payload = payload
+
+
+class _Node:
+    __slots__ = ("children", "top", "bucket")
+
+    def __init__(self):
+        self.children: Optional[Dict[str, "_Node"]] = None
+        # Best term ids under this node, highest weight first
+        self.top: List[int] = []
+        # (full key, term id) for every key reaching max depth here, sorted so that the keys
+        # starting with a longer prefix are one contiguous run found by bisection
+        self.bucket: Optional[List[Tuple[str, int]]] = None
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def word_starts(text: str) -> List[str]:
+    """The text itself plus every suffix starting at a word, so 'intro to defi' matches 'defi'"""
+    words = text.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Trie over term keys with the top-k terms precomputed at every node.
+
+    Each term is reachable from the start of each of its words. Keys are
+    truncated at `max_depth` characters; deeper prefixes are answered from
+    the sorted full keys kept at the max-depth node. Weights only grow
+    between rebuilds, so keeping each node's top-k current on insert is a
+    bounded merge along one path. Terms are never removed: an index is
+    rebuilt to drop them.
+    """
+
+    def __init__(self, k: int = 10, max_depth: int = 8):
+        self.k = k
+        self.max_depth = max_depth
+        self._root = _Node()
+        self._terms: List[Term] = []
+        self._ids: Dict[TermKey, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, kind: str, display: str, weight: float = 1.0, payload: Any = None):
+        """Insert a term, or raise its weight by `weight` if it already exists"""
+        text = normalize(display)
+        if not text:
+            return
+
+        term_id = self._ids.get((kind, text))
+        if term_id is None:
+            term_id = self._ids[(kind, text)] = len(self._terms)
+            self._terms.append(Term(kind, text, display, weight, payload))
+        else:
+            term = self._terms[term_id]
+            term.weight += weight
+            if payload is not None:
+                term.payload = payload
+
+        for key in word_starts(text):
+            self._insert(key, term_id)
+
+    def _insert(self, key: str, term_id: int):
+        node = self._root
+        for char in key[:self.max_depth]:
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            self._promote(node, term_id)
+
+        if len(key) >= self.max_depth:
+            if node.bucket is None:
+                node.bucket = []
+            entry = (key, term_id)
+            i = bisect_left(node.bucket, entry)
+            if i == len(node.bucket) or node.bucket[i] != entry:
+                node.bucket.insert(i, entry)
+
+    def _promote(self, node: _Node, term_id: int):
+        top = node.top
+        terms = self._terms
+        weight = terms[term_id].weight
+
+        if term_id not in top:
+            if len(top) >= self.k:
+                if weight <= terms[top[-1]].weight:
+                    return
+                top.pop()
+            top.append(term_id)
+
+        # Insertion sort of the one changed entry; top has at most k items
+        i = top.index(term_id)
+        while i > 0 and terms[top[i - 1]].weight < weight:
+            top[i - 1], top[i] = top[i], top[i - 1]
+            i -= 1
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[Term]:
+        """Highest-weight terms matching `prefix` (at the start of the term or of any word)"""
+        prefix = normalize(prefix)
+        limit = min(limit or self.k, self.k)
+        if not prefix:
+            return []
+
+        node = self._root
+        for char in prefix[:self.max_depth]:
+            if node.children is None or char not in node.children:
+                return []
+            node = node.children[char]
+
+        if len(prefix) <= self.max_depth:
+            return [self._terms[term_id] for term_id in node.top[:limit]]
+
+        bucket = node.bucket or []
+        term_ids = set()
+        i = bisect_left(bucket, (prefix,))
+        while i < len(bucket) and bucket[i][0].startswith(prefix):
+            term_ids.add(bucket[i][1])
+            i += 1
+        candidates = sorted((self._terms[term_id] for term_id in term_ids), key=lambda term: term.weight, reverse=True)
+        return candidates[:limit]
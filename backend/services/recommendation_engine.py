@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from models.article import ArticleResponse
+from services.analytics_engine import Codes
+from services.article_search_service import article_search_service
+from services.single_flight import MongoLease
+from services.trending_service import trending_service
+from database import db
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_NEIGHBOURS = int(os.environ.get("RECOMMENDATION_NEIGHBOURS", "50"))
+# Users engaging with more articles than this are left out of similarities (crawlers, scripts)
+RECOMMENDATION_MAX_USER_ARTICLES = int(os.environ.get("RECOMMENDATION_MAX_USER_ARTICLES", "1000"))
+RECOMMENDATION_PROCESSES = int(os.environ.get("RECOMMENDATION_PROCESSES", "1"))
+# Seeds per user for the feed: their most engaged-with articles
+FEED_SEEDS = 50
+# Events younger than this are left for the next run, in case inserts with earlier timestamps are still in flight
+ENGAGEMENT_LAG = timedelta(seconds=30)
+RECOMMENDATION_WRITE_BATCH_SIZE = 1000
+# Ids per $in when loading a slice of interactions or neighbour lists
+RECOMMENDATION_READ_BATCH_SIZE = 1000
+
+ACTION_WEIGHTS = {
+    "view": 1.0,
+    "like": 3.0,
+    "comment": 4.0,
+    "share": 5.0,
+    "tip": 6.0,
+    "purchase": 8.0,
+}
+
+STATE_ID = "recommendations"
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for every pair, without a Python loop"""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def item_neighbours(users: np.ndarray, articles: np.ndarray, weights: np.ndarray, n_users: int, n_articles: int,
+                    dirty: np.ndarray, top_n: Optional[int], max_user_articles: int,
+                    norms: Optional[np.ndarray] = None) -> Tuple[Dict[int, Tuple[np.ndarray, np.ndarray]], np.ndarray]:
+    """Cosine neighbours of every `dirty` article, best first, and the norm of every article.
+
+    The interaction matrix (users x articles, log-damped weights) is held
+    twice, sorted by user (CSR) and by article (CSC). An article's dot
+    products with every other article come from gathering the rows of its
+    users and one weighted bincount, so the rows of the users who engaged
+    with the dirty articles are all that is needed. The other articles'
+    norms take their whole columns: when only such a slice of rows is
+    given, `norms` supplies them (NaN where the slice is complete).
+    `top_n=None` keeps every non-zero neighbour.
+    """
+    weights = np.log1p(weights).astype(np.float64)
+
+    degree = np.bincount(users, minlength=n_users)
+    kept = degree[users] <= max_user_articles
+    users, articles, weights = users[kept], articles[kept], weights[kept]
+
+    by_user = np.argsort(users, kind="stable")
+    row_articles, row_weights = articles[by_user], weights[by_user]
+    row_ptr = np.concatenate([[0], np.cumsum(np.bincount(users, minlength=n_users))])
+
+    by_article = np.argsort(articles, kind="stable")
+    col_users, col_weights = users[by_article], weights[by_article]
+    col_ptr = np.concatenate([[0], np.cumsum(np.bincount(articles, minlength=n_articles))])
+
+    computed = np.sqrt(np.bincount(articles, weights=weights ** 2, minlength=n_articles))
+    if norms is not None:
+        computed = np.where(np.isnan(norms), computed, norms)
+    norms = computed
+
+    def similarities(article: int) -> np.ndarray:
+        start, end = col_ptr[article], col_ptr[article + 1]
+        if start == end:
+            return np.zeros(n_articles)
+        article_users = col_users[start:end]
+        positions = _ranges(row_ptr[article_users], row_ptr[article_users + 1])
+        products = np.repeat(col_weights[start:end], row_ptr[article_users + 1] - row_ptr[article_users]) * row_weights[positions]
+        dots = np.bincount(row_articles[positions], weights=products, minlength=n_articles)
+        scores = dots / np.maximum(norms * norms[article], 1e-12)
+        scores[article] = 0
+        return scores
+
+    def top(scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        k = int((scores > 0).sum())
+        if top_n is not None:
+            k = min(top_n, k)
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return best, scores[best]
+
+    return {article: top(similarities(article)) for article in dirty.tolist()}, norms
+
+
+def merge_neighbours(stored: List[dict], dirty: Set[str], scores: Dict[str, float], top_n: int) -> List[dict]:
+    """An unchanged article's neighbour list with its scores against the dirty articles replaced.
+
+    Only pairs involving a dirty article change, so the rest of the list
+    stands. An article that fell out of the top N earlier cannot come back
+    when a dirty one drops out; the next full run restores it.
+    """
+    neighbours = [neighbour for neighbour in stored if neighbour["article_id"] not in dirty]
+    neighbours += [{"article_id": article_id, "score": score} for article_id, score in scores.items()]
+    return sorted(neighbours, key=lambda neighbour: neighbour["score"], reverse=True)[:top_n]
+
+
+class RecommendationEngine:
+    """Item-item collaborative filtering over article engagement.
+
+    Each run folds engagement events newer than the stored watermark into
+    per-(user, article) interaction weights, then recomputes neighbour lists
+    for the articles whose interactions changed from the interactions of
+    the users who engaged with them, and patches the stored lists of the
+    articles they co-occur with. The similarity math runs in a process pool
+    so it never holds the API's event loop or GIL. The feed ranks candidates from the
+    stored neighbour lists of a user's most engaged-with articles.
+    """
+
+    def __init__(self, database=None, top_n: int = RECOMMENDATION_NEIGHBOURS,
+                 max_user_articles: int = RECOMMENDATION_MAX_USER_ARTICLES):
+        self.db = database if database is not None else db
+        self.top_n = top_n
+        self.max_user_articles = max_user_articles
+        self.lease = MongoLease(self.db.stats_leases, ttl=timedelta(hours=1))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def ensure_indexes(self):
+        await self.db.article_interactions.create_index([("user", 1), ("article", 1)], unique=True)
+        await self.db.article_interactions.create_index([("user", 1), ("weight", -1)])
+        await self.db.article_interactions.create_index([("article", 1), ("user", 1)])
+        await self.db.article_neighbours.create_index("article_id", unique=True)
+        await self.db.user_engagement.create_index("created_at")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=RECOMMENDATION_PROCESSES)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # Folding new events
+
+    async def _fold(self, since: Optional[datetime], until: datetime) -> Set[str]:
+        """$inc interaction weights with the events in [since, until); returns the articles touched"""
+        match = {
+            "target_type": "article",
+            "action_type": {"$in": list(ACTION_WEIGHTS)},
+            "created_at": {"$lt": until},
+        }
+        if since is not None:
+            match["created_at"]["$gte"] = since
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"user": "$user_wallet", "article": "$target_id", "action": "$action_type"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        weights: Dict[Tuple[str, str], float] = {}
+        async for row in self.db.user_engagement.aggregate(pipeline, allowDiskUse=True):
+            key = (row["_id"]["user"], row["_id"]["article"])
+            weights[key] = weights.get(key, 0) + ACTION_WEIGHTS[row["_id"]["action"]] * row["count"]
+
+        operations = [
+            UpdateOne({"user": user, "article": article}, {"$inc": {"weight": weight}}, upsert=True)
+            for (user, article), weight in weights.items()
+        ]
+        for start in range(0, len(operations), RECOMMENDATION_WRITE_BATCH_SIZE):
+            await self.db.article_interactions.bulk_write(operations[start:start + RECOMMENDATION_WRITE_BATCH_SIZE], ordered=False)
+        return {article for _, article in weights}
+
+    async def _load(self, engaged: Optional[List[str]] = None) -> Tuple[Codes, Codes, np.ndarray, np.ndarray, np.ndarray]:
+        """Every interaction, or only those of the `engaged` users"""
+        if engaged is None:
+            queries = [{}]
+        else:
+            queries = [
+                {"user": {"$in": engaged[start:start + RECOMMENDATION_READ_BATCH_SIZE]}}
+                for start in range(0, len(engaged), RECOMMENDATION_READ_BATCH_SIZE)
+            ]
+
+        users, articles = Codes(), Codes()
+        user_codes, article_codes, weights = [], [], []
+        for query in queries:
+            async for row in self.db.article_interactions.find(query, {"_id": 0, "user": 1, "article": 1, "weight": 1}):
+                user_codes.append(row["user"])
+                article_codes.append(row["article"])
+                weights.append(row["weight"])
+        return (
+            users, articles, users.encode(user_codes), articles.encode(article_codes),
+            np.array(weights, dtype=np.float64)
+        )
+
+    async def _stored(self, articles: Codes, dirty: Set[str]) -> Tuple[np.ndarray, Dict[str, List[dict]]]:
+        """Stored norms (NaN for the dirty articles) and neighbour lists of the other articles in a slice"""
+        norms = np.full(len(articles), np.nan)
+        neighbours: Dict[str, List[dict]] = {}
+        others = [article for article in articles.values if article not in dirty]
+        for start in range(0, len(others), RECOMMENDATION_READ_BATCH_SIZE):
+            query = {"article_id": {"$in": others[start:start + RECOMMENDATION_READ_BATCH_SIZE]}}
+            async for doc in self.db.article_neighbours.find(query, {"_id": 0, "article_id": 1, "neighbours": 1, "norm": 1}):
+                neighbours[doc["article_id"]] = doc.get("neighbours", [])
+                if doc.get("norm") is not None:
+                    norms[articles.index[doc["article_id"]]] = doc["norm"]
+
+        # Lists written before norms were stored; heavy users are not left out of these until the next full run
+        missing = [article for article in others if np.isnan(norms[articles.index[article]])]
+        for start in range(0, len(missing), RECOMMENDATION_READ_BATCH_SIZE):
+            pipeline = [
+                {"$match": {"article": {"$in": missing[start:start + RECOMMENDATION_READ_BATCH_SIZE]}}},
+                {"$group": {"_id": "$article", "sum": {"$sum": {"$pow": [{"$ln": {"$add": ["$weight", 1]}}, 2]}}}}
+            ]
+            async for row in self.db.article_interactions.aggregate(pipeline):
+                norms[articles.index[row["_id"]]] = float(np.sqrt(row["sum"]))
+        return norms, neighbours
+
+    # Runs
+
+    async def run(self, full: bool = False, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        until = now - ENGAGEMENT_LAG
+        state = await self.db.recommendation_state.find_one({"_id": STATE_ID}) or {}
+        if full:
+            await self.db.article_interactions.delete_many({})
+        since = None if full else state.get("watermark")
+
+        touched = await self._fold(since, until)
+        # Interactions are folded, so the watermark moves now; touched articles
+        # stay pending until their neighbour lists are written
+        touched |= set(state.get("pending", [])) if not full else set()
+        await self.db.recommendation_state.update_one(
+            {"_id": STATE_ID},
+            {"$set": {"watermark": until, "pending": [] if full else sorted(touched), "updated_at": now}},
+            upsert=True
+        )
+        if not touched and not full:
+            return
+
+        if full:
+            users, articles, user_codes, article_codes, weights = await self._load()
+            dirty = np.arange(len(articles))
+            known_norms, stored = None, {}
+        else:
+            # Only pairs involving a touched article changed, and only the users
+            # who engaged with one contribute to those pairs
+            engaged = await self.db.article_interactions.distinct("user", {"article": {"$in": sorted(touched)}})
+            users, articles, user_codes, article_codes, weights = await self._load(engaged)
+            dirty = np.array([articles.index[article] for article in touched if article in articles.index], dtype=np.int64)
+            known_norms, stored = await self._stored(articles, touched)
+
+        loop = asyncio.get_running_loop()
+        neighbours, norms = await loop.run_in_executor(
+            self._executor(), item_neighbours,
+            user_codes, article_codes, weights, len(users), len(articles), dirty,
+            self.top_n if full else None, self.max_user_articles, known_norms
+        )
+
+        lists: Dict[str, List[dict]] = {}
+        changed: Dict[str, Dict[str, float]] = {}
+        for article, (others, scores) in neighbours.items():
+            article_id = articles.values[article]
+            lists[article_id] = []
+            for other, score in zip(others.tolist(), scores.tolist()):
+                other_id = articles.values[other]
+                if len(lists[article_id]) < self.top_n:
+                    lists[article_id].append({"article_id": other_id, "score": float(score)})
+                if not full and other_id not in touched:
+                    changed.setdefault(other_id, {})[article_id] = float(score)
+
+        operations = [
+            UpdateOne(
+                {"article_id": article_id},
+                {"$set": {"neighbours": entries, "norm": float(norms[articles.index[article_id]]), "computed_at": now}},
+                upsert=True
+            )
+            for article_id, entries in lists.items()
+        ]
+        # Co-occurring articles: a stored list holding a touched article, or one it now scores against
+        operations += [
+            UpdateOne(
+                {"article_id": article_id},
+                {"$set": {
+                    "neighbours": merge_neighbours(stored.get(article_id, []), touched, changed.get(article_id, {}), self.top_n),
+                    "computed_at": now,
+                }}
+            )
+            for article_id in set(changed) | {
+                article_id for article_id, entries in stored.items()
+                if any(entry["article_id"] in touched for entry in entries)
+            }
+        ]
+        for start in range(0, len(operations), RECOMMENDATION_WRITE_BATCH_SIZE):
+            await self.db.article_neighbours.bulk_write(operations[start:start + RECOMMENDATION_WRITE_BATCH_SIZE], ordered=False)
+
+        await self.db.recommendation_state.update_one({"_id": STATE_ID}, {"$set": {"pending": []}})
+
+        logger.info(
+            f"Recommendation engine folded {len(touched)} changed articles from {len(users)} users' interactions and "
+            f"refreshed {len(operations)} neighbour lists"
+        )
+
+    async def run_if_leader(self):
+        """Scheduled entry point: only one worker runs the job at a time"""
+        if not await self.lease.acquire("recommendation_engine"):
+            return
+        try:
+            await self.run()
+        finally:
+            await self.lease.release("recommendation_engine")
+
+    # Reads
+
+    async def for_you(self, wallet: str, limit: int = 20) -> List[ArticleResponse]:
+        """Articles similar to what the user engaged with most, excluding any they engaged with; trending if there is no history"""
+        seeds = await self.db.article_interactions.find(
+            {"user": wallet}, {"_id": 0, "article": 1, "weight": 1}
+        ).sort("weight", -1).limit(FEED_SEEDS).to_list(None)
+
+        scores: Dict[str, float] = {}
+        if seeds:
+            seed_weights = {seed["article"]: float(np.log1p(seed["weight"])) for seed in seeds}
+            async for doc in self.db.article_neighbours.find({"article_id": {"$in": list(seed_weights)}}):
+                weight = seed_weights[doc["article_id"]]
+                for neighbour in doc.get("neighbours", []):
+                    scores[neighbour["article_id"]] = scores.get(neighbour["article_id"], 0) + weight * neighbour["score"]
+        # Cold start, or too little overlap: trending articles fill the rest
+        trending = [entry["article_id"] for entry in trending_service.top(limit * 2)]
+
+        # Every article the user has interacted with, not only the seeds; covered by the (user, article) index
+        candidates = list(set(scores) | set(trending))
+        seen = set(await self.db.article_interactions.distinct("article", {"user": wallet, "article": {"$in": candidates}}))
+
+        ranked = sorted((article for article in scores if article not in seen), key=scores.get, reverse=True)[:limit]
+        for article_id in trending:
+            if len(ranked) >= limit:
+                break
+            if article_id not in seen and article_id not in scores:
+                ranked.append(article_id)
+
+        return await article_search_service.hydrate(ranked, {"status": "published"})
+
+
+# Global instance
+recommendation_engine = RecommendationEngine()
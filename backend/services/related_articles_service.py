@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from models.article import ArticleResponse
+from services.article_search_service import article_search_service
+from services.similarity_index import SimilarityIndex, featurize, read_current
+from services.single_flight import MongoLease
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_INDEX_DIR = Path(os.environ.get("SIMILARITY_INDEX_DIR", Path(__file__).parent.parent / "data" / "similarity"))
+# Full rebuild once this share of documents was appended with stale document frequencies
+SIMILARITY_REBUILD_DRIFT = float(os.environ.get("SIMILARITY_REBUILD_DRIFT", "0.2"))
+SIMILARITY_BATCH_SIZE = 1000
+
+DOCUMENT_FIELDS = {"id": 1, "title": 1, "tags": 1, "content": 1, "created_at": 1}
+
+
+def _featurize_all(docs: List[dict]) -> List[Tuple[str, object, object]]:
+    return [
+        (doc["id"], *featurize(doc.get("title", ""), doc.get("tags") or [], doc.get("content", "")))
+        for doc in docs
+    ]
+
+
+class RelatedArticlesService:
+    """Related articles and free-text similarity from a shared TF-IDF index.
+
+    One worker at a time (under a lease) appends articles created since the
+    index's watermark, or rebuilds it from scratch when appended rows have
+    drifted too far from current document frequencies, and saves a new
+    version to disk. Every worker memory-maps the current version read-only,
+    so the OS page cache holds one copy of the matrix per host.
+    """
+
+    def __init__(self, database=None, directory: Path = SIMILARITY_INDEX_DIR):
+        self.db = database if database is not None else db
+        self.directory = Path(directory)
+        self.index = SimilarityIndex.empty()
+        self.version: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Rebuilds tokenize every article, which can outlast the stats lease
+        self.lease = MongoLease(self.db.stats_leases, ttl=timedelta(minutes=30))
+
+    async def ensure_indexes(self):
+        await self.db.articles.create_index([("status", 1), ("created_at", 1)])
+
+    # Building
+
+    async def _documents(self, query: dict) -> List[Tuple[str, object, object]]:
+        documents = []
+        batch = []
+        async for doc in self.db.articles.find(query, DOCUMENT_FIELDS).sort("created_at", 1):
+            batch.append(doc)
+            if len(batch) == SIMILARITY_BATCH_SIZE:
+                documents.extend(await asyncio.to_thread(_featurize_all, batch))
+                batch = []
+        if batch:
+            documents.extend(await asyncio.to_thread(_featurize_all, batch))
+        return documents
+
+    async def _watermark(self) -> Optional[datetime]:
+        latest = await self.db.articles.find_one({"status": "published"}, {"created_at": 1}, sort=[("created_at", -1)])
+        return latest["created_at"] if latest else None
+
+    async def update(self, full: bool = False) -> str:
+        """Append new articles to the current index, or rebuild it; returns the saved version"""
+        self.reload()
+        index = self.index
+        drifted = index.n_docs > index.built_docs * (1 + SIMILARITY_REBUILD_DRIFT)
+
+        if full or self.version is None or drifted:
+            watermark = await self._watermark()
+            documents = await self._documents({"status": "published"})
+            index = await asyncio.to_thread(SimilarityIndex.build, documents)
+        else:
+            since = datetime.fromisoformat(index.meta["watermark"]) if index.meta.get("watermark") else None
+            query = {"status": "published"}
+            if since is not None:
+                # Inclusive: ties at the watermark are skipped by id
+                query["created_at"] = {"$gte": since}
+            watermark = await self._watermark()
+            documents = await self._documents(query)
+            if not [document for document in documents if document[0] not in index.positions]:
+                return self.version
+            index = await asyncio.to_thread(index.appended, documents)
+
+        if watermark is not None:
+            index.meta["watermark"] = watermark.isoformat()
+        return await asyncio.to_thread(index.save, self.directory)
+
+    async def refresh(self):
+        """Scheduled entry point: one worker updates the index, every worker reloads it"""
+        if await self.lease.acquire("similarity_index"):
+            try:
+                await self.update()
+            finally:
+                await self.lease.release("similarity_index")
+        self.reload()
+
+    def refresh_in_background(self):
+        """Start a refresh unless one is already running"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+
+        async def run():
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh similarity index: {e}")
+
+        self._refresh_task = asyncio.create_task(run())
+
+    def reload(self):
+        """Map the current saved version if it changed"""
+        version = read_current(self.directory)
+        if version is None or version == self.version:
+            return
+        try:
+            self.index = SimilarityIndex.open(self.directory, version)
+            self.version = version
+        except FileNotFoundError:
+            # Replaced by a newer version between reading CURRENT and opening it
+            logger.info(f"Similarity index {version} disappeared before it was opened")
+
+    # Reads
+
+    async def related_ids(self, article_id: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+        """Most similar article ids, or None if the article does not exist"""
+        index = self.index
+        if article_id in index.positions:
+            return await asyncio.to_thread(index.related, article_id, limit)
+
+        # Not indexed yet: score it against the index from its own text
+        doc = await self.db.articles.find_one({"id": article_id}, DOCUMENT_FIELDS)
+        if doc is None:
+            return None
+        _, features, counts = _featurize_all([doc])[0]
+        if not len(features):
+            return []
+        ranked = await asyncio.to_thread(index.top, index.vector(features, counts), limit + 1)
+        return [(other, score) for other, score in ranked if other != article_id][:limit]
+
+    async def related(self, article_id: str, limit: int = 5) -> Optional[List[ArticleResponse]]:
+        ranked = await self.related_ids(article_id, limit)
+        if ranked is None:
+            return None
+        return await article_search_service.hydrate([other for other, _ in ranked])
+
+    async def similar(self, text: str, limit: int = 10) -> List[ArticleResponse]:
+        ranked = await asyncio.to_thread(self.index.similar, text, limit)
+        return await article_search_service.hydrate([article_id for article_id, _ in ranked])
+
+
+# Global instance
+related_articles_service = RelatedArticlesService()
@@ -0,0 +1,181 @@
+from decimal import Decimal
+from typing import Dict, Tuple
+
+from bson.decimal128 import Decimal128
+
+from models.monetization import RevenueStats
+from database import db
+
+
+def _as_decimal(field: str) -> dict:
+    """Money fields may be stored as strings, doubles or Decimal128; sums stay in Decimal128"""
+    return {"$convert": {"input": field, "to": "decimal", "onError": Decimal128("0"), "onNull": Decimal128("0")}}
+
+
+def _decimal(value) -> Decimal:
+    return value.to_decimal() if isinstance(value, Decimal128) else Decimal(str(value or 0))
+
+
+class RevenueService:
+    """Computes a wallet's revenue with a single aggregation, summed exactly in Decimal128.
+
+    Revenue reads are served from the ledger. This recount, straight from
+    the tips, purchases, subscriptions and NFT sales collections, follows
+    the ledger's definitions and is what `manage.py verify-ledger` checks
+    the ledger against.
+    """
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+
+    async def ensure_indexes(self):
+        await self.db.articles.create_index("author_wallet")
+        await self.db.purchases.create_index("article_id")
+        await self.db.purchases.create_index("buyer_wallet")
+        await self.db.tips.create_index("to_wallet")
+        await self.db.subscriptions.create_index([("author_wallet", 1), ("is_active", 1)])
+        await self.db.nft_sales.create_index("seller_wallet")
+        await self.db.nft_sales.create_index("nft_id")
+        await self.db.nfts.create_index("creator_wallet")
+
+    def pipeline(self, wallet: str) -> list:
+        """articles -> $lookup purchases -> $group, plus tip, subscription, NFT sale and purchases-made subqueries"""
+        return [
+            {"$match": {"author_wallet": wallet}},
+            {
+                "$facet": {
+                    # $facet always emits one document, so wallets without articles still get a row
+                    "paid_content": [
+                        {
+                            "$lookup": {
+                                "from": "purchases",
+                                "let": {"article_id": "$id"},
+                                "pipeline": [
+                                    {"$match": {"$expr": {"$eq": ["$article_id", "$$article_id"]}}},
+                                    {"$group": {"_id": None, "revenue": {"$sum": _as_decimal("$amount")}}}
+                                ],
+                                "as": "purchases"
+                            }
+                        },
+                        {"$unwind": "$purchases"},
+                        {"$group": {"_id": None, "revenue": {"$sum": "$purchases.revenue"}}}
+                    ]
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "tips",
+                    "pipeline": [
+                        {"$match": {"to_wallet": wallet}},
+                        {"$group": {"_id": None, "count": {"$sum": 1}, "amount": {"$sum": _as_decimal("$amount")}}}
+                    ],
+                    "as": "tips"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "subscriptions",
+                    "pipeline": [
+                        # Every subscription paid its first period when created; cancelling refunds nothing
+                        {"$match": {"author_wallet": wallet}},
+                        {
+                            "$group": {
+                                "_id": None,
+                                "count": {"$sum": {"$cond": ["$is_active", 1, 0]}},
+                                "revenue": {"$sum": _as_decimal("$amount")}
+                            }
+                        }
+                    ],
+                    "as": "subscriptions"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "nft_sales",
+                    "pipeline": [
+                        # Sellers are paid the price less the royalty, which only applies when the NFT has a creator
+                        {"$match": {"seller_wallet": wallet}},
+                        {"$lookup": {"from": "nfts", "localField": "nft_id", "foreignField": "id", "as": "nft"}},
+                        {
+                            "$group": {
+                                "_id": None,
+                                "revenue": {"$sum": {"$subtract": [
+                                    _as_decimal("$price"),
+                                    {"$cond": [
+                                        {"$ifNull": [{"$arrayElemAt": ["$nft.creator_wallet", 0]}, False]},
+                                        _as_decimal("$royalty_amount"),
+                                        Decimal128("0")
+                                    ]}
+                                ]}}
+                            }
+                        }
+                    ],
+                    "as": "nft_sales"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "nfts",
+                    "pipeline": [
+                        {"$match": {"creator_wallet": wallet}},
+                        {"$lookup": {"from": "nft_sales", "localField": "id", "foreignField": "nft_id", "as": "sales"}},
+                        {"$unwind": "$sales"},
+                        {"$group": {"_id": None, "revenue": {"$sum": _as_decimal("$sales.royalty_amount")}}}
+                    ],
+                    "as": "royalties"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "purchases",
+                    "pipeline": [
+                        {"$match": {"buyer_wallet": wallet}},
+                        {"$count": "count"}
+                    ],
+                    "as": "purchases_made"
+                }
+            },
+            {
+                "$project": {
+                    "paid_content": {"$ifNull": [{"$arrayElemAt": ["$paid_content", 0]}, {}]},
+                    "tips": {"$ifNull": [{"$arrayElemAt": ["$tips", 0]}, {}]},
+                    "subscriptions": {"$ifNull": [{"$arrayElemAt": ["$subscriptions", 0]}, {}]},
+                    "nft_sales": {"$ifNull": [{"$arrayElemAt": ["$nft_sales", 0]}, {}]},
+                    "royalties": {"$ifNull": [{"$arrayElemAt": ["$royalties", 0]}, {}]},
+                    "purchases_made": {"$ifNull": [{"$arrayElemAt": ["$purchases_made", 0]}, {}]}
+                }
+            }
+        ]
+
+    async def calculate(self, wallet: str) -> RevenueStats:
+        results = await self.db.articles.aggregate(self.pipeline(wallet)).to_list(1)
+        result = results[0] if results else {}
+
+        paid_content = result.get("paid_content", {})
+        tips = result.get("tips", {})
+        subscriptions = result.get("subscriptions", {})
+
+        total_tips = _decimal(tips.get("amount"))
+        total_paid_content = _decimal(paid_content.get("revenue"))
+        total_subscription = _decimal(subscriptions.get("revenue"))
+        total_nft_sales = _decimal(result.get("nft_sales", {}).get("revenue")) + _decimal(result.get("royalties", {}).get("revenue"))
+
+        return RevenueStats(
+            total_tips_received=total_tips,
+            total_paid_content_revenue=total_paid_content,
+            total_subscription_revenue=total_subscription,
+            total_nft_sales_revenue=total_nft_sales,
+            total_revenue=total_tips + total_paid_content + total_subscription + total_nft_sales,
+            tips_count=tips.get("count", 0),
+            purchases_count=result.get("purchases_made", {}).get("count", 0),
+            active_subscribers=subscriptions.get("count", 0)
+        )
+
+    async def verify(self, wallet: str, ledger: RevenueStats) -> Dict[str, Tuple]:
+        """Fields where the ledger's totals differ from a recount: {field: (ledger, recount)}"""
+        recount = (await self.calculate(wallet)).dict()
+        return {field: (value, recount[field]) for field, value in ledger.dict().items() if value != recount[field]}
+
+
+# Global instance
+revenue_service = RevenueService()
@@ -0,0 +1,342 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from models.analytics import PageView, UserEngagement, SearchQuery
+from services.article_authors import article_authors
+from services.article_stats_service import tip_amount
+from database import db
+
+logger = logging.getLogger(__name__)
+
+MINUTE = "minute"
+HOUR = "hour"
+DAY = "day"
+
+BUCKET_SIZES = {
+    MINUTE: timedelta(minutes=1),
+    HOUR: timedelta(hours=1),
+    DAY: timedelta(days=1),
+}
+
+# Finer buckets only need to outlive compaction into the next granularity
+RETENTION = {
+    MINUTE: timedelta(days=2),
+    HOUR: timedelta(days=90),
+    DAY: None,
+}
+
+# Granularity each level is compacted from
+COMPACTS_FROM = {HOUR: MINUTE, DAY: HOUR}
+
+# Late events get this long to land before a finer bucket is compacted
+COMPACTION_GRACE = timedelta(minutes=5)
+
+# Rollup entities
+ARTICLE = "article"
+AUTHOR = "author"
+PLATFORM = "platform"
+
+PLATFORM_KEY = "platform"
+
+COUNTERS = [
+    "views",
+    "engagements",
+    "likes",
+    "comments",
+    "shares",
+    "tips",
+    "tip_amount",
+    "searches",
+    "articles",
+    "users",
+]
+
+ENGAGEMENT_COUNTERS = {"like": "likes", "comment": "comments", "share": "shares", "tip": "tips"}
+
+_EPOCH = datetime(1970, 1, 1)
+
+Increment = Tuple[str, str, Dict[str, float]]
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing `timestamp`"""
+    size = BUCKET_SIZES[granularity]
+    return _EPOCH + ((timestamp - _EPOCH) // size) * size
+
+
+def choose_granularity(start: datetime, end: datetime) -> str:
+    """Finest granularity that keeps a window query to a few hundred buckets per key"""
+    span = end - start
+    if span <= timedelta(hours=3):
+        return MINUTE
+    if span <= timedelta(days=7):
+        return HOUR
+    return DAY
+
+
+def _truncate(field: str, granularity: str) -> dict:
+    """Aggregation expression flooring a date field to the granularity (UTC)"""
+    size_ms = int(BUCKET_SIZES[granularity].total_seconds() * 1000)
+    return {"$subtract": [field, {"$mod": [{"$toLong": field}, size_ms]}]}
+
+
+class RollupService:
+    """Pre-aggregated event counters in time buckets (rollups collection).
+
+    Ingest upserts minute buckets with $inc. A scheduled compaction folds
+    closed minutes into hour buckets and closed hours into day buckets,
+    tracking how far each level is complete in rollup_state. Window queries
+    read coarse buckets up to that watermark and finer ones after it.
+    """
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+        self._watermarks: Optional[Dict[str, datetime]] = None
+
+    async def ensure_indexes(self):
+        await self.db.rollups.create_index(
+            [("granularity", 1), ("entity", 1), ("key", 1), ("bucket", 1)], unique=True
+        )
+        await self.db.rollups.create_index([("granularity", 1), ("entity", 1), ("bucket", 1)])
+        await self.db.rollups.create_index("expires_at", expireAfterSeconds=0)
+
+    # Ingest
+
+    async def record(self, timestamp: datetime, increments: List[Increment]):
+        """Apply counter increments to the minute buckets containing `timestamp`"""
+        if not increments:
+            return
+
+        bucket = bucket_start(timestamp, MINUTE)
+        operations = [
+            UpdateOne(
+                {"granularity": MINUTE, "entity": entity, "key": key, "bucket": bucket},
+                {
+                    "$inc": {f"counters.{name}": value for name, value in counters.items()},
+                    "$setOnInsert": {"expires_at": bucket + RETENTION[MINUTE]}
+                },
+                upsert=True
+            )
+            for entity, key, counters in increments
+        ]
+        await self.db.rollups.bulk_write(operations, ordered=False)
+
+    async def record_pageview(self, pageview: PageView):
+        counters = {"views": 1}
+        increments = [(ARTICLE, pageview.article_id, counters), (PLATFORM, PLATFORM_KEY, counters)]
+
+        author_wallet = await article_authors.get(pageview.article_id)
+        if author_wallet:
+            increments.append((AUTHOR, author_wallet, counters))
+
+        await self.record(pageview.created_at, increments)
+
+    async def record_engagement(self, engagement: UserEngagement):
+        counters = {"engagements": 1}
+        counter = ENGAGEMENT_COUNTERS.get(engagement.action_type)
+        if counter:
+            counters[counter] = 1
+        if engagement.action_type == "tip":
+            counters["tip_amount"] = tip_amount(engagement)
+
+        increments = [(PLATFORM, PLATFORM_KEY, counters)]
+        if engagement.target_type == "article":
+            increments.append((ARTICLE, engagement.target_id, counters))
+            author_wallet = await article_authors.get(engagement.target_id)
+            if author_wallet:
+                increments.append((AUTHOR, author_wallet, counters))
+
+        await self.record(engagement.created_at, increments)
+
+    async def record_search(self, search_query: SearchQuery):
+        # Per-query counts live in search_trends_service
+        await self.record(search_query.created_at, [(PLATFORM, PLATFORM_KEY, {"searches": 1})])
+
+    async def record_article_created(self, article_id: str, author_wallet: str, created_at: datetime):
+        article_authors.put(article_id, author_wallet)
+        await self.record(created_at, [
+            (PLATFORM, PLATFORM_KEY, {"articles": 1}),
+            (AUTHOR, author_wallet, {"articles": 1}),
+        ])
+
+    async def record_user_created(self, created_at: datetime):
+        await self.record(created_at, [(PLATFORM, PLATFORM_KEY, {"users": 1})])
+
+    # Compaction
+
+    async def watermarks(self) -> Dict[str, datetime]:
+        """How far hour and day buckets are complete; finer buckets cover everything after"""
+        if self._watermarks is None:
+            await self._load_watermarks()
+        return self._watermarks
+
+    async def _load_watermarks(self):
+        watermarks = {}
+        async for state in self.db.rollup_state.find({"_id": {"$in": list(COMPACTS_FROM)}}):
+            watermarks[state["_id"]] = state["compacted_until"]
+        self._watermarks = {
+            granularity: watermarks.get(granularity, datetime.min) for granularity in COMPACTS_FROM
+        }
+
+    async def compact(self):
+        """Fold closed minute buckets into hours, then closed hours into days"""
+        await self._load_watermarks()
+
+        for granularity in (HOUR, DAY):
+            source = COMPACTS_FROM[granularity]
+            source_complete = (
+                datetime.utcnow() - COMPACTION_GRACE if source == MINUTE else self._watermarks[source]
+            )
+            until = bucket_start(source_complete, granularity)
+            since = self._watermarks[granularity]
+
+            if since == datetime.min:
+                # First run: start from the oldest source bucket still around
+                oldest = await self.db.rollups.find_one({"granularity": source}, sort=[("bucket", 1)])
+                if not oldest:
+                    continue
+                since = bucket_start(oldest["bucket"], granularity)
+
+            if since >= until:
+                continue
+
+            await self._compact_range(source, granularity, since, until)
+
+            await self.db.rollup_state.update_one(
+                {"_id": granularity},
+                {"$set": {"compacted_until": until, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            self._watermarks[granularity] = until
+
+    async def _compact_range(self, source: str, granularity: str, since: datetime, until: datetime):
+        retention = RETENTION[granularity]
+        projection = {
+            "_id": 0,
+            "granularity": granularity,
+            "entity": "$_id.entity",
+            "key": "$_id.key",
+            "bucket": "$_id.bucket",
+            "counters": {name: f"${name}" for name in COUNTERS},
+        }
+        if retention:
+            projection["expires_at"] = {"$add": ["$_id.bucket", int(retention.total_seconds() * 1000)]}
+
+        pipeline = [
+            {"$match": {"granularity": source, "bucket": {"$gte": since, "$lt": until}}},
+            {
+                "$group": {
+                    "_id": {"entity": "$entity", "key": "$key", "bucket": _truncate("$bucket", granularity)},
+                    **{name: {"$sum": f"$counters.{name}"} for name in COUNTERS}
+                }
+            },
+            {"$project": projection},
+            {
+                "$merge": {
+                    "into": "rollups",
+                    "on": ["granularity", "entity", "key", "bucket"],
+                    "whenMatched": "merge",
+                    "whenNotMatched": "insert"
+                }
+            }
+        ]
+        await self.db.rollups.aggregate(pipeline, allowDiskUse=True).to_list(None)
+
+    # Queries
+
+    async def _window_match(self, entity: str, start: datetime, end: datetime, granularity: str) -> dict:
+        """Match covering [start, end) with coarse buckets up to the watermarks and finer ones after"""
+        watermarks = await self.watermarks()
+        start = bucket_start(start, granularity)
+
+        if granularity == MINUTE:
+            plan = [(MINUTE, start, end)]
+        elif granularity == HOUR:
+            hour_mark = max(watermarks[HOUR], start)
+            plan = [(HOUR, start, min(hour_mark, end)), (MINUTE, hour_mark, end)]
+        else:
+            day_mark = max(watermarks[DAY], start)
+            hour_mark = max(watermarks[HOUR], day_mark)
+            plan = [
+                (DAY, start, min(day_mark, end)),
+                (HOUR, day_mark, min(hour_mark, end)),
+                (MINUTE, hour_mark, end),
+            ]
+
+        ranges = [
+            {"granularity": level, "bucket": {"$gte": range_start, "$lt": range_end}}
+            for level, range_start, range_end in plan
+            if range_start < range_end
+        ]
+        if not ranges:
+            # Empty window
+            ranges = [{"granularity": granularity, "bucket": {"$gte": end, "$lt": end}}]
+        return {"entity": entity, "$or": ranges}
+
+    async def top(
+        self,
+        entity: str,
+        start: datetime,
+        end: datetime,
+        sort_by: str,
+        limit: int = 10,
+        granularity: Optional[str] = None,
+    ) -> List[dict]:
+        """Counter totals per key over a window, highest `sort_by` first"""
+        granularity = granularity or choose_granularity(start, end)
+        pipeline = [
+            {"$match": await self._window_match(entity, start, end, granularity)},
+            {"$group": {"_id": "$key", **{name: {"$sum": f"$counters.{name}"} for name in COUNTERS}}},
+            {"$sort": {sort_by: -1}},
+            {"$limit": limit},
+        ]
+        return await self.db.rollups.aggregate(pipeline).to_list(limit)
+
+    async def totals(
+        self,
+        entity: str,
+        keys: List[str],
+        start: datetime,
+        end: datetime,
+        granularity: Optional[str] = None,
+    ) -> Dict[str, dict]:
+        """Counter totals over a window for the given keys"""
+        granularity = granularity or choose_granularity(start, end)
+        match = await self._window_match(entity, start, end, granularity)
+        match["key"] = {"$in": keys}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$key", **{name: {"$sum": f"$counters.{name}"} for name in COUNTERS}}},
+        ]
+        return {doc["_id"]: doc for doc in await self.db.rollups.aggregate(pipeline).to_list(None)}
+
+    async def series(
+        self,
+        entity: str,
+        key: str,
+        start: datetime,
+        end: datetime,
+        granularity: Optional[str] = None,
+    ) -> List[dict]:
+        """Counter totals for one key per bucket of `granularity`, oldest first"""
+        granularity = granularity or choose_granularity(start, end)
+        match = await self._window_match(entity, start, end, granularity)
+        match["key"] = key
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": _truncate("$bucket", granularity),
+                    **{name: {"$sum": f"$counters.{name}"} for name in COUNTERS}
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+        return await self.db.rollups.aggregate(pipeline).to_list(None)
+
+
+# Global instance
+rollup_service = RollupService()
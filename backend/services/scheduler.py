@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Runs registered coroutines periodically for the lifetime of the app"""
+
+    def __init__(self):
+        self._jobs: List[Tuple[str, float, Callable[[], Awaitable]]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def every(self, seconds: float, job: Callable[[], Awaitable], name: str = None):
+        """Register a job to run every `seconds` once the scheduler is started"""
+        self._jobs.append((name or job.__name__, seconds, job))
+
+    async def _run(self, name: str, seconds: float, job: Callable[[], Awaitable]):
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled job {name} failed: {e}")
+
+    def start(self):
+        for name, seconds, job in self._jobs:
+            self._tasks.append(asyncio.create_task(self._run(name, seconds, job), name=name))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global instance
+scheduler = Scheduler()
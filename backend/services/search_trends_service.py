@@ -0,0 +1,153 @@
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set
+
+from pymongo import UpdateOne
+
+from models.analytics import SearchQuery
+from services.heavy_hitters import SpaceSaving
+from database import db
+
+SEARCH_TRENDS_CAPACITY = int(os.environ.get("SEARCH_TRENDS_CAPACITY", "1000"))
+SEARCH_TRENDS_DAYS = int(os.environ.get("SEARCH_TRENDS_DAYS", "30"))
+
+WINDOW_MAX_AGE = 1.0  # seconds
+
+
+def normalize_search(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SearchTrendsService:
+    """Most frequent search queries per day, kept as Space-Saving summaries.
+
+    Each day is a window with its own summary of at most `capacity` queries;
+    windows older than `days` are dropped. Popular queries and suggestions
+    for the last N days merge N daily summaries and are served from memory.
+    Like trending scores, each worker $incs the counts it observed into
+    search_trends and reloads the merged top queries, so every worker serves
+    the same ranking.
+    """
+
+    def __init__(self, database=None, capacity: int = SEARCH_TRENDS_CAPACITY, days: int = SEARCH_TRENDS_DAYS):
+        self.db = database if database is not None else db
+        self.capacity = capacity
+        self.days = days
+        self._days: Dict[str, SpaceSaving] = {}
+        self._pending: Dict[str, SpaceSaving] = {}
+        self._loaded: Set[str] = set()
+        self._windows: Dict[int, tuple] = {}
+
+    async def ensure_indexes(self):
+        await self.db.search_trends.create_index([("day", 1), ("query", 1)], unique=True)
+        await self.db.search_trends.create_index([("day", 1), ("count", -1)])
+        await self.db.search_trends.create_index("expires_at", expireAfterSeconds=0)
+
+    def _retained(self, today: date) -> List[str]:
+        return [(today - timedelta(days=offset)).isoformat() for offset in range(self.days)]
+
+    # Ingest
+
+    def record(self, search_query: SearchQuery):
+        query = normalize_search(search_query.query)
+        if not query:
+            return
+
+        day = search_query.created_at.date().isoformat()
+        for summaries in (self._days, self._pending):
+            summary = summaries.get(day)
+            if summary is None:
+                summary = summaries[day] = SpaceSaving(self.capacity)
+            summary.add(query, 1, search_query.results_count)
+
+        self._windows.clear()
+
+    # Reads
+
+    def window(self, days: int) -> SpaceSaving:
+        """Merged summary of the last `days` days, rebuilt at most once a second"""
+        days = max(1, min(days, self.days))
+        cached = self._windows.get(days)
+        if cached and time.monotonic() - cached[0] < WINDOW_MAX_AGE:
+            return cached[1]
+
+        summaries = [self._days[day] for day in self._retained(date.today())[:days] if day in self._days]
+        summary = SpaceSaving.merged(summaries, self.capacity)
+        self._windows[days] = (time.monotonic(), summary)
+        return summary
+
+    def popular(self, days: int = 7, limit: int = 10) -> List[dict]:
+        return [
+            {
+                "_id": query,
+                "count": count,
+                # Results are only summed while the query is monitored
+                "avg_results": total / max(count - error, 1)
+            }
+            for query, count, error, total in self.window(days).top(limit)
+        ]
+
+    # Persistence
+
+    async def persist(self):
+        """Push locally observed counts to Mongo, then reload the merged summaries"""
+        pending, self._pending = self._pending, {}
+
+        operations = []
+        for day, summary in pending.items():
+            expires_at = datetime.combine(date.fromisoformat(day), datetime.min.time()) + timedelta(days=self.days + 1)
+            for query, count, error, total in summary.items():
+                # count - error is exactly what this worker saw while monitoring the query
+                operations.append(UpdateOne(
+                    {"day": day, "query": query},
+                    {"$inc": {"count": count - error, "results": total}, "$setOnInsert": {"expires_at": expires_at}},
+                    upsert=True
+                ))
+
+        if operations:
+            try:
+                await self.db.search_trends.bulk_write(operations, ordered=False)
+            except Exception:
+                for day, summary in pending.items():
+                    for query, count, error, total in summary.items():
+                        self._pending.setdefault(day, SpaceSaving(self.capacity)).add(query, count - error, total)
+                raise
+
+        await self.load()
+
+    async def load(self):
+        """Reload today's and yesterday's summaries, and older retained days not loaded yet"""
+        today = date.today()
+        retained = self._retained(today)
+        days: Dict[str, SpaceSaving] = {day: summary for day, summary in self._days.items() if day in retained}
+
+        for offset, day in enumerate(retained):
+            if offset > 1 and day in self._loaded:
+                continue
+
+            docs = await self.db.search_trends.find({"day": day}).sort("count", -1).limit(self.capacity).to_list(None)
+            summary = SpaceSaving(self.capacity)
+            for doc in docs:
+                summary.add(doc["query"], doc["count"], doc.get("results", 0))
+
+            if offset > 1 and len(docs) == self.capacity:
+                # A finished day only needs its top queries
+                await self.db.search_trends.delete_many({"day": day, "count": {"$lt": docs[-1]["count"]}})
+
+            # Searches recorded while we were reading are not in Mongo yet
+            local = self._pending.get(day)
+            if local:
+                for query, count, error, total in local.items():
+                    summary.add(query, count - error, total)
+
+            days[day] = summary
+            self._loaded.add(day)
+
+        self._days = days
+        self._loaded &= set(retained)
+        self._windows.clear()
+
+
+# Global instance
+search_trends_service = SearchTrendsService()
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from models.analytics import PageView, SessionPage, UserEngagement, UserSession
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SESSION_GAP_MINUTES = float(os.environ.get("SESSION_GAP_MINUTES", "30"))
+SESSION_MAX_OPEN = int(os.environ.get("SESSION_MAX_OPEN", "100000"))
+SESSION_WRITE_BATCH_SIZE = 500
+# Pages kept per session document; pages_visited still counts every view
+SESSION_MAX_PAGES = 200
+
+
+def session_key(session_id: Optional[str], ip_address: Optional[str], user_agent: Optional[str]) -> Optional[str]:
+    """Client session id, or a stable id derived from ip + user agent"""
+    if session_id:
+        return session_id
+    if not ip_address:
+        return None
+    digest = hashlib.blake2b(f"{ip_address}|{user_agent or ''}".encode("utf-8"), digest_size=12).hexdigest()
+    return f"anon:{digest}"
+
+
+def _literal(value):
+    return {"$literal": value}
+
+
+class _OpenSession:
+    __slots__ = ("key", "user_wallet", "ip_address", "user_agent", "started_at", "last_seen",
+                 "pages_visited", "actions_performed", "pages")
+
+    def __init__(self, key: str, at: datetime):
+        self.key = key
+        self.user_wallet: Optional[str] = None
+        self.ip_address: Optional[str] = None
+        self.user_agent: Optional[str] = None
+        self.started_at = at
+        self.last_seen = at
+        self.pages_visited = 0
+        self.actions_performed = 0
+        self.pages: List[SessionPage] = []
+
+
+class SessionService:
+    """Streaming sessionizer writing finished visits to user_sessions.
+
+    Pageviews and engagement are grouped by session id (or ip + user agent)
+    into open sessions kept in a bounded map ordered by last activity. A
+    session closes once it has been idle for the inactivity gap, or early
+    when the map is full. Closed sessions are written in batches as merges
+    keyed by (session_id, overlapping time range), so a visit split across
+    workers or closed early ends up as one document.
+    """
+
+    def __init__(self, database=None, gap_minutes: float = SESSION_GAP_MINUTES, max_open: int = SESSION_MAX_OPEN):
+        self.db = database if database is not None else db
+        self.gap = timedelta(minutes=gap_minutes)
+        self.max_open = max_open
+        self._open: "OrderedDict[str, _OpenSession]" = OrderedDict()
+        self._by_wallet: Dict[str, str] = {}
+        self._finished: List[UserSession] = []
+
+    async def ensure_indexes(self):
+        await self.db.user_sessions.create_index([("session_id", 1), ("ended_at", -1)])
+        await self.db.user_sessions.create_index([("user_wallet", 1), ("started_at", -1)])
+
+    # Ingest
+
+    def _touch(self, key: str, at: datetime) -> _OpenSession:
+        session = self._open.get(key)
+        if session is not None and at - session.last_seen > self.gap:
+            self._close(key)
+            session = None
+
+        if session is None:
+            session = self._open[key] = _OpenSession(key, at)
+            while len(self._open) > self.max_open:
+                self._close(next(iter(self._open)))
+        else:
+            self._open.move_to_end(key)
+            session.last_seen = max(session.last_seen, at)
+
+        return session
+
+    def record_pageview(self, pageview: PageView):
+        key = session_key(pageview.session_id, pageview.ip_address, pageview.user_agent)
+        if key is None:
+            return
+
+        session = self._touch(key, pageview.created_at)
+        session.ip_address = session.ip_address or pageview.ip_address
+        session.user_agent = session.user_agent or pageview.user_agent
+        if pageview.user_wallet:
+            session.user_wallet = pageview.user_wallet
+            self._by_wallet[pageview.user_wallet] = key
+
+        session.pages_visited += 1
+        if len(session.pages) < SESSION_MAX_PAGES:
+            session.pages.append(SessionPage(article_id=pageview.article_id, viewed_at=pageview.created_at))
+
+    def record_engagement(self, engagement: UserEngagement, ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+        key = session_key(engagement.session_id, ip_address, user_agent)
+        if key is None:
+            # Fall back to the wallet's open session, if any
+            key = self._by_wallet.get(engagement.user_wallet)
+            if key is None or key not in self._open:
+                return
+
+        session = self._touch(key, engagement.created_at)
+        session.ip_address = session.ip_address or ip_address
+        session.user_agent = session.user_agent or user_agent
+        session.user_wallet = engagement.user_wallet
+        self._by_wallet[engagement.user_wallet] = key
+        session.actions_performed += 1
+
+    # Closing
+
+    def _close(self, key: str):
+        session = self._open.pop(key)
+        if session.user_wallet and self._by_wallet.get(session.user_wallet) == key:
+            del self._by_wallet[session.user_wallet]
+
+        pages = sorted(session.pages, key=lambda page: page.viewed_at)
+        for page, following in zip(pages, pages[1:]):
+            page.seconds = (following.viewed_at - page.viewed_at).total_seconds()
+
+        self._finished.append(UserSession(
+            session_id=key,
+            user_wallet=session.user_wallet,
+            ip_address=session.ip_address,
+            user_agent=session.user_agent,
+            started_at=session.started_at,
+            ended_at=session.last_seen,
+            duration=int((session.last_seen - session.started_at).total_seconds()),
+            pages_visited=session.pages_visited,
+            actions_performed=session.actions_performed,
+            entry_article_id=pages[0].article_id if pages else None,
+            exit_article_id=pages[-1].article_id if pages else None,
+            pages=pages,
+        ))
+
+    def close_idle(self, now: Optional[datetime] = None):
+        """Close every session idle for longer than the gap"""
+        cutoff = (now or datetime.utcnow()) - self.gap
+        # Ordered by last activity, so idle sessions are at the front
+        while self._open:
+            key, session = next(iter(self._open.items()))
+            if session.last_seen >= cutoff:
+                break
+            self._close(key)
+
+    def close_all(self):
+        for key in list(self._open):
+            self._close(key)
+
+    # Writing
+
+    def _merge(self, session: UserSession) -> UpdateOne:
+        """Upsert that folds this session into a stored one it overlaps with"""
+        doc = session.dict()
+        started_at, ended_at = doc["started_at"], doc["ended_at"]
+        is_new = {"$eq": [{"$type": "$started_at"}, "missing"]}
+        starts_earlier = {"$or": [is_new, {"$lt": [started_at, "$started_at"]}]}
+        ends_later = {"$or": [is_new, {"$gt": [ended_at, "$ended_at"]}]}
+
+        return UpdateOne(
+            {"session_id": session.session_id, "ended_at": {"$gte": started_at - self.gap}},
+            [
+                {"$set": {
+                    "user_wallet": {"$ifNull": ["$user_wallet", _literal(doc["user_wallet"])]},
+                    "ip_address": {"$ifNull": ["$ip_address", _literal(doc["ip_address"])]},
+                    "user_agent": {"$ifNull": ["$user_agent", _literal(doc["user_agent"])]},
+                    "started_at": {"$cond": [starts_earlier, started_at, "$started_at"]},
+                    "ended_at": {"$cond": [ends_later, ended_at, "$ended_at"]},
+                    "entry_article_id": {"$cond": [starts_earlier, _literal(doc["entry_article_id"]), "$entry_article_id"]},
+                    "exit_article_id": {"$cond": [ends_later, _literal(doc["exit_article_id"]), "$exit_article_id"]},
+                    "pages_visited": {"$add": [{"$ifNull": ["$pages_visited", 0]}, doc["pages_visited"]]},
+                    "actions_performed": {"$add": [{"$ifNull": ["$actions_performed", 0]}, doc["actions_performed"]]},
+                    "pages": {"$slice": [
+                        {"$concatArrays": [{"$ifNull": ["$pages", []]}, _literal(doc["pages"])]},
+                        SESSION_MAX_PAGES
+                    ]},
+                }},
+                {"$set": {"duration": {"$toInt": {"$divide": [{"$subtract": ["$ended_at", "$started_at"]}, 1000]}}}},
+            ],
+            upsert=True
+        )
+
+    async def flush(self):
+        """Write closed sessions in batches"""
+        finished, self._finished = self._finished, []
+
+        for start in range(0, len(finished), SESSION_WRITE_BATCH_SIZE):
+            batch = finished[start:start + SESSION_WRITE_BATCH_SIZE]
+            try:
+                await self.db.user_sessions.bulk_write([self._merge(session) for session in batch], ordered=False)
+            except Exception:
+                # Keep the unwritten sessions for the next flush
+                self._finished = finished[start:] + self._finished
+                raise
+
+    async def sweep(self):
+        """Scheduled job: close idle sessions and write them"""
+        self.close_idle()
+        await self.flush()
+
+    async def shutdown(self):
+        self.close_all()
+        await self.flush()
+
+
+# Global instance
+session_service = SessionService()
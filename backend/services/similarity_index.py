@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import shutil
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Hashed feature space; collisions are rare enough at this size for ranking
+N_FEATURES = 1 << 18
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 3
+# Only the start of long bodies is tokenized
+BODY_CHARS = 20_000
+
+TOKEN = re.compile(r"[a-z0-9]{2,}")
+STOPWORDS = frozenset(
+    "an and are as at be but by for from has have in into is it its of on or that the this "
+    "to was were will with you your we our they their not can do does".split()
+)
+
+CURRENT = "CURRENT"
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def feature(token: str) -> int:
+    # crc32 rather than hash(): feature ids must agree across processes
+    return zlib.crc32(token.encode()) & (N_FEATURES - 1)
+
+
+def featurize(title: str = "", tags: Iterable[str] = (), body: str = "") -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed term counts of one document as sorted (features, counts)"""
+    counts: Dict[int, float] = {}
+    for token in tokenize(title):
+        key = feature(token)
+        counts[key] = counts.get(key, 0) + TITLE_WEIGHT
+    for tag in tags:
+        key = feature(f"#{tag.lower()}")
+        counts[key] = counts.get(key, 0) + TAG_WEIGHT
+    for token in tokenize(body[:BODY_CHARS]):
+        key = feature(token)
+        counts[key] = counts.get(key, 0) + 1
+
+    features = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    order = np.argsort(features)
+    return features[order], values[order]
+
+
+class SimilarityIndex:
+    """Row-normalized TF-IDF matrix over hashed features, in CSR arrays.
+
+    Rows are documents: `indptr[i]:indptr[i+1]` slices `indices` (feature
+    ids) and `data` (weights, L2-normalized per row). Cosine similarity
+    against a query vector is one gather-multiply and a segmented sum over
+    all non-zeros, so scoring every document is a handful of NumPy calls.
+
+    Appended rows are weighted with document frequencies current at the
+    time they are added; earlier rows keep their weights until a full
+    rebuild.
+    """
+
+    def __init__(self, ids: List[str], indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 df: np.ndarray, n_docs: int, built_docs: int, meta: Optional[dict] = None):
+        self.ids = ids
+        self.positions = {article_id: position for position, article_id in enumerate(ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        # Document frequency per feature, over every document added so far
+        self.df = df
+        self.n_docs = n_docs
+        # Documents at the last full build, to tell how far weights have drifted
+        self.built_docs = built_docs
+        # Caller-defined JSON state saved alongside the arrays (e.g. a watermark)
+        self.meta = meta or {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Building
+
+    @classmethod
+    def empty(cls) -> "SimilarityIndex":
+        return cls([], np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32),
+                   np.zeros(N_FEATURES, dtype=np.int32), 0, 0)
+
+    def idf(self, features: np.ndarray) -> np.ndarray:
+        return np.log((1 + self.n_docs) / (1 + self.df[features])).astype(np.float32) + 1
+
+    def weigh(self, features: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Sublinear tf * idf, L2-normalized"""
+        weights = (1 + np.log(counts)) * self.idf(features)
+        norm = np.linalg.norm(weights)
+        return weights / norm if norm else weights
+
+    def _extend(self, documents: List[Tuple[str, np.ndarray, np.ndarray]]):
+        """Add rows for `documents`, weighted with this index's document frequencies"""
+        if not documents:
+            return
+        rows = [self.weigh(features, counts) for _, features, counts in documents]
+        lengths = np.array([len(features) for _, features, _ in documents], dtype=np.int64)
+        self.positions.update((article_id, len(self.ids) + offset) for offset, (article_id, _, _) in enumerate(documents))
+        self.ids = self.ids + [article_id for article_id, _, _ in documents]
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+        self.indices = np.concatenate([self.indices] + [features for _, features, _ in documents])
+        self.data = np.concatenate([self.data] + rows).astype(np.float32)
+
+    def appended(self, documents: List[Tuple[str, np.ndarray, np.ndarray]]) -> "SimilarityIndex":
+        """A new index with `documents` (id, features, counts) added after the existing rows"""
+        documents = _unique(documents, self.positions)
+        df = np.array(self.df, dtype=np.int32)
+        for _, features, _ in documents:
+            df[features] += 1
+
+        index = SimilarityIndex(list(self.ids), self.indptr, self.indices, self.data,
+                                df, self.n_docs + len(documents), self.built_docs, dict(self.meta))
+        index._extend(documents)
+        return index
+
+    @classmethod
+    def build(cls, documents: List[Tuple[str, np.ndarray, np.ndarray]]) -> "SimilarityIndex":
+        """A fresh index with every row weighted by the final document frequencies"""
+        documents = _unique(documents, {})
+        df = np.zeros(N_FEATURES, dtype=np.int32)
+        for _, features, _ in documents:
+            df[features] += 1
+
+        empty = cls.empty()
+        index = cls([], empty.indptr, empty.indices, empty.data, df, len(documents), len(documents))
+        index._extend(documents)
+        return index
+
+    # Queries
+
+    def vector(self, features: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        query = np.zeros(N_FEATURES, dtype=np.float32)
+        query[features] = self.weigh(features, counts)
+        return query
+
+    def row_vector(self, position: int) -> np.ndarray:
+        start, end = self.indptr[position], self.indptr[position + 1]
+        query = np.zeros(N_FEATURES, dtype=np.float32)
+        query[self.indices[start:end]] = self.data[start:end]
+        return query
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row with a normalized dense query vector"""
+        if not len(self.ids) or not len(self.data):
+            return np.zeros(len(self.ids), dtype=np.float32)
+        # A trailing zero keeps every row start a valid reduceat offset; empty rows are zeroed afterwards
+        products = np.zeros(len(self.data) + 1, dtype=np.float32)
+        np.multiply(self.data, query[self.indices], out=products[:-1])
+        scores = np.add.reduceat(products, self.indptr[:-1])
+        scores[self.indptr[:-1] == self.indptr[1:]] = 0
+        return scores
+
+    def top(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[str, float]]:
+        scores = self.scores(query)
+        if exclude is not None:
+            scores[exclude] = 0
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.ids[position], float(scores[position])) for position in candidates if scores[position] > 0]
+
+    def related(self, article_id: str, k: int) -> List[Tuple[str, float]]:
+        position = self.positions.get(article_id)
+        if position is None:
+            return []
+        return self.top(self.row_vector(position), k, exclude=position)
+
+    def similar(self, text: str, k: int) -> List[Tuple[str, float]]:
+        features, counts = featurize(body=text)
+        if not len(features):
+            return []
+        return self.top(self.vector(features, counts), k)
+
+    # Persistence
+
+    def save(self, directory: Path) -> str:
+        """Write a new version under `directory` and point CURRENT at it"""
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = read_current(directory)
+        version = f"v{int(previous[1:]) + 1 if previous else 1}"
+        path = directory / version
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir()
+
+        np.save(path / "indptr.npy", self.indptr)
+        np.save(path / "indices.npy", self.indices)
+        np.save(path / "data.npy", self.data)
+        np.save(path / "df.npy", self.df)
+        with open(path / "meta.json", "w") as f:
+            json.dump({"ids": self.ids, "n_docs": self.n_docs, "built_docs": self.built_docs, "meta": self.meta}, f)
+
+        # Readers switch on CURRENT, so it is replaced atomically and last
+        tmp = directory / f"{CURRENT}.tmp"
+        tmp.write_text(version)
+        os.replace(tmp, directory / CURRENT)
+
+        # Workers still mapping old versions keep their open files
+        for old in directory.iterdir():
+            if old.is_dir() and old.name != version:
+                shutil.rmtree(old, ignore_errors=True)
+        return version
+
+    @classmethod
+    def open(cls, directory: Path, version: str) -> "SimilarityIndex":
+        """Memory-map a saved version read-only, so workers share the pages"""
+        path = directory / version
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        return cls(
+            meta["ids"],
+            np.load(path / "indptr.npy", mmap_mode="r"),
+            np.load(path / "indices.npy", mmap_mode="r"),
+            np.load(path / "data.npy", mmap_mode="r"),
+            np.load(path / "df.npy", mmap_mode="r"),
+            meta["n_docs"],
+            meta["built_docs"],
+            meta["meta"],
+        )
+
+
+def _unique(documents: List[Tuple[str, np.ndarray, np.ndarray]], known) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+    seen = set(known)
+    unique = []
+    for document in documents:
+        if document[0] not in seen:
+            seen.add(document[0])
+            unique.append(document)
+    return unique
+
+
+def read_current(directory: Path) -> Optional[str]:
+    try:
+        return (directory / CURRENT).read_text().strip() or None
+    except FileNotFoundError:
+        return None
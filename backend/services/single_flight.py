@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATS_LEASE_ENABLED = os.environ.get("STATS_LEASE_ENABLED", "true").lower() in ("1", "true", "yes")
+STATS_LEASE_SECONDS = float(os.environ.get("STATS_LEASE_SECONDS", "30"))
+
+
+class MongoLease:
+    """Short-lived named lease in Mongo so only one worker runs a computation at a time"""
+
+    def __init__(self, collection, ttl: timedelta = timedelta(seconds=STATS_LEASE_SECONDS)):
+        self.collection = collection
+        self.ttl = ttl
+        self.owner = str(uuid.uuid4())
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def acquire(self, name: str) -> bool:
+        """Take the lease if it is free, expired, or already ours"""
+        now = datetime.utcnow()
+        try:
+            await self.collection.find_one_and_update(
+                {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Someone else holds it (the upsert collided with their document)
+            return False
+
+    async def release(self, name: str):
+        await self.collection.delete_one({"_id": name, "owner": self.owner})
+
+    async def held(self, name: str) -> bool:
+        """Whether anyone holds an unexpired lease (the TTL monitor only deletes expired ones every minute)"""
+        return await self.collection.find_one({"_id": name, "expires_at": {"$gt": datetime.utcnow()}}) is not None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one computation.
+
+    Callers in this process await the same task. With a lease, workers in
+    other processes that miss at the same time wait for the lease holder's
+    result (via `load`) instead of computing it again.
+    """
+
+    def __init__(self, lease: Optional[MongoLease] = None, poll_interval: float = 0.1):
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    async def do(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[T]],
+        load: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+    ) -> T:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, compute, load))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+
+        # A cancelled caller must not cancel the computation other callers wait on
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Single-flight computation for {key} failed: {task.exception()}")
+
+    async def _run(self, key: Hashable, compute, load):
+        if self.lease is None:
+            return await compute()
+
+        name = ":".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+        if not await self.lease.acquire(name):
+            # Another worker is computing; wait for its result while it holds the lease
+            deadline = asyncio.get_running_loop().time() + self.lease.ttl.total_seconds()
+            while load is not None and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                result = await load()
+                if result is not None:
+                    return result
+                if not await self.lease.held(name):
+                    # The holder finished (or failed) without storing a loadable result
+                    break
+            return await compute()
+
+        try:
+            return await compute()
+        finally:
+            await self.lease.release(name)
+
+
+# Global instance used for lazily computed stats documents
+stats_flight = SingleFlight(lease=MongoLease(db.stats_leases) if STATS_LEASE_ENABLED else None)
@@ -0,0 +1,140 @@
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.analytics import PageView
+from database import db
+
+STRING_DICTIONARY_CACHE_SIZE = int(os.environ.get("STRING_DICTIONARY_CACHE_SIZE", "20000"))
+
+# Dictionary kinds
+USER_AGENT = "user_agent"
+REFERRER = "referrer"
+
+# Pageview string field -> field holding its dictionary id
+PAGEVIEW_ENCODED_FIELDS = {USER_AGENT: "user_agent_id", REFERRER: "referrer_id"}
+
+
+class _LRU(OrderedDict):
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        return default
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class StringDictionary:
+    """Dictionary encoding of repetitive strings (user agents, referrers).
+
+    Each distinct (kind, value) gets a small integer id stored in
+    string_dictionary; ids come from a per-kind sequence in counters. Both
+    directions are cached in process-local LRUs so ingest rarely touches
+    Mongo once the working set is warm.
+    """
+
+    def __init__(self, database=None, cache_size: int = STRING_DICTIONARY_CACHE_SIZE):
+        self.db = database if database is not None else db
+        self._ids: Dict[str, _LRU] = {}
+        self._values: Dict[str, _LRU] = {}
+        self.cache_size = cache_size
+
+    async def ensure_indexes(self):
+        await self.db.string_dictionary.create_index([("kind", 1), ("value", 1)], unique=True)
+        await self.db.string_dictionary.create_index([("kind", 1), ("id", 1)], unique=True)
+
+    def _cache(self, caches: Dict[str, _LRU], kind: str) -> _LRU:
+        cache = caches.get(kind)
+        if cache is None:
+            cache = caches[kind] = _LRU(self.cache_size)
+        return cache
+
+    async def encode(self, kind: str, value: Optional[str]) -> Optional[int]:
+        """Id for `value`, allocating one on first sight"""
+        if value is None:
+            return None
+
+        ids = self._cache(self._ids, kind)
+        string_id = ids.get(value)
+        if string_id is not None:
+            return string_id
+
+        entry = await self.db.string_dictionary.find_one({"kind": kind, "value": value}, {"id": 1})
+        if entry is None:
+            counter = await self.db.counters.find_one_and_update(
+                {"_id": f"string_dictionary:{kind}"},
+                {"$inc": {"seq": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            entry = {"id": counter["seq"]}
+            try:
+                await self.db.string_dictionary.insert_one({"kind": kind, "value": value, "id": entry["id"]})
+            except DuplicateKeyError:
+                # Another worker registered the same string first; use its id
+                entry = await self.db.string_dictionary.find_one({"kind": kind, "value": value}, {"id": 1})
+
+        string_id = entry["id"]
+        ids.put(value, string_id)
+        self._cache(self._values, kind).put(string_id, value)
+        return string_id
+
+    async def decode_many(self, kind: str, ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """id -> string for every id given, with one query for the cache misses"""
+        values = self._cache(self._values, kind)
+        found: Dict[int, str] = {}
+        missing = set()
+        for string_id in ids:
+            if string_id is None or string_id in found:
+                continue
+            value = values.get(string_id)
+            if value is None:
+                missing.add(string_id)
+            else:
+                found[string_id] = value
+
+        if missing:
+            async for entry in self.db.string_dictionary.find({"kind": kind, "id": {"$in": list(missing)}}):
+                found[entry["id"]] = entry["value"]
+                values.put(entry["id"], entry["value"])
+
+        return found
+
+
+# Global instance
+string_dictionary = StringDictionary()
+
+
+async def encode_pageview(pageview: PageView) -> dict:
+    """Pageview document with user agent and referrer replaced by dictionary ids"""
+    doc = pageview.dict()
+    for field, id_field in PAGEVIEW_ENCODED_FIELDS.items():
+        value = doc.pop(field)
+        if value is not None:
+            doc[id_field] = await string_dictionary.encode(field, value)
+    # BSON has no date type
+    doc["view_date"] = pageview.view_date.isoformat()
+    return doc
+
+
+async def decode_pageviews(docs: List[dict]) -> List[dict]:
+    """Restore user agent and referrer strings in stored pageview documents (in place)"""
+    for field, id_field in PAGEVIEW_ENCODED_FIELDS.items():
+        values = await string_dictionary.decode_many(field, (doc.get(id_field) for doc in docs))
+        for doc in docs:
+            string_id = doc.pop(id_field, None)
+            if string_id is not None:
+                doc[field] = values.get(string_id)
+    return docs
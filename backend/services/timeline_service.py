@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Set
+
+from pymongo import UpdateOne
+
+from models.article import Article, ArticleResponse
+from services.article_search_service import article_search_service
+from database import db
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_SIZE = int(os.environ.get("TIMELINE_SIZE", "500"))
+# Authors with more active subscribers than this are merged at read time instead of fanned out
+TIMELINE_FANOUT_LIMIT = int(os.environ.get("TIMELINE_FANOUT_LIMIT", "5000"))
+AUTHOR_RECENT_SIZE = 100
+TIMELINE_WRITE_BATCH_SIZE = 1000
+
+
+def timeline_item(article_id: str, author_wallet: str, published_at: datetime) -> dict:
+    return {"article_id": article_id, "author_wallet": author_wallet, "published_at": published_at}
+
+
+def _push(items: List[dict], size: int) -> dict:
+    """$push that keeps the array newest first and capped at `size`"""
+    return {"$each": items, "$sort": {"published_at": -1}, "$slice": size}
+
+
+class TimelineService:
+    """"From authors I follow" feeds, fanned out on write.
+
+    Each reader with a materialized timeline has one document holding the
+    authors they follow and their newest article items, capped at
+    TIMELINE_SIZE. Publishing pushes the article into every subscriber's
+    timeline; authors whose subscriber count exceeds the fan-out limit are
+    pulled instead: their articles are only pushed to a capped per-author
+    list, merged into followers' timelines at read time. Timelines are
+    built lazily on first read, so readers who never open the feed cost
+    nothing on publish.
+    """
+
+    def __init__(self, database=None, size: int = TIMELINE_SIZE, fanout_limit: int = TIMELINE_FANOUT_LIMIT):
+        self.db = database if database is not None else db
+        self.size = size
+        self.fanout_limit = fanout_limit
+        self._pulled: Set[str] = set()
+        # Running fan-outs by article id
+        self._fan_outs: Dict[str, asyncio.Task] = {}
+
+    async def ensure_indexes(self):
+        await self.db.subscriptions.create_index([("subscriber_wallet", 1), ("is_active", 1)])
+        await self.db.subscriptions.create_index([("author_wallet", 1), ("is_active", 1)])
+        await self.db.articles.create_index([("author_wallet", 1), ("published_at", -1)])
+
+    async def load(self):
+        """Reload the set of pulled (high-fanout) authors"""
+        self._pulled = {doc["_id"] async for doc in self.db.timeline_authors.find({"pulled": True}, {"_id": 1})}
+
+    # Writes
+
+    async def fan_out(self, article: Article):
+        """Push a published article into its author's recent list and its subscribers' timelines"""
+        if article.status != "published":
+            return
+        item = timeline_item(article.id, article.author_wallet, article.published_at)
+
+        # Push unless already there, then create the list if the author had none
+        await self.db.author_timelines.update_one(
+            {"_id": article.author_wallet, "items.article_id": {"$ne": article.id}},
+            {"$push": {"items": _push([item], AUTHOR_RECENT_SIZE)}}
+        )
+        await self.db.author_timelines.update_one(
+            {"_id": article.author_wallet}, {"$setOnInsert": {"items": [item]}}, upsert=True
+        )
+
+        if article.author_wallet in self._pulled:
+            return
+
+        cursor = self.db.subscriptions.find(
+            {"author_wallet": article.author_wallet, "is_active": True}, {"_id": 0, "subscriber_wallet": 1}
+        ).limit(self.fanout_limit + 1)
+        subscribers = list({sub["subscriber_wallet"] async for sub in cursor})
+        if len(subscribers) > self.fanout_limit:
+            await self.db.timeline_authors.update_one(
+                {"_id": article.author_wallet}, {"$set": {"pulled": True, "updated_at": datetime.utcnow()}}, upsert=True
+            )
+            self._pulled.add(article.author_wallet)
+            return
+
+        # Only materialized timelines are updated; the rest include the article when first built
+        operations = [
+            UpdateOne(
+                {"_id": wallet, "items.article_id": {"$ne": article.id}},
+                {"$push": {"items": _push([item], self.size)}, "$set": {"updated_at": datetime.utcnow()}}
+            )
+            for wallet in subscribers
+        ]
+        for start in range(0, len(operations), TIMELINE_WRITE_BATCH_SIZE):
+            await self.db.timelines.bulk_write(operations[start:start + TIMELINE_WRITE_BATCH_SIZE], ordered=False)
+
+    def fan_out_in_background(self, article: Article):
+        """Start a fan-out unless one is already running for this article"""
+        task = self._fan_outs.get(article.id)
+        if task is not None and not task.done():
+            return
+
+        async def run():
+            try:
+                await self.fan_out(article)
+            except Exception as e:
+                logger.error(f"Failed to fan out article {article.id}: {e}")
+            finally:
+                if self._fan_outs.get(article.id) is task:
+                    del self._fan_outs[article.id]
+
+        task = self._fan_outs[article.id] = asyncio.create_task(run())
+
+    async def record_subscription(self, subscriber_wallet: str, author_wallet: str):
+        """Add a followed author to a materialized timeline, backfilled with their recent articles"""
+        update = {"$addToSet": {"authors": author_wallet}, "$set": {"updated_at": datetime.utcnow()}}
+        if author_wallet not in self._pulled:
+            recent = await self.db.author_timelines.find_one({"_id": author_wallet})
+            if recent and recent.get("items"):
+                update["$push"] = {"items": _push(recent["items"], self.size)}
+        await self.db.timelines.update_one({"_id": subscriber_wallet, "authors": {"$ne": author_wallet}}, update)
+
+    async def record_unsubscription(self, subscriber_wallet: str, author_wallet: str):
+        await self.db.timelines.update_one(
+            {"_id": subscriber_wallet},
+            {
+                "$pull": {"authors": author_wallet, "items": {"author_wallet": author_wallet}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+
+    async def build(self, wallet: str) -> dict:
+        """Materialize a reader's timeline from their subscriptions"""
+        authors = await self.db.subscriptions.distinct("author_wallet", {"subscriber_wallet": wallet, "is_active": True})
+        pushed = [author for author in authors if author not in self._pulled]
+
+        items = []
+        if pushed:
+            cursor = self.db.articles.find(
+                {"author_wallet": {"$in": pushed}, "status": "published"},
+                {"_id": 0, "id": 1, "author_wallet": 1, "published_at": 1}
+            ).sort("published_at", -1).limit(self.size)
+            items = [timeline_item(doc["id"], doc["author_wallet"], doc["published_at"]) async for doc in cursor]
+
+        timeline = {"_id": wallet, "authors": authors, "items": items, "updated_at": datetime.utcnow()}
+        await self.db.timelines.replace_one({"_id": wallet}, timeline, upsert=True)
+        return timeline
+
+    # Reads
+
+    async def timeline(self, wallet: str, limit: int = 20, offset: int = 0) -> List[ArticleResponse]:
+        """Newest articles from the authors a reader follows"""
+        timeline = await self.db.timelines.find_one({"_id": wallet})
+        if timeline is None:
+            timeline = await self.build(wallet)
+
+        items = timeline.get("items", [])
+        pulled = [author for author in timeline.get("authors", []) if author in self._pulled]
+        if pulled:
+            # Items pushed before the author crossed the fan-out limit may also be in the timeline
+            merged = {item["article_id"]: item for item in items}
+            async for recent in self.db.author_timelines.find({"_id": {"$in": pulled}}):
+                for item in recent.get("items", []):
+                    merged.setdefault(item["article_id"], item)
+            items = sorted(merged.values(), key=lambda item: item["published_at"], reverse=True)
+
+        page = items[offset:offset + limit]
+        return await article_search_service.hydrate([item["article_id"] for item in page], {"status": "published"})
+
+
+# Global instance
+timeline_service = TimelineService()
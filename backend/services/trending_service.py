@@ -0,0 +1,237 @@
+import heapq
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from models.analytics import PageView, UserEngagement
+from database import db
+
+# Weight each event adds to an article's trending score
+TRENDING_WEIGHTS = {
+    "view": 1.0,
+    "like": 3.0,
+    "comment": 4.0,
+    "share": 5.0,
+    "tip": 5.0,
+}
+
+TRENDING_SHORT_TAU_HOURS = float(os.environ.get("TRENDING_SHORT_TAU_HOURS", "1"))
+TRENDING_LONG_TAU_HOURS = float(os.environ.get("TRENDING_LONG_TAU_HOURS", "24"))
+
+# Short-horizon rate this far above/below the long-horizon rate counts as up/down
+TREND_BAND = 0.25
+
+# Articles whose long-horizon score decays below this are dropped
+MIN_SCORE = 1e-3
+
+LEADERBOARD_SIZE = 200
+LEADERBOARD_MAX_AGE = 1.0  # seconds
+
+# Scores are stored relative to a weekly epoch so growth factors stay well inside float range
+EPOCH_LENGTH = timedelta(days=7)
+_EPOCH_ORIGIN = datetime(2024, 1, 1)
+
+
+def epoch_for(moment: datetime) -> datetime:
+    return _EPOCH_ORIGIN + ((moment - _EPOCH_ORIGIN) // EPOCH_LENGTH) * EPOCH_LENGTH
+
+
+class TrendingService:
+    """Exponentially decayed per-article scores at a short and a long horizon.
+
+    An event of weight w at time t adds w * exp((t - epoch) / tau) to each
+    horizon, so the score at `now` is the stored value times
+    exp(-(now - epoch) / tau). Values are additive across workers: each
+    worker $incs its pending deltas into trending_scores and reloads the
+    merged totals. Top-K is served from a leaderboard rebuilt with a heap at
+    most once a second.
+    """
+
+    def __init__(
+        self,
+        database=None,
+        short_tau_hours: float = TRENDING_SHORT_TAU_HOURS,
+        long_tau_hours: float = TRENDING_LONG_TAU_HOURS,
+    ):
+        self.db = database if database is not None else db
+        self.taus = (short_tau_hours * 3600, long_tau_hours * 3600)
+        self._epoch = epoch_for(datetime.utcnow())
+        self._totals: Dict[str, List[float]] = {}
+        self._pending: Dict[str, List[float]] = {}
+        self._leaderboard: List[Tuple[float, str]] = []
+        self._leaderboard_built = 0.0
+        self._dirty = True
+
+    async def ensure_indexes(self):
+        await self.db.trending_scores.create_index([("article_id", 1), ("epoch", 1)], unique=True)
+        await self.db.trending_scores.create_index([("epoch", 1), ("long", -1)])
+        await self.db.trending_scores.create_index("expires_at", expireAfterSeconds=0)
+
+    # Ingest
+
+    def record(self, article_id: str, weight: float, at: Optional[datetime] = None):
+        at = at or datetime.utcnow()
+        self._roll_epoch(at)
+
+        elapsed = (at - self._epoch).total_seconds()
+        deltas = [weight * math.exp(elapsed / tau) for tau in self.taus]
+
+        for scores in (self._totals, self._pending):
+            values = scores.setdefault(article_id, [0.0, 0.0])
+            values[0] += deltas[0]
+            values[1] += deltas[1]
+
+        self._dirty = True
+
+    def record_pageview(self, pageview: PageView):
+        self.record(pageview.article_id, TRENDING_WEIGHTS["view"], pageview.created_at)
+
+    def record_engagement(self, engagement: UserEngagement):
+        # Views are counted from pageviews only
+        if engagement.target_type != "article" or engagement.action_type == "view":
+            return
+        weight = TRENDING_WEIGHTS.get(engagement.action_type)
+        if weight:
+            self.record(engagement.target_id, weight, engagement.created_at)
+
+    def _roll_epoch(self, moment: datetime):
+        epoch = epoch_for(moment)
+        if epoch <= self._epoch:
+            return
+
+        elapsed = (epoch - self._epoch).total_seconds()
+        factors = [math.exp(-elapsed / tau) for tau in self.taus]
+        for scores in (self._totals, self._pending):
+            for values in scores.values():
+                values[0] *= factors[0]
+                values[1] *= factors[1]
+
+        self._epoch = epoch
+        self._dirty = True
+
+    # Scores
+
+    def rates(self, values: List[float], now: datetime) -> Tuple[float, float]:
+        """Weighted events per hour at the short and long horizon"""
+        elapsed = (now - self._epoch).total_seconds()
+        return tuple(
+            value * math.exp(-elapsed / tau) / (tau / 3600)
+            for value, tau in zip(values, self.taus)
+        )
+
+    def trend(self, article_id: str, now: Optional[datetime] = None) -> dict:
+        """Score, velocity and direction for one article"""
+        now = now or datetime.utcnow()
+        values = self._totals.get(article_id, [0.0, 0.0])
+        short_rate, long_rate = self.rates(values, now)
+
+        if long_rate <= 0:
+            direction = "up" if short_rate > 0 else "stable"
+        elif short_rate > long_rate * (1 + TREND_BAND):
+            direction = "up"
+        elif short_rate < long_rate * (1 - TREND_BAND):
+            direction = "down"
+        else:
+            direction = "stable"
+
+        long_tau = self.taus[1]
+        return {
+            "article_id": article_id,
+            "score": values[1] * math.exp(-(now - self._epoch).total_seconds() / long_tau),
+            "velocity": short_rate - long_rate,
+            "trend_direction": direction,
+        }
+
+    def top(self, k: int = 10) -> List[dict]:
+        """Top-k articles by long-horizon score"""
+        if self._dirty and time.monotonic() - self._leaderboard_built > LEADERBOARD_MAX_AGE:
+            self._rebuild_leaderboard()
+
+        now = datetime.utcnow()
+        return [self.trend(article_id, now) for _, article_id in self._leaderboard[:k]]
+
+    def _rebuild_leaderboard(self):
+        # Ordering by stored value equals ordering by decayed score within one epoch
+        self._leaderboard = heapq.nlargest(
+            LEADERBOARD_SIZE,
+            ((values[1], article_id) for article_id, values in self._totals.items())
+        )
+        self._leaderboard_built = time.monotonic()
+        self._dirty = False
+
+    # Persistence
+
+    async def persist(self):
+        """Push pending deltas to Mongo, then reload the merged scores from all workers"""
+        self._roll_epoch(datetime.utcnow())
+        pending, self._pending = self._pending, {}
+        epoch = self._epoch
+
+        if pending:
+            operations = [
+                UpdateOne(
+                    {"article_id": article_id, "epoch": epoch},
+                    {
+                        "$inc": {"short": values[0], "long": values[1]},
+                        "$setOnInsert": {"expires_at": epoch + 2 * EPOCH_LENGTH}
+                    },
+                    upsert=True
+                )
+                for article_id, values in pending.items()
+            ]
+            try:
+                await self.db.trending_scores.bulk_write(operations, ordered=False)
+            except Exception:
+                for article_id, values in pending.items():
+                    restored = self._pending.setdefault(article_id, [0.0, 0.0])
+                    restored[0] += values[0]
+                    restored[1] += values[1]
+                raise
+
+        await self.load()
+
+    async def load(self):
+        """Replace in-memory totals with the merged scores still above the cut-off"""
+        now = datetime.utcnow()
+        self._roll_epoch(now)
+        epoch = self._epoch
+        previous = epoch - EPOCH_LENGTH
+        long_tau = self.taus[1]
+
+        # MIN_SCORE at `now`, expressed in each epoch's units
+        def threshold(for_epoch: datetime) -> float:
+            return MIN_SCORE * math.exp((now - for_epoch).total_seconds() / long_tau)
+
+        totals: Dict[str, List[float]] = {}
+        cursor = self.db.trending_scores.find({
+            "$or": [
+                {"epoch": epoch, "long": {"$gte": threshold(epoch)}},
+                {"epoch": previous, "long": {"$gte": threshold(previous)}},
+            ]
+        })
+        async for doc in cursor:
+            values = [doc.get("short", 0.0), doc.get("long", 0.0)]
+            if doc["epoch"] != epoch:
+                elapsed = (epoch - doc["epoch"]).total_seconds()
+                values = [value * math.exp(-elapsed / tau) for value, tau in zip(values, self.taus)]
+
+            merged = totals.setdefault(doc["article_id"], [0.0, 0.0])
+            merged[0] += values[0]
+            merged[1] += values[1]
+
+        # Events recorded while we were reading are not in Mongo yet
+        for article_id, values in self._pending.items():
+            merged = totals.setdefault(article_id, [0.0, 0.0])
+            merged[0] += values[0]
+            merged[1] += values[1]
+
+        self._totals = totals
+        self._dirty = True
+
+
+# Global instance
+trending_service = TrendingService()
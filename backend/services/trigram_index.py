@@ -0,0 +1,133 @@
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+WORD = re.compile(r"[^\W_]+")
+MIN_TOKEN_LENGTH = 3
+# Candidates per query token that get an exact edit distance
+MAX_CANDIDATES = 50
+
+
+def words(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.casefold()) if len(word) >= MIN_TOKEN_LENGTH]
+
+
+def trigrams(word: str) -> List[str]:
+    padded = f"  {word} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def max_distance(word: str) -> int:
+    return 1 if len(word) <= 5 else 2
+
+
+def bounded_levenshtein(a: str, b: str, bound: int) -> int:
+    """Edit distance of a and b, or bound + 1 if it exceeds bound"""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            row_min = min(row_min, current[j])
+        if row_min > bound:
+            return bound + 1
+        previous = current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """Typo-tolerant lookup of documents by their words.
+
+    Distinct words get dense term ids. Each trigram posts the ids of the
+    words containing it, and each word posts the positions of the documents
+    containing it, both in growable int32 arrays. A misspelled query word
+    collects candidate words by counting shared trigrams (a bincount over
+    the concatenated postings), and only the best candidates are checked
+    with a bounded edit distance. Adding a document only appends.
+    """
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.grams: Dict[str, array] = {}
+        self.term_docs: List[array] = []
+        self.doc_ids: List[str] = []
+        self.doc_positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: str, text: Iterable[str]):
+        """Index the words of `text` (strings) under `doc_id`; re-adding a document only adds new words"""
+        position = self.doc_positions.get(doc_id)
+        if position is None:
+            position = self.doc_positions[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+
+        for word in {word for part in text for word in words(part)}:
+            term_id = self.term_ids.get(word)
+            if term_id is None:
+                term_id = self.term_ids[word] = len(self.terms)
+                self.terms.append(word)
+                self.term_docs.append(array("i"))
+                for gram in trigrams(word):
+                    postings = self.grams.get(gram)
+                    if postings is None:
+                        postings = self.grams[gram] = array("i")
+                    postings.append(term_id)
+            # Postings stay sorted; new documents append at the end
+            postings = self.term_docs[term_id]
+            i = bisect_left(postings, position)
+            if i == len(postings) or postings[i] != position:
+                postings.insert(i, position)
+
+    def corrections(self, word: str) -> List[Tuple[str, float]]:
+        """Indexed words within edit distance of `word`, with similarity 1 - distance / length"""
+        term_id = self.term_ids.get(word)
+        if term_id is not None:
+            return [(word, 1.0)]
+
+        grams = trigrams(word)
+        postings = [np.frombuffer(self.grams[gram], dtype=np.int32) for gram in grams if gram in self.grams]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.terms))
+
+        # A word within distance d of `word` shares at least len(grams) - 3d trigrams
+        bound = max_distance(word)
+        minimum = max(1, len(grams) - 3 * bound)
+        candidates = np.flatnonzero(shared >= minimum)
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = candidates[np.argpartition(-shared[candidates], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+
+        matches = []
+        for candidate in candidates:
+            term = self.terms[candidate]
+            distance = bounded_levenshtein(word, term, bound)
+            if distance <= bound:
+                matches.append((term, 1 - distance / max(len(word), len(term))))
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Documents ranked by the summed similarity of their best match for each query word"""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for word in set(words(query)):
+            best = np.zeros(len(self.doc_ids), dtype=np.float32)
+            for term, similarity in self.corrections(word):
+                positions = np.frombuffer(self.term_docs[self.term_ids[term]], dtype=np.int32)
+                best[positions] = np.maximum(best[positions], similarity)
+            scores += best
+
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        # Partitioning the whole array is cheaper than first collecting the non-zero positions
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.doc_ids[position], float(scores[position])) for position in top if scores[position] > 0]
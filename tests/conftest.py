@@ -0,0 +1,31 @@
+import asyncio
+import inspect
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from tests.fake_mongo import FakeDatabase
+
+# Services import their modules relative to backend/, as the server does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# database.py builds a (lazy) client at import; no test talks to a real server
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run `async def` tests on a fresh event loop"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture
+def database():
+    return FakeDatabase()
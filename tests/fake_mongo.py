@@ -0,0 +1,250 @@
+"""In-memory stand-in for the slice of the Motor API the services under test use.
+
+Documents are stored as a BSON round trip, so anything the real driver
+could not encode fails here too, and callers never share state with the
+store. Unique indexes (including partial ones) raise DuplicateKeyError
+the way mongod does; upserts build their document from the filter's
+equality fields.
+"""
+
+import copy
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import DeleteResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+def _get(doc: dict, path: str) -> Any:
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _parent(doc: dict, path: str) -> Tuple[dict, str]:
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    return doc, leaf
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if op == "$eq":
+        return value == operand or (isinstance(value, list) and operand in value)
+    if op == "$ne":
+        return not _compare(value, "$eq", operand)
+    if op == "$in":
+        return any(_compare(value, "$eq", item) for item in operand)
+    if op == "$nin":
+        return not _compare(value, "$in", operand)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op == "$type":
+        return operand == "string" and isinstance(value, str)
+    if value is _MISSING or value is None:
+        return False
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    raise NotImplementedError(op)
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _compare(None if value is _MISSING else value, "$eq", condition):
+            return False
+    return True
+
+
+def _add(current: Any, delta: Any) -> Any:
+    if isinstance(current, Decimal128) or isinstance(delta, Decimal128):
+        as_decimal = [v.to_decimal() if isinstance(v, Decimal128) else Decimal(v) for v in (current, delta)]
+        return Decimal128(as_decimal[0] + as_decimal[1])
+    return current + delta
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            parent, leaf = _parent(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                parent[leaf] = copy.deepcopy(value)
+            elif op == "$inc":
+                parent[leaf] = _add(parent.get(leaf, 0), value)
+            elif op == "$push":
+                items = parent.setdefault(leaf, [])
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(value["$each"])
+                    if "$slice" in value:
+                        parent[leaf] = items[value["$slice"]:] if value["$slice"] < 0 else items[:value["$slice"]]
+                else:
+                    items.append(value)
+            elif op == "$pull":
+                parent[leaf] = [item for item in parent.get(leaf, []) if item != value]
+            elif op == "$unset":
+                parent.pop(leaf, None)
+            else:
+                raise NotImplementedError(op)
+
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return doc
+    if all(not value for value in projection.values()):
+        return {key: value for key, value in doc.items() if key not in projection}
+    kept = {key: value for key, value in doc.items() if projection.get(key)}
+    if projection.get("_id", 1) and "_id" in doc:
+        kept["_id"] = doc["_id"]
+    return kept
+
+
+class FakeCursor:
+    def __init__(self, docs: List[dict]):
+        self._docs = docs
+
+    def sort(self, key: str, direction: int = 1) -> "FakeCursor":
+        self._docs.sort(key=lambda doc: _get(doc, key), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length: Optional[int]) -> List[dict]:
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: List[dict] = []
+        # (field, partial filter) per unique index besides _id
+        self.unique: List[Tuple[str, Optional[dict]]] = []
+
+    async def create_index(self, keys, unique: bool = False, partialFilterExpression: Optional[dict] = None, **kwargs):
+        if unique and isinstance(keys, str):
+            self.unique.append((keys, partialFilterExpression))
+        return keys if isinstance(keys, str) else "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def _check_unique(self, doc: dict, ignore: Optional[dict] = None):
+        for field, partial in [("_id", None)] + self.unique:
+            value = _get(doc, field)
+            if value is _MISSING or (partial and not matches(doc, partial)):
+                continue
+            for other in self.docs:
+                if other is not ignore and _get(other, field) == value and (not partial or matches(other, partial)):
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {field}")
+
+    def _store(self, doc: dict) -> dict:
+        return bson.decode(bson.encode(doc))
+
+    def _insert(self, doc: dict) -> dict:
+        doc.setdefault("_id", ObjectId())
+        stored = self._store(doc)
+        self._check_unique(stored)
+        self.docs.append(stored)
+        return stored
+
+    def _find(self, query: Optional[dict]) -> List[dict]:
+        return [doc for doc in self.docs if matches(doc, query or {})]
+
+    def _upsert(self, query: dict, update: dict) -> dict:
+        doc = {
+            key: value for key, value in query.items()
+            if not key.startswith("$") and not (isinstance(value, dict) and any(op.startswith("$") for op in value))
+        }
+        apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _update(self, doc: dict, update: dict) -> dict:
+        changed = copy.deepcopy(doc)
+        apply_update(changed, update)
+        changed = self._store(changed)
+        self._check_unique(changed, ignore=doc)
+        doc.clear()
+        doc.update(changed)
+        return doc
+
+    async def insert_one(self, doc: dict) -> InsertOneResult:
+        return InsertOneResult(self._insert(doc)["_id"], True)
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+        found = self._find(query)
+        return _project(copy.deepcopy(found[0]), projection) if found else None
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> FakeCursor:
+        return FakeCursor([_project(copy.deepcopy(doc), projection) for doc in self._find(query)])
+
+    async def count_documents(self, query: dict) -> int:
+        return len(self._find(query))
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        found = self._find(query)
+        if found:
+            self._update(found[0], update)
+            return UpdateResult({"n": 1, "nModified": 1}, True)
+        if upsert:
+            doc = self._upsert(query, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": doc["_id"]}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    async def find_one_and_update(self, query: dict, update: dict, projection: Optional[dict] = None,
+                                  upsert: bool = False, return_document: bool = ReturnDocument.BEFORE) -> Optional[dict]:
+        found = self._find(query)
+        if found:
+            before = copy.deepcopy(found[0])
+            after = self._update(found[0], update)
+        elif upsert:
+            before, after = None, self._upsert(query, update)
+        else:
+            return None
+        result = copy.deepcopy(after) if return_document == ReturnDocument.AFTER else before
+        return _project(result, projection) if result is not None else None
+
+    async def delete_one(self, query: dict) -> DeleteResult:
+        found = self._find(query)
+        if found:
+            self.docs.remove(found[0])
+        return DeleteResult({"n": len(found[:1])}, True)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
@@ -0,0 +1,39 @@
+import pytest
+
+from services.bloom_filter import BloomFilter, optimal_size
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    members = [f"purchase:0xwallet{i}:article-{i * 7}" for i in range(5000)]
+    bloom.add_many(members[:4000])
+    for member in members[4000:]:
+        bloom.add(member)
+
+    assert all(member in bloom for member in members)
+    assert bloom.count == 5000
+
+
+def test_false_positive_rate_near_target_at_capacity():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    bloom.add_many(f"member-{i}" for i in range(5000))
+
+    false_positives = sum(f"stranger-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=100)
+    bloom.add_many([])
+    assert "anything" not in bloom
+    assert bloom.count == 0
+
+
+def test_optimal_size():
+    bits, hashes = optimal_size(1000, 0.01)
+    # ~9.6 bits and ~7 hashes per item at 1%
+    assert 9500 <= bits <= 9600
+    assert hashes == 7
+
+    with pytest.raises(ValueError):
+        optimal_size(1000, 1.5)
@@ -0,0 +1,69 @@
+import random
+from collections import Counter
+
+from services.heavy_hitters import SpaceSaving
+
+
+def zipf_stream(n_keys=500, length=20000, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, n_keys + 1)]
+    return rng.choices([f"query-{i}" for i in range(n_keys)], weights=weights, k=length)
+
+
+def test_counts_are_exact_below_capacity():
+    summary = SpaceSaving(capacity=10)
+    for key in ["defi", "nft", "defi", "dao", "defi", "nft"]:
+        summary.add(key, total=2)
+
+    assert [(key, count, error, total) for key, count, error, total in summary.top(3)] == [
+        ("defi", 3, 0, 6), ("nft", 2, 0, 4), ("dao", 1, 0, 2)
+    ]
+
+
+def test_counts_bound_the_true_frequency():
+    stream = zipf_stream()
+    truth = Counter(stream)
+    summary = SpaceSaving(capacity=50)
+    for key in stream:
+        summary.add(key)
+
+    assert len(summary) == 50
+    for key, count, error, _ in summary.items():
+        assert count - error <= truth[key] <= count
+
+
+def test_frequent_keys_are_always_monitored():
+    stream = zipf_stream()
+    summary = SpaceSaving(capacity=50)
+    for key in stream:
+        summary.add(key)
+
+    frequent = {key for key, count in Counter(stream).items() if count > len(stream) / 50}
+    assert frequent
+    assert frequent <= set(summary.counts)
+    assert [key for key, *_ in summary.top(3)] == ["query-0", "query-1", "query-2"]
+
+
+def test_evicted_key_inherits_the_minimum_as_error():
+    summary = SpaceSaving(capacity=2)
+    summary.add("a", 3)
+    summary.add("b", 1)
+    summary.add("c")
+
+    assert "b" not in summary.counts
+    assert (summary.counts["c"], summary.errors["c"]) == (2, 1)
+
+
+def test_merged_summaries_add_counts():
+    first, second = SpaceSaving(10), SpaceSaving(10)
+    for key in ["a", "a", "b"]:
+        first.add(key)
+    for key in ["a", "c", "c", "c"]:
+        second.add(key)
+
+    merged = SpaceSaving.merged([first, second], capacity=2)
+    assert merged.counts == {"a": 3, "c": 3}
+
+    # The merged summary keeps working as a stream summary
+    merged.add("a")
+    assert merged.counts["a"] == 4
@@ -0,0 +1,56 @@
+import pytest
+
+from services.hyperloglog import HyperLogLog, precision_for_error
+
+
+def sketch(values, precision=12):
+    hll = HyperLogLog(precision)
+    for value in values:
+        hll.add(value)
+    return hll
+
+
+@pytest.mark.parametrize("n", [1000, 20000, 100000])
+def test_estimate_within_error_bound(n):
+    hll = sketch(f"visitor-{i}" for i in range(n))
+    # Four standard errors: deterministic hashes, so this cannot flake
+    assert abs(hll.estimate() - n) <= 4 * hll.standard_error * n
+
+
+def test_small_sets_are_nearly_exact():
+    hll = sketch(f"visitor-{i}" for i in range(50))
+    assert hll.is_sparse
+    assert abs(hll.estimate() - 50) <= 1
+
+
+def test_duplicates_are_not_counted():
+    hll = sketch(f"visitor-{i % 500}" for i in range(10000))
+    assert abs(hll.estimate() - 500) <= 4 * hll.standard_error * 500
+
+
+def test_merge_estimates_the_union():
+    monday = sketch(f"visitor-{i}" for i in range(0, 30000))
+    tuesday = sketch(f"visitor-{i}" for i in range(20000, 50000))
+    union = monday.copy().merge(tuesday)
+
+    assert abs(union.estimate() - 50000) <= 4 * union.standard_error * 50000
+    # Merging left the source sketch alone
+    assert monday.estimate() == sketch(f"visitor-{i}" for i in range(0, 30000)).estimate()
+
+
+def test_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(13))
+
+
+@pytest.mark.parametrize("n", [10, 5000])
+def test_bytes_round_trip(n):
+    hll = sketch(f"visitor-{i}" for i in range(n))
+    restored = HyperLogLog.from_bytes(hll.to_bytes())
+    assert restored.is_sparse == hll.is_sparse
+    assert restored.estimate() == hll.estimate()
+
+
+def test_precision_for_error():
+    assert precision_for_error(0.01) == 14
+    assert HyperLogLog(precision_for_error(0.02)).standard_error <= 0.02
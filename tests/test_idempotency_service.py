@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from services import idempotency_service as module
+from services.idempotency_service import IdempotencyService, IN_PROGRESS, IDEMPOTENCY_TTL, fingerprint
+
+
+class Handler:
+    """Counts calls and answers with the call number"""
+
+    def __init__(self, delay: float = 0, error: Exception = None):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"call": self.calls}
+
+
+@pytest.fixture
+def idempotency(database):
+    return IdempotencyService(database, poll_interval=0.01)
+
+
+async def claim(database, locked_until):
+    """A tips:key-1 claim held by another worker"""
+    await database.idempotency_keys.insert_one({
+        "_id": "tips:key-1",
+        "request_hash": fingerprint({"amount": 1}),
+        "owner": "another-worker",
+        "state": IN_PROGRESS,
+        "locked_until": locked_until,
+        "expires_at": datetime.utcnow() + IDEMPOTENCY_TTL,
+    })
+
+
+async def test_retry_replays_the_stored_response(idempotency):
+    handler = Handler()
+    first = await idempotency.run("tips", "key-1", {"amount": 1}, handler)
+    second = await idempotency.run("tips", "key-1", {"amount": 1}, handler)
+    assert first == second == {"call": 1}
+    assert handler.calls == 1
+
+
+async def test_retry_on_another_worker_replays_from_the_store(idempotency, database):
+    handler = Handler()
+    await idempotency.run("tips", "key-1", {"amount": 1}, handler)
+    other_worker = IdempotencyService(database)
+    assert await other_worker.run("tips", "key-1", {"amount": 1}, handler) == {"call": 1}
+    assert handler.calls == 1
+
+
+async def test_without_a_key_every_request_runs(idempotency):
+    handler = Handler()
+    await idempotency.run("tips", None, {"amount": 1}, handler)
+    await idempotency.run("tips", None, {"amount": 1}, handler)
+    assert handler.calls == 2
+
+
+async def test_concurrent_requests_run_the_handler_once(database):
+    handler = Handler(delay=0.05)
+    workers = [IdempotencyService(database, poll_interval=0.01) for _ in range(3)]
+    responses = await asyncio.gather(*[worker.run("tips", "key-1", {"amount": 1}, handler) for worker in workers])
+    assert responses == [{"call": 1}] * 3
+    assert handler.calls == 1
+
+
+async def test_key_reused_with_another_body_is_rejected(idempotency, database):
+    await idempotency.run("tips", "key-1", {"amount": 1}, Handler())
+
+    # From the local cache, and from the store on another worker
+    for worker in (idempotency, IdempotencyService(database)):
+        with pytest.raises(HTTPException) as error:
+            await worker.run("tips", "key-1", {"amount": 2}, Handler())
+        assert error.value.status_code == 422
+
+
+async def test_scopes_do_not_share_keys(idempotency):
+    handler = Handler()
+    await idempotency.run("tips", "key-1", {"amount": 1}, handler)
+    await idempotency.run("purchases", "key-1", {"amount": 1}, handler)
+    assert handler.calls == 2
+
+
+async def test_failed_request_releases_its_key(idempotency):
+    with pytest.raises(ValueError):
+        await idempotency.run("tips", "key-1", {"amount": 1}, Handler(error=ValueError("boom")))
+
+    handler = Handler()
+    assert await idempotency.run("tips", "key-1", {"amount": 1}, handler) == {"call": 1}
+
+
+async def test_abandoned_claim_is_taken_over(idempotency, database):
+    await claim(database, locked_until=datetime.utcnow() - timedelta(seconds=1))
+
+    handler = Handler()
+    assert await idempotency.run("tips", "key-1", {"amount": 1}, handler) == {"call": 1}
+    assert handler.calls == 1
+
+
+async def test_claim_still_running_past_the_wait_answers_409(idempotency, database, monkeypatch):
+    monkeypatch.setattr(module, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+    await claim(database, locked_until=datetime.utcnow() + timedelta(minutes=1))
+
+    handler = Handler()
+    with pytest.raises(HTTPException) as error:
+        await idempotency.run("tips", "key-1", {"amount": 1}, handler)
+    assert error.value.status_code == 409
+    assert handler.calls == 0
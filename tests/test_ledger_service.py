@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from services.ledger_service import LedgerService, LEDGER_APPLY_GRACE, purchase_event, tip_event
+
+
+@pytest.fixture
+def ledger(database):
+    service = LedgerService(database)
+    asyncio.run(service.ensure_indexes())
+    return service
+
+
+def make_tip(tip_id="tip-1", amount="1.25", transaction_hash="0xaa"):
+    return {
+        "id": tip_id,
+        "from_wallet": "0xfan",
+        "to_wallet": "0xauthor",
+        "amount": Decimal(amount),
+        "currency": "ETH",
+        "transaction_hash": transaction_hash,
+        "created_at": datetime(2026, 1, 1),
+    }
+
+
+async def balance(ledger, wallet):
+    [currency] = await ledger.balances(wallet)
+    return currency
+
+
+async def test_recording_an_event_twice_applies_it_once(ledger, database):
+    await ledger.record(tip_event(make_tip()))
+    await ledger.record(tip_event(make_tip()))
+
+    author = await balance(ledger, "0xauthor")
+    assert (author.tips_received, author.tips_count) == (Decimal("1.25"), 1)
+    assert (await balance(ledger, "0xfan")).balance == Decimal("-1.25")
+    assert await database.ledger_events.count_documents({}) == 1
+
+
+async def test_a_reused_transaction_hash_is_not_counted_again(ledger):
+    await ledger.record(tip_event(make_tip("tip-1")))
+    await ledger.record(tip_event(make_tip("tip-2")))
+
+    assert (await balance(ledger, "0xauthor")).tips_count == 1
+
+
+async def test_events_without_transaction_hash_do_not_collide(ledger):
+    await ledger.record(tip_event(make_tip("tip-1", transaction_hash=None)))
+    await ledger.record(tip_event(make_tip("tip-2", amount="2", transaction_hash=None)))
+
+    author = await balance(ledger, "0xauthor")
+    assert (author.tips_received, author.tips_count) == (Decimal("3.25"), 2)
+
+
+async def test_sweep_finishes_an_event_left_half_applied(ledger, database, monkeypatch):
+    update_one = database.wallet_ledgers.update_one
+    updates = []
+
+    async def die_on_the_second_posting(*args, **kwargs):
+        updates.append(args)
+        if len(updates) == 2:
+            raise ConnectionError("writer died")
+        return await update_one(*args, **kwargs)
+
+    # The writer folded one posting, then died before the other
+    monkeypatch.setattr(database.wallet_ledgers, "update_one", die_on_the_second_posting)
+    with pytest.raises(ConnectionError):
+        await ledger.record(tip_event(make_tip()))
+    monkeypatch.undo()
+
+    # Its claim expires with the grace period
+    await ledger.apply_pending(now=datetime.utcnow() + LEDGER_APPLY_GRACE + timedelta(seconds=1))
+
+    assert (await balance(ledger, "0xfan")).balance == Decimal("-1.25")
+    assert (await balance(ledger, "0xauthor")).tips_received == Decimal("1.25")
+
+    # A retry of the original request finds the event applied and changes nothing
+    await ledger.record(tip_event(make_tip()))
+    assert (await balance(ledger, "0xauthor")).tips_count == 1
+
+
+async def test_a_claimed_event_is_left_to_its_writer(ledger, database):
+    event = tip_event(make_tip())
+    await database.ledger_events.insert_one(event)
+    await database.ledger_events.update_one(
+        {"_id": event["_id"]}, {"$set": {"applying_until": datetime.utcnow() + LEDGER_APPLY_GRACE}}
+    )
+
+    await ledger.apply(event)
+
+    assert await ledger.balances("0xauthor") == []
+
+
+async def test_sweep_leaves_recent_events_to_their_writer(ledger, database):
+    event = tip_event(make_tip())
+    await database.ledger_events.insert_one(event)
+
+    await ledger.apply_pending(now=event["created_at"] + LEDGER_APPLY_GRACE / 2)
+
+    assert await ledger.balances("0xauthor") == []
+
+
+async def test_revenue_sums_postings_across_event_kinds(ledger):
+    await ledger.record(tip_event(make_tip()))
+    await ledger.record(purchase_event({
+        "id": "purchase-1",
+        "buyer_wallet": "0xreader",
+        "amount": Decimal("0.1"),
+        "currency": "ETH",
+        "transaction_hash": "0xbb",
+    }, "0xauthor"))
+
+    revenue = await ledger.revenue("0xauthor")
+    assert revenue.total_tips_received == Decimal("1.25")
+    assert revenue.total_paid_content_revenue == Decimal("0.1")
+    assert revenue.total_revenue == Decimal("1.35")
+    assert (await ledger.revenue("0xreader")).purchases_count == 1
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timedelta
+
+from models.analytics import PageView
+from services import string_dictionary as dictionary_module
+from services.pageview_filter import PageviewFilter, BOT, DUPLICATE, is_bot
+from services.string_dictionary import StringDictionary
+
+BROWSER = "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/605.1.15 Safari/605.1.15"
+CRAWLER = "Googlebot/2.1 (+http://www.google.com/bot.html)"
+
+
+def view(**fields):
+    return PageView(article_id="article-1", created_at=datetime(2026, 1, 1, 12), view_date=date(2026, 1, 1), **fields)
+
+
+def test_is_bot():
+    assert is_bot(CRAWLER)
+    assert is_bot("curl/8.4.0")
+    assert is_bot("WhatsApp/2.23.20.0 A")
+    assert not is_bot(BROWSER)
+    # Words that only look like crawler names
+    assert not is_bot(BROWSER + " WhatsAppWeb")
+    assert not is_bot(BROWSER + " MonitorApp/1.0")
+
+
+def test_missing_user_agent_is_not_a_bot_but_is_deduplicated(database):
+    pageview_filter = PageviewFilter(database)
+    assert not is_bot(None) and not is_bot("")
+
+    assert pageview_filter.classify(view(session_id="s1")) is None
+    assert pageview_filter.classify(view(session_id="s1", user_agent="")) == DUPLICATE
+
+
+def test_repeat_view_within_the_window_is_a_duplicate(database):
+    pageview_filter = PageviewFilter(database, window_seconds=60)
+    first = view(session_id="s1", user_agent=BROWSER)
+
+    assert pageview_filter.classify(first) is None
+    assert pageview_filter.classify(first) == DUPLICATE
+    assert pageview_filter.classify(view(session_id="s2", user_agent=BROWSER)) is None
+    later = first.copy(update={"created_at": first.created_at + timedelta(seconds=61)})
+    assert pageview_filter.classify(later) is None
+
+
+async def test_flag_mode_keeps_filtered_views(database, monkeypatch):
+    # Kept views are stored like pageviews, with the user agent dictionary-encoded
+    monkeypatch.setattr(dictionary_module, "string_dictionary", StringDictionary(database))
+    pageview_filter = PageviewFilter(database, mode="flag")
+    assert not await pageview_filter.check(view(user_agent=CRAWLER))
+
+    # The fake collection round-trips documents through BSON, which has no date type
+    [stored] = await database.filtered_pageviews.find({}).to_list(None)
+    assert (stored["reason"], stored["view_date"]) == (BOT, "2026-01-01")
+    assert await dictionary_module.string_dictionary.decode_many("user_agent", [stored["user_agent_id"]]) == {
+        stored["user_agent_id"]: CRAWLER
+    }
+    assert pageview_filter._dropped == {"2026-01-01": {BOT: 1}}
+
+
+async def test_drop_mode_stores_nothing(database):
+    pageview_filter = PageviewFilter(database, mode="drop")
+    assert not await pageview_filter.check(view(user_agent=CRAWLER))
+    assert await pageview_filter.check(view(session_id="s1", user_agent=BROWSER))
+    assert await database.filtered_pageviews.count_documents({}) == 0
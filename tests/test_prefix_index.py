@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from services.prefix_index import PrefixIndex, word_starts
+
+WORDS = ["blockchain", "blocking", "blockade", "block", "defi", "decentral", "decentralized", "introduction"]
+
+
+def brute_force(weights, prefix, k):
+    matching = [(weight, text) for text, weight in weights.items() if any(key.startswith(prefix) for key in word_starts(text))]
+    return sorted(matching, reverse=True)[:k]
+
+
+def test_highest_weight_first():
+    index = PrefixIndex(k=3)
+    index.add("title", "Defi for beginners", 5)
+    index.add("title", "Decentralized identity", 9)
+    index.add("title", "Deep work", 1)
+    index.add("title", "Blockchain basics", 100)
+
+    assert [term.display for term in index.search("de")] == ["Decentralized identity", "Defi for beginners", "Deep work"]
+    assert [term.display for term in index.search("de", limit=1)] == ["Decentralized identity"]
+
+
+def test_matches_at_any_word_start():
+    index = PrefixIndex()
+    index.add("title", "An intro to DeFi", 1)
+
+    assert [term.text for term in index.search("defi")] == ["an intro to defi"]
+    assert [term.text for term in index.search("intro to")] == ["an intro to defi"]
+    assert index.search("efi") == []
+
+
+def test_adding_again_raises_weight_and_reorders():
+    index = PrefixIndex(k=2)
+    index.add("tag", "nft", 3)
+    index.add("tag", "nfts", 2)
+    index.add("tag", "nfts", 2)
+
+    assert [(term.text, term.weight) for term in index.search("nf")] == [("nfts", 4), ("nft", 3)]
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize("max_depth", [3, 4, 8])
+def test_agrees_with_brute_force(max_depth):
+    rng = random.Random(max_depth)
+    index = PrefixIndex(k=5, max_depth=max_depth)
+    weights = {}
+    for _ in range(300):
+        text = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        weight = rng.randint(1, 10)
+        index.add("title", text, weight)
+        weights[text] = weights.get(text, 0) + weight
+
+    for prefix in ["b", "bloc", "block", "blocki", "decentrali", "introd", "de", "blockchain d", "x"]:
+        expected = brute_force(weights, prefix, 5)
+        assert [term.weight for term in index.search(prefix)] == [weight for weight, _ in expected], prefix
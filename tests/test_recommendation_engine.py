@@ -0,0 +1,92 @@
+import numpy as np
+
+from services.recommendation_engine import item_neighbours, merge_neighbours
+
+N_USERS = 40
+N_ARTICLES = 25
+
+
+def interactions(seed=3, density=0.2):
+    """Distinct (user, article) pairs with random engagement weights"""
+    rng = np.random.default_rng(seed)
+    mask = rng.random((N_USERS, N_ARTICLES)) < density
+    users, articles = np.nonzero(mask)
+    weights = rng.uniform(1, 20, size=len(users))
+    return users.astype(np.int64), articles.astype(np.int64), weights
+
+
+def brute_force(users, articles, weights, max_user_articles):
+    matrix = np.zeros((N_USERS, N_ARTICLES))
+    matrix[users, articles] = np.log1p(weights)
+    matrix[(matrix > 0).sum(axis=1) > max_user_articles] = 0
+    norms = np.linalg.norm(matrix, axis=0)
+    similarity = matrix.T @ matrix / np.maximum(np.outer(norms, norms), 1e-12)
+    np.fill_diagonal(similarity, 0)
+    return similarity
+
+
+def test_neighbours_match_brute_force_cosine():
+    users, articles, weights = interactions()
+    expected = brute_force(users, articles, weights, max_user_articles=1000)
+
+    result, norms = item_neighbours(users, articles, weights, N_USERS, N_ARTICLES,
+                                    dirty=np.arange(N_ARTICLES), top_n=5, max_user_articles=1000)
+
+    assert set(result) == set(range(N_ARTICLES))
+    for article, (neighbours, scores) in result.items():
+        best = np.argsort(-expected[article], kind="stable")[:len(neighbours)]
+        assert np.allclose(scores, expected[article][best])
+        assert np.allclose(expected[article][neighbours], scores)
+        assert len(neighbours) == min(5, int((expected[article] > 0).sum()))
+    assert np.allclose(norms, np.linalg.norm(np.log1p(np.bincount(users * N_ARTICLES + articles, weights, N_USERS * N_ARTICLES))
+                                             .reshape(N_USERS, N_ARTICLES), axis=0))
+
+
+def test_heavy_users_are_left_out():
+    users, articles, weights = interactions()
+    # One user who engaged with everything would otherwise link every pair of articles
+    users = np.concatenate([users, np.full(N_ARTICLES, N_USERS - 1)])
+    articles = np.concatenate([articles, np.arange(N_ARTICLES)])
+    weights = np.concatenate([weights, np.ones(N_ARTICLES)])
+    keep = np.unique(users * N_ARTICLES + articles, return_index=True)[1]
+    users, articles, weights = users[keep], articles[keep], weights[keep]
+
+    expected = brute_force(users, articles, weights, max_user_articles=N_ARTICLES - 1)
+    result, _ = item_neighbours(users, articles, weights, N_USERS, N_ARTICLES,
+                                dirty=np.arange(N_ARTICLES), top_n=N_ARTICLES, max_user_articles=N_ARTICLES - 1)
+
+    for article, (neighbours, scores) in result.items():
+        assert np.allclose(expected[article][neighbours], scores)
+        assert len(neighbours) == int((expected[article] > 0).sum())
+
+
+def test_slice_of_engaged_users_and_stored_lists_match_a_full_recompute():
+    users, articles, weights = interactions()
+    stored, norms = item_neighbours(users, articles, weights, N_USERS, N_ARTICLES,
+                                    dirty=np.arange(N_ARTICLES), top_n=None, max_user_articles=1000)
+
+    # New engagement with article 0, from a new reader and a returning one
+    reader = users[articles != 0][0]
+    users = np.concatenate([users, [reader]])
+    articles = np.concatenate([articles, [0]])
+    weights = np.concatenate([weights, [4.0]])
+    keep = np.unique(users * N_ARTICLES + articles, return_index=True)[1]
+    users, articles, weights = users[keep], articles[keep], weights[keep]
+    expected = brute_force(users, articles, weights, max_user_articles=1000)
+
+    engaged = np.isin(users, users[articles == 0])
+    # The slice holds every reader of article 0, so only its norm is recomputed
+    known = norms.copy()
+    known[0] = np.nan
+    result, _ = item_neighbours(users[engaged], articles[engaged], weights[engaged], N_USERS, N_ARTICLES,
+                                dirty=np.array([0]), top_n=None, max_user_articles=1000, norms=known)
+
+    others, scores = result[0]
+    assert np.allclose(expected[0][others], scores)
+    assert len(others) == int((expected[0] > 0).sum())
+
+    for article in range(1, N_ARTICLES):
+        entries = [{"article_id": other, "score": score} for other, score in zip(*stored[article])]
+        changed = {0: score for other, score in zip(others, scores) if other == article}
+        merged = merge_neighbours(entries, {0}, changed, top_n=N_ARTICLES)
+        assert np.allclose([entry["score"] for entry in merged], np.sort(expected[article][expected[article] > 0])[::-1])
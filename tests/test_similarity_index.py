@@ -0,0 +1,52 @@
+import numpy as np
+
+from services.similarity_index import SimilarityIndex, featurize
+
+DOCUMENTS = [
+    ("rollups", "Rollups scale Ethereum", ["ethereum", "scaling"], "Optimistic rollups batch transactions off chain."),
+    ("zk", "Zero knowledge rollups", ["ethereum", "scaling"], "Validity proofs let rollups post transactions cheaply."),
+    ("nft", "Minting your first NFT", ["nft", "art"], "Artists mint tokens and sell them on marketplaces."),
+    ("bread", "Sourdough at home", ["cooking"], "Flour, water and salt make bread with a starter."),
+]
+
+
+def documents(rows=DOCUMENTS):
+    return [(article_id, *featurize(title, tags, body)) for article_id, title, tags, body in rows]
+
+
+def dense(index, position):
+    return index.row_vector(position).astype(np.float64)
+
+
+def test_scores_are_cosine_similarities():
+    index = SimilarityIndex.build(documents())
+    vectors = [dense(index, position) for position in range(len(index))]
+    for position, vector in enumerate(vectors):
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        expected = [float(vector @ other) for other in vectors]
+        assert np.allclose(index.scores(index.row_vector(position)), expected, atol=1e-6)
+
+
+def test_related_ranks_shared_topics_first():
+    index = SimilarityIndex.build(documents())
+    related = index.related("rollups", 3)
+    assert related[0][0] == "zk"
+    assert "rollups" not in [article_id for article_id, _ in related]
+    assert "bread" not in [article_id for article_id, _ in related]
+    assert index.related("missing", 3) == []
+
+
+def test_similar_ranks_free_text():
+    index = SimilarityIndex.build(documents())
+    assert index.similar("how do I bake sourdough bread", 1)[0][0] == "bread"
+    assert index.similar("the and of", 3) == []
+
+
+def test_appended_rows_are_searchable_and_ids_unique():
+    index = SimilarityIndex.build(documents(DOCUMENTS[:2]))
+    grown = index.appended(documents(DOCUMENTS[1:]))
+
+    assert grown.ids == ["rollups", "zk", "nft", "bread"]
+    assert len(index) == 2
+    assert grown.related("zk", 1)[0][0] == "rollups"
+    assert grown.similar("sourdough starter", 1)[0][0] == "bread"
@@ -0,0 +1,43 @@
+from services.trigram_index import TrigramIndex, bounded_levenshtein
+
+
+def index():
+    trigram_index = TrigramIndex()
+    trigram_index.add("a1", ["Blockchain scaling explained", "ethereum"])
+    trigram_index.add("a2", ["Why blockchains need rollups", "ethereum"])
+    trigram_index.add("a3", ["Cooking with cast iron"])
+    return trigram_index
+
+
+def test_bounded_levenshtein():
+    assert bounded_levenshtein("kitten", "sitting", 3) == 3
+    assert bounded_levenshtein("kitten", "sitting", 2) == 3
+    assert bounded_levenshtein("defi", "defi", 1) == 0
+
+
+def test_misspelled_word_ranks_the_closest_word_first():
+    results = index().search("blokchain")
+    assert [doc_id for doc_id, _ in results] == ["a1", "a2"]
+    assert 1.0 > results[0][1] > results[1][1] > 0
+
+
+def test_exact_word_skips_corrections():
+    assert index().search("blockchain") == [("a1", 1.0)]
+
+
+def test_scores_sum_over_query_words():
+    results = index().search("ethereum rolups")
+    assert results[0][0] == "a2"
+    assert results[0][1] > results[1][1]
+
+
+def test_distant_words_do_not_match():
+    assert index().search("bitcoin") == []
+    assert index().corrections("xyz") == []
+
+
+def test_re_adding_a_document_only_adds_words():
+    trigram_index = index()
+    trigram_index.add("a3", ["dutch oven"])
+    assert len(trigram_index) == 3
+    assert [doc_id for doc_id, _ in trigram_index.search("iron oven")] == ["a3"]